@@ -0,0 +1,274 @@
+import itertools
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from models import db, AIReview, AIJob, AIJobStatus
+from ai_service import transcribe_audio, analyze_many, review_fields
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  AI OMMAVIY QAYTA TAHLIL (flask ai-reanalyze)
+# ------------------------------------------------------------
+"""
+Tarixiy AIReview yozuvlari va UPLOAD_FOLDER dagi audio fayllarni
+ommaviy qayta tahlil qiladi:
+
+- yozuvlar id bo'yicha bo'laklab o'qiladi (butun jadval xotiraga olinmaydi)
+- Whisper chaqiruvlari thread pool'da parallel (concurrency),
+  GPT tahlili esa bir nechta transcript bitta so'rovda (analyze_many)
+- natijalar har `batch_size` tadan keyin bitta commit bilan yoziladi
+- har commitdan keyin checkpoint fayli yangilanadi — to'xtab qolsa,
+  keyingi ishga tushirishda shu joydan davom etadi
+"""
+
+
+@dataclass
+class BatchItem:
+    order_id: int
+    audio_file: str
+    audio_type: str
+    transcript: str = None
+    review_id: int = None  # None — yangi AIReview yaratiladi (yuklangan fayl)
+    job_id: int = None
+
+
+class Checkpoint:
+    """
+    review_id — shu id gacha AIReview'lar ko'rib chiqilgan; ulardan xato
+    bilan tugaganlari failed_reviews da (keyingi ishga tushirishda qayta).
+    files — muvaffaqiyatli tahlil qilingan yuklangan fayllar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.review_id = 0
+        self.failed_reviews = set()
+        self.files = set()
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.review_id = data.get("review_id", 0)
+            self.failed_reviews = set(data.get("failed_reviews", []))
+            self.files = set(data.get("files", []))
+
+    def advance(self, items, failed=()):
+        failed_reviews = {item.review_id for item in failed if item.review_id is not None}
+        failed_files = {item.audio_file for item in failed if item.review_id is None}
+
+        for item in items:
+            if item.review_id is not None:
+                self.review_id = max(self.review_id, item.review_id)
+                if item.review_id in failed_reviews:
+                    self.failed_reviews.add(item.review_id)
+                else:
+                    self.failed_reviews.discard(item.review_id)
+            elif item.audio_file not in failed_files:
+                self.files.add(item.audio_file)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "review_id": self.review_id,
+                "failed_reviews": sorted(self.failed_reviews),
+                "files": sorted(self.files),
+            }, f)
+        os.replace(tmp, self.path)
+
+
+# ---------------- SOURCES ----------------
+
+def iter_reviews(after_id=0, audio_type=None, chunk_size=500, retry_ids=()):
+    """retry_ids — oldingi ishga tushirishda xato bergan yozuvlar, birinchi navbatda."""
+    columns = (
+        AIReview.id, AIReview.order_id, AIReview.audio_file,
+        AIReview.audio_type, AIReview.transcript
+    )
+
+    def filtered(query):
+        if audio_type:
+            query = query.filter(AIReview.audio_type == audio_type)
+        return query.order_by(AIReview.id)
+
+    retry_ids = sorted(retry_ids)
+    for start in range(0, len(retry_ids), chunk_size):
+        chunk = retry_ids[start:start + chunk_size]
+        for row in filtered(db.session.query(*columns).filter(AIReview.id.in_(chunk))).all():
+            yield _review_item(row)
+
+    while True:
+        rows = filtered(
+            db.session.query(*columns).filter(AIReview.id > after_id)
+        ).limit(chunk_size).all()
+        if not rows:
+            return
+
+        for row in rows:
+            yield _review_item(row)
+        after_id = rows[-1].id
+
+
+def _review_item(row):
+    return BatchItem(
+        review_id=row.id,
+        order_id=row.order_id,
+        audio_file=row.audio_file,
+        audio_type=row.audio_type,
+        transcript=row.transcript,
+    )
+
+
+def iter_upload_files(folder, done=(), audio_type=None, stats=None):
+    """
+    Hali AIReview'ga aylanmagan yuklangan fayllar. Buyurtmasi AIJob
+    orqali aniqlanadi; hech qayerda qayd etilmagan fayllar o'tkazib yuboriladi.
+    Navbatdagi / ishlanayotgan AIJob fayllari ham (storage-gc kabi) —
+    ularni jobs.py workerlari tahlil qiladi.
+    """
+    stats = stats if stats is not None else Counter()
+
+    reviewed = {path for (path,) in db.session.query(AIReview.audio_file).yield_per(1000)}
+    jobs = {}
+    pending = set()
+    for job in db.session.query(
+        AIJob.id, AIJob.order_id, AIJob.audio_file, AIJob.audio_type, AIJob.status
+    ).yield_per(1000):
+        jobs[job.audio_file] = job
+        if job.status in (AIJobStatus.QUEUED, AIJobStatus.RUNNING):
+            pending.add(job.audio_file)
+
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if path in reviewed or path in done:
+                continue
+            if path in pending:
+                stats["pending_jobs"] += 1
+                continue
+
+            job = jobs.get(path)
+            if job is None:
+                stats["orphans"] += 1
+                continue
+            if audio_type and job.audio_type != audio_type:
+                continue
+
+            yield BatchItem(
+                order_id=job.order_id,
+                audio_file=path,
+                audio_type=job.audio_type,
+                job_id=job.id,
+            )
+
+
+# ---------------- PROCESSING ----------------
+
+def transcribe_item(item, retranscribe=False):
+    """Thread ichida ishlaydi — DBga murojaat qilmaydi."""
+    transcript = item.transcript
+
+    if retranscribe or not transcript:
+        if item.audio_file and os.path.exists(item.audio_file):
+            transcript = transcribe_audio(item.audio_file, strict=True)
+
+    if not transcript:
+        raise ValueError(f"transcript yo'q: {item.audio_file}")
+    return transcript
+
+
+def _save(results):
+    reviews = {
+        r.id: r for r in
+        AIReview.query.filter(AIReview.id.in_(
+            [item.review_id for item, _, _ in results if item.review_id is not None]
+        ))
+    }
+
+    for item, transcript, analysis in results:
+        fields = {"transcript": transcript, **review_fields(analysis)}
+
+        if item.review_id is not None:
+            review = reviews.get(item.review_id)
+            if review is None:
+                continue
+            for name, value in fields.items():
+                setattr(review, name, value)
+            continue
+
+        review = AIReview(
+            order_id=item.order_id,
+            audio_file=item.audio_file,
+            audio_type=item.audio_type,
+            **fields
+        )
+        db.session.add(review)
+
+        if item.job_id is not None:
+            db.session.flush()
+            job = db.session.get(AIJob, item.job_id)
+            job.status = AIJobStatus.DONE
+            job.ai_review_id = review.id
+            job.error = None
+
+    db.session.commit()
+
+
+def run_batch(items, checkpoint, concurrency=4, batch_size=50,
+              retranscribe=False, limit=None, on_progress=None):
+    stats = Counter()
+    if limit is not None:
+        items = itertools.islice(items, limit)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            chunk = list(itertools.islice(items, batch_size))
+            if not chunk:
+                break
+
+            # 1) Whisper — har bir fayl alohida, parallel
+            futures = {pool.submit(transcribe_item, item, retranscribe): item for item in chunk}
+            transcribed = []
+            failed = []
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    transcribed.append((item, future.result()))
+                except Exception as e:
+                    stats["failed"] += 1
+                    failed.append(item)
+                    log.warning("Transcript xatosi (%s): %s", item.audio_file, e)
+
+            # 2) GPT — bir nechta transcript bitta so'rovda (analyze_many)
+            analyses = analyze_many(
+                [(transcript, item.audio_type) for item, transcript in transcribed],
+                strict=True
+            )
+            results = []
+            for (item, transcript), analysis in zip(transcribed, analyses):
+                if isinstance(analysis, Exception):
+                    stats["failed"] += 1
+                    failed.append(item)
+                    log.warning("Qayta tahlil xatosi (%s): %s", item.audio_file, analysis)
+                    continue
+                results.append((item, transcript, analysis))
+
+            _save(results)
+            stats["done"] += len(results)
+
+            # xato berganlar checkpointda qoladi — keyingi ishga tushirishda qayta
+            checkpoint.advance(chunk, failed)
+            checkpoint.save()
+
+            if on_progress is not None:
+                on_progress(stats)
+
+    return stats
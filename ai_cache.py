@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# ------------------------------------------------------------
+#  AI NATIJALARI KESHI (content-addressed)
+# ------------------------------------------------------------
+"""
+Whisper va GPT pullik va sekin, shuning uchun natijalar kontent
+hash'i bo'yicha saqlanadi:
+
+    transcript:<model>:<sha256(audio baytlari)>   → Whisper matni
+    analysis:<sha256(model + prompt)>              → GPT tahlili (JSON)
+
+Bir xil audio qayta yuklansa yoki tahlil qayta ishga tushirilsa,
+API'ga murojaat qilinmaydi. Kesh alohida SQLite faylda turadi;
+hajmi `max_bytes` dan oshsa eng uzoq ishlatilmagan yozuvlar o'chiriladi
+(`max_bytes` ning 90% igacha — keyingi put darhol yana tozalamasin).
+
+Hajm har put'da SUM() bilan sanalmaydi: jarayon ichida taxminiy hisoblagich
+yuritiladi, haqiqiy SUM() faqat hisoblagich limitdan oshganda olinadi.
+"""
+
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key         TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_ai_cache_accessed ON ai_cache (accessed_at);
+"""
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def transcript_key(model, audio_digest):
+    return f"transcript:{model}:{audio_digest}"
+
+
+def analysis_key(model, prompt):
+    h = hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+    return f"analysis:{h}"
+
+
+class AICache:
+    def __init__(self, path, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+        self._bytes = self.total_bytes()   # taxminiy (REPLACE eski hajmni ayirmaydi)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    # ---------------- GET / PUT ----------------
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM ai_cache WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            self._count("misses")
+            return None
+
+        conn.execute("UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        kind = key.split(":", 1)[0]
+        size = len(value.encode())
+
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO ai_cache (key, kind, value, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, kind, value, size, now, now)
+        )
+        with self._lock:
+            self.stats["writes"] += 1
+            self._bytes += size
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict(conn)
+
+    def get_json(self, key):
+        value = self.get(key)
+        return None if value is None else json.loads(value)
+
+    def put_json(self, key, data):
+        self.put(key, json.dumps(data, ensure_ascii=False))
+
+    # ---------------- EVICTION ----------------
+
+    def _evict(self, conn):
+        # hisoblagich taxminiy (boshqa jarayonlar ham yozadi) — haqiqiy hajm
+        total = self.total_bytes()
+        evicted = 0
+
+        if total > self.max_bytes:
+            target = int(self.max_bytes * EVICT_TO)
+            rows = conn.execute("SELECT key, size FROM ai_cache ORDER BY accessed_at").fetchall()
+            for key, size in rows:
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+
+        with self._lock:
+            self._bytes = total
+            self.stats["evictions"] += evicted
+
+    def total_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM ai_cache").fetchone()[0]
+
+    def summary(self):
+        rows = self._conn().execute(
+            "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache GROUP BY kind"
+        ).fetchall()
+        return {
+            **self.stats,
+            "entries": {kind: cnt for kind, cnt, _ in rows},
+            "bytes": sum(size for _, _, size in rows),
+        }
+
+    def clear(self):
+        self._conn().execute("DELETE FROM ai_cache")
+        with self._lock:
+            self._bytes = 0
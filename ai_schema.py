@@ -0,0 +1,154 @@
+import ast
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  GPT TAHLIL JAVOBI SXEMASI
+# ------------------------------------------------------------
+"""
+GPT javobidan AIReview uchun 7 ta maydonni xavfsiz ajratib oladi
+(eval() o'rniga):
+
+- ```json ... ``` markdown bloklari va atrofdagi matn tashlanadi
+- json.loads, bo'lmasa ast.literal_eval (bitta qo'shtirnoqli dict)
+- turlar keltiriladi: "85%", "85/100", "50 000 so'm" → son;
+  NaN / Infinity (json.loads ularni qabul qiladi) — qiymat yo'q
+- chegaralar: sentiment / quality 0–100, difficulty 1–10
+  (0 — baholanmagan), extra_cost ≥ 0
+- REQUIRED_FIELDS yo'q yoki son emas — AnalysisParseError
+  ({} yoki {"error": ...} nol ballik tahlil bo'lib qolmaydi)
+
+Natija statistikasi PARSE_STATS da yig'iladi:
+ok / repaired (matndan qirqib olindi) / reask / failed.
+"""
+
+PARSE_STATS = Counter()
+_stats_lock = threading.Lock()
+
+TEXT_FIELDS = ("materials_used", "recommended", "ai_summary")
+
+# bo'lmasa (yoki son bo'lmasa) javob buzuq — nol baho saqlanmaydi, qayta so'raladi
+REQUIRED_FIELDS = ("sentiment_score", "quality_score", "difficulty")
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+
+class AnalysisParseError(ValueError):
+    pass
+
+
+def count(key):
+    with _stats_lock:
+        PARSE_STATS[key] += 1
+
+
+# ---------------- EXTRACTION ----------------
+
+def _loads(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            data = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return data if isinstance(data, dict) else None
+
+
+def extract_json(text):
+    """
+    Javob matnidan birinchi JSON obyektni ajratadi.
+    (dict, repaired) qaytaradi; topilmasa AnalysisParseError.
+    """
+    if not text or not text.strip():
+        raise AnalysisParseError("bo'sh javob")
+
+    data = _loads(text.strip())
+    if data is not None:
+        return data, False
+
+    candidates = _FENCE_RE.findall(text)
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+
+    for candidate in candidates:
+        candidate = re.sub(r",\s*([}\]])", r"\1", candidate.strip())  # trailing comma
+        data = _loads(candidate)
+        if data is not None:
+            return data, True
+
+    raise AnalysisParseError(f"JSON topilmadi: {text[:120]!r}")
+
+
+# ---------------- COERCION ----------------
+
+def _number(value):
+    if isinstance(value, str):
+        # "50 000 so'm" → 50000, "85%" → 85, "8/10" → 8
+        match = _NUMBER_RE.search(value.replace(" ", "").replace(" ", ""))
+        value = match.group().replace(",", ".") if match else None
+    if not isinstance(value, (bool, int, float, str)):
+        return None
+    try:
+        value = float(value)
+    except OverflowError:  # juda katta int
+        return None
+    # NaN / ±inf chegaralanmaydi va round() da OverflowError beradi
+    return value if math.isfinite(value) else None
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_text(v) for v in value if v not in (None, ""))
+    if isinstance(value, dict):
+        return ", ".join(f"{k}: {_text(v)}" for k, v in value.items())
+    return str(value).strip()
+
+
+def check_required(data):
+    """Majburiy baholar son sifatida bormi; bo'lmasa AnalysisParseError."""
+    bad = [name for name in REQUIRED_FIELDS if _number(data.get(name)) is None]
+    if bad:
+        raise AnalysisParseError(f"maydonlar yo'q yoki son emas: {', '.join(bad)}")
+
+
+def coerce(data):
+    """Xom dict'ni AIReview maydonlariga mos, chegaralangan qiymatlarga keltiradi."""
+    result = {}
+
+    for name in ("sentiment_score", "quality_score"):
+        value = _number(data.get(name))
+        result[name] = _clamp(value, 0.0, 100.0) if value is not None else 0.0
+
+    difficulty = _number(data.get("difficulty"))
+    result["difficulty"] = int(_clamp(round(difficulty), 1, 10)) if difficulty and difficulty > 0 else 0
+
+    extra_cost = _number(data.get("extra_cost"))
+    result["extra_cost"] = max(0.0, extra_cost) if extra_cost is not None else 0.0
+
+    for name in TEXT_FIELDS:
+        result[name] = _text(data.get(name))
+
+    return result
+
+
+def parse_analysis(text):
+    data, repaired = extract_json(text)
+    check_required(data)
+    count("repaired" if repaired else "ok")
+    return coerce(data)
@@ -1,27 +1,144 @@
+import logging
 import os
-import openai
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from flask import current_app, has_app_context
+
 from config import Config
+from ai_cache import AICache, file_digest, transcript_key, analysis_key
+from storage import whisper_input
+from ai_schema import (
+    parse_analysis, extract_json, check_required, coerce, AnalysisParseError, count as schema_count
+)
+from rate_limit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+WHISPER_MODEL = "whisper-1"
+ANALYSIS_MODEL = "gpt-4o-mini"
+
+
+_config = None
+
+
+def configure(config):
+    """
+    create_app() ilova sozlamalarini beradi — app context'siz threadlar
+    (Whisper / GPT batch pool'lari) ham create_app(config) dagi qiymatlarni
+    ko'radi.
+    """
+    global _config
+    _config = config
+
+
+def _setting(name):
+    """Joriy ilova sozlamasi -> configure() dagi -> config.Config."""
+    if has_app_context():
+        return current_app.config[name]
+    if _config is not None:
+        return _config[name]
+    return getattr(Config, name)
+
+
+# =============================
+#   OPENAI CLIENT
+# =============================
+
+_client = None
+
+
+def get_client():
+    """
+    OpenAI client birinchi murojaatda yaratiladi (openai moduli ham shu
+    yerda import qilinadi — web jarayon ishga tushishi ~0.5 s tezroq).
+    Testlarda set_client() orqali stub (fake_openai.py) ulanadi.
+    """
+    global _client
+    if _client is None:
+        import openai
+
+        _client = openai.OpenAI(
+            api_key=_setting("OPENAI_API_KEY"),
+            timeout=_setting("AI_REQUEST_TIMEOUT")
+        )
+    return _client
+
+
+def set_client(client):
+    global _client
+    _client = client
+
+
+_limiter = None
+
+
+def get_limiter():
+    """GPT so'rovlari uchun umumiy token bucket (AI_REQUESTS_PER_MINUTE)."""
+    global _limiter
+    if _limiter is None:
+        per_minute = _setting("AI_REQUESTS_PER_MINUTE")
+        _limiter = TokenBucket(rate=per_minute / 60.0, capacity=max(1, per_minute // 6))
+    return _limiter
+
+
+# =============================
+#   NATIJALAR KESHI
+# =============================
+
+_cache = None
 
-openai.api_key = Config.OPENAI_API_KEY
+
+def get_cache():
+    """AICache (ai_cache.py) yoki None — AI_CACHE_ENABLED=0 bo'lsa."""
+    global _cache
+    if _cache is None and _setting("AI_CACHE_ENABLED"):
+        _cache = AICache(_setting("AI_CACHE_PATH"), max_bytes=_setting("AI_CACHE_MAX_MB") * 1024 * 1024)
+    return _cache
+
+
+def cache_stats():
+    """/metrics uchun — kesh hali ochilmagan bo'lsa bo'sh (fayl yaratilmaydi)."""
+    return dict(_cache.stats) if _cache is not None else {}
 
 
 # =============================
 #   WHISPER — Audio → TEXT
 # =============================
 
-def transcribe_audio(audio_path: str) -> str:
+def transcribe_audio(audio_path: str, strict: bool = False) -> str:
     """
     Audio faylni Whisper model orqali matnga o‘giradi.
+    strict=True bo'lsa xato yutilmaydi (job runner qayta urinishi uchun).
     """
+    cache = get_cache()
+    key = None
+
     try:
-        with open(audio_path, "rb") as audio_file:
-            transcript = openai.Audio.transcribe(
-                model="whisper-1",
+        if cache is not None:
+            key = transcript_key(WHISPER_MODEL, file_digest(audio_path))
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        with metrics.timer("ai_stage_duration_seconds", stage="transcode"):
+            source = whisper_input(audio_path, _setting("AUDIO_TRANSCODE"))
+
+        with open(source, "rb") as audio_file, \
+                metrics.timer("ai_stage_duration_seconds", stage="whisper"):
+            transcript = get_client().audio.transcriptions.create(
+                model=WHISPER_MODEL,
                 file=audio_file
             )
-        return transcript["text"]
+
+        if cache is not None and transcript.text:
+            cache.put(key, transcript.text)
+        return transcript.text
     except Exception as e:
-        print("Whisper error:", e)
+        metrics.inc("ai_errors_total", stage="whisper")
+        if strict:
+            raise
+        log.warning("Whisper xatosi: %s", e)
         return ""
 
 
@@ -29,11 +146,8 @@ def transcribe_audio(audio_path: str) -> str:
 #   GPT-4o-mini — Matnni AI tahlil qilish
 # =========================================
 
-def analyze_client_review(text: str) -> dict:
-    """
-    Foydalanuvchi audio reviewi uchun AI tahlil.
-    """
-    prompt = f"""
+def client_review_prompt(text: str) -> str:
+    return f"""
     Quyidagi foydalanuvchi sharhini tahlil qil:
 
     "{text}"
@@ -51,24 +165,9 @@ def analyze_client_review(text: str) -> dict:
     }}
     """
 
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2
-        )
-        content = response["choices"][0]["message"]["content"]
-        return eval(content)
-    except Exception as e:
-        print("GPT error:", e)
-        return {}
-
 
-def analyze_master_report(text: str) -> dict:
-    """
-    Usta audio hisobotining AI tahlili.
-    """
-    prompt = f"""
+def master_report_prompt(text: str) -> str:
+    return f"""
     Quyidagi usta tomonidan aytilgan audio hisobotni tahlil qil:
 
     "{text}"
@@ -86,53 +185,315 @@ def analyze_master_report(text: str) -> dict:
     }}
     """
 
+
+def analyze_client_review(text: str, strict: bool = False) -> dict:
+    """
+    Foydalanuvchi audio reviewi uchun AI tahlil.
+    """
+    return _analyze(client_review_prompt(text), strict)
+
+
+def analyze_master_report(text: str, strict: bool = False) -> dict:
+    """
+    Usta audio hisobotining AI tahlili.
+    """
+    return _analyze(master_report_prompt(text), strict)
+
+
+REASK_PROMPT = (
+    "Javobing to'g'ri JSON emas. Faqat bitta JSON obyekt qaytar, "
+    "boshqa matn va markdown qo'shma."
+)
+
+
+def _analyze(prompt: str, strict: bool) -> dict:
+    """
+    GPT chaqiruvi (JSON mode). Javob ai_schema orqali tekshiriladi;
+    buzuq bo'lsa AI_PARSE_MAX_REASKS martagacha qayta so'raladi.
+    Natija (model + prompt) hash'i bo'yicha keshlanadi.
+    """
+    cache = get_cache()
+    key = analysis_key(ANALYSIS_MODEL, prompt)
+
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2
-        )
-        content = response["choices"][0]["message"]["content"]
-        return eval(content)
+        if cache is not None:
+            cached = cache.get_json(key)
+            if cached is not None:
+                return coerce(cached)
+
+        messages = [{"role": "user", "content": prompt}]
+        reasks = 0
+
+        while True:
+            with metrics.timer("ai_stage_duration_seconds", stage="rate_limit"):
+                get_limiter().acquire()
+            with metrics.timer("ai_stage_duration_seconds", stage="gpt"):
+                response = get_client().chat.completions.create(
+                    model=ANALYSIS_MODEL,
+                    messages=messages,
+                    temperature=0.2,
+                    response_format={"type": "json_object"}
+                )
+            content = response.choices[0].message.content
+
+            try:
+                analysis = parse_analysis(content)
+                break
+            except AnalysisParseError:
+                if reasks >= _setting("AI_PARSE_MAX_REASKS"):
+                    schema_count("failed")
+                    raise
+                reasks += 1
+                schema_count("reask")
+                messages = messages + [
+                    {"role": "assistant", "content": content or ""},
+                    {"role": "user", "content": REASK_PROMPT},
+                ]
+
+        if cache is not None:
+            cache.put_json(key, analysis)
+        return analysis
     except Exception as e:
-        print("GPT error:", e)
+        metrics.inc("ai_errors_total", stage="gpt")
+        if strict:
+            raise
+        log.warning("GPT xatosi: %s", e)
         return {}
 
 
+def analyze_transcript(transcript: str, audio_type: str, strict: bool = False) -> dict:
+    if audio_type == "client":
+        return analyze_client_review(transcript, strict=strict)
+    return analyze_master_report(transcript, strict=strict)
+
+
+def review_fields(analysis: dict) -> dict:
+    """GPT natijasidan AIReview ustunlari (turi va chegaralari tekshirilgan)."""
+    return coerce(analysis)
+
+
+# =========================================
+#   BATCH — ko'p transcript bitta so'rovda
+# =========================================
+"""
+Bir nechta transcript bitta ChatCompletion so'roviga joylanadi
+(har biri o'z id'si bilan), javob id bo'yicha qaytarib taqsimlanadi.
+So'rovlar token byudjeti (AI_BATCH_MAX_TOKENS) va elementlar soni
+(AI_BATCH_MAX_ITEMS) bo'yicha bo'linadi, bo'laklar esa rate limiter
+ostida parallel yuboriladi. Javobda topilmagan element alohida
+so'rov bilan qayta tahlil qilinadi.
+"""
+
+BATCH_INTRO = {
+    "client": "Quyidagi foydalanuvchi sharhlarini alohida-alohida tahlil qil.",
+    "master": "Quyidagi usta tomonidan aytilgan audio hisobotlarni alohida-alohida tahlil qil.",
+}
+
+BATCH_FORMAT = """
+Natijani JSON formatida qaytar — har bir matn uchun bittadan element, "id" o'zgarmasin:
+
+{
+    "results": [
+        {
+            "id": "r1",
+            "sentiment_score": (0-100),
+            "quality_score": (0-100),
+            "difficulty": (1-10, mijoz uchun 0),
+            "materials_used": "",
+            "extra_cost": 0,
+            "recommended": "",
+            "ai_summary": ""
+        }
+    ]
+}
+"""
+
+# javobdagi bitta element uchun taxminiy token (7 maydon + xulosa)
+RESULT_TOKENS = 250
+
+
+def estimate_tokens(text: str) -> int:
+    # o'zbek / kirill matnlari uchun ~3 belgi = 1 token (ehtiyotkor baho)
+    return len(text) // 3 + 1
+
+
+def plan_batches(texts, max_tokens, max_items):
+    """
+    Indekslarni so'rovlarga bo'ladi: har bir bo'lakda kirish + kutilgan
+    chiqish tokenlari `max_tokens` dan oshmaydi. Byudjetdan katta matn
+    alohida bo'lakka tushadi.
+    """
+    overhead = estimate_tokens(BATCH_FORMAT) + 50
+    batches = []
+    current, used = [], overhead
+
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text) + RESULT_TOKENS
+        if current and (used + cost > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(i)
+        used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _batch_prompt(audio_type, texts):
+    parts = [BATCH_INTRO[audio_type], ""]
+    for n, text in enumerate(texts, 1):
+        parts.append(f'[r{n}]: "{text}"')
+    parts.append(BATCH_FORMAT)
+    return "\n".join(parts)
+
+
+def _analyze_chunk(audio_type, texts):
+    """
+    Bitta so'rov. {tartib raqami: tahlil} qaytaradi — topilmagan yoki
+    majburiy baholari yo'q elementlar tushib qoladi (alohida so'rovga).
+    """
+    with metrics.timer("ai_stage_duration_seconds", stage="rate_limit"):
+        get_limiter().acquire()
+    with metrics.timer("ai_stage_duration_seconds", stage="gpt_batch"):
+        response = get_client().chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=[{"role": "user", "content": _batch_prompt(audio_type, texts)}],
+            temperature=0.2,
+            response_format={"type": "json_object"},
+            max_tokens=RESULT_TOKENS * len(texts) + 200
+        )
+    try:
+        data, repaired = extract_json(response.choices[0].message.content)
+    except AnalysisParseError:
+        schema_count("failed")
+        raise
+
+    results = {}
+    for entry in data.get("results") or []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            n = int(str(entry.get("id", "")).lstrip("r")) - 1
+        except ValueError:
+            continue
+        if not 0 <= n < len(texts):
+            continue
+        try:
+            check_required(entry)
+        except AnalysisParseError as e:
+            schema_count("failed")
+            log.warning("GPT batch: r%s buzuq — %s", n + 1, e)
+            continue
+        schema_count("repaired" if repaired else "ok")
+        results[n] = coerce(entry)
+    return results
+
+
+def analyze_many(items, strict: bool = False) -> list:
+    """
+    items = [(transcript, audio_type), ...] → tahlillar ro'yxati (shu tartibda).
+    Xato bo'lgan element: strict=False — {}, strict=True — Exception obyekti
+    (chaqiruvchi har bir elementni alohida tekshiradi).
+    """
+    results = [None] * len(items)
+    cache = get_cache()
+
+    # 1) keshdagilar (bitta-bitta tahlil bilan umumiy kalit)
+    pending = {"client": [], "master": []}
+    for i, (text, audio_type) in enumerate(items):
+        audio_type = "client" if audio_type == "client" else "master"
+        if cache is not None:
+            cached = cache.get_json(analysis_key(ANALYSIS_MODEL, _single_prompt(text, audio_type)))
+            if cached is not None:
+                results[i] = coerce(cached)
+                continue
+        pending[audio_type].append(i)
+
+    # 2) token byudjeti bo'yicha bo'laklar
+    chunks = []
+    for audio_type, indexes in pending.items():
+        texts = [items[i][0] for i in indexes]
+        for batch in plan_batches(texts, _setting("AI_BATCH_MAX_TOKENS"), _setting("AI_BATCH_MAX_ITEMS")):
+            chunks.append((audio_type, [indexes[b] for b in batch]))
+
+    def run(chunk):
+        audio_type, indexes = chunk
+        try:
+            return chunk, _analyze_chunk(audio_type, [items[i][0] for i in indexes])
+        except Exception as e:
+            metrics.inc("ai_errors_total", stage="gpt_batch")
+            log.warning("GPT batch xatosi: %s", e)
+            return chunk, {}
+
+    # 3) parallel, rate limiter ostida
+    with ThreadPoolExecutor(max_workers=max(1, _setting("AI_BATCH_CONCURRENCY"))) as pool:
+        for (audio_type, indexes), found in pool.map(run, chunks):
+            for n, i in enumerate(indexes):
+                if n not in found:
+                    continue
+                results[i] = found[n]
+                if cache is not None:
+                    key = analysis_key(ANALYSIS_MODEL, _single_prompt(items[i][0], audio_type))
+                    cache.put_json(key, found[n])
+
+    # 4) javobda chiqmaganlar — alohida so'rov
+    for i, analysis in enumerate(results):
+        if analysis is not None:
+            continue
+        text, audio_type = items[i]
+        try:
+            results[i] = analyze_transcript(text, audio_type, strict=True)
+        except Exception as e:
+            if not strict:
+                log.warning("GPT xatosi: %s", e)
+            results[i] = e if strict else {}
+
+    return results
+
+
+def _single_prompt(text, audio_type):
+    if audio_type == "client":
+        return client_review_prompt(text)
+    return master_report_prompt(text)
+
+
 # =========================================
 #   FULL AI PIPELINE
 # =========================================
 
-def analyze_audio_file(order_id: int, audio_path: str, audio_type: str, db, AIReview):
+def analyze_audio_file(order_id: int, audio_path: str, audio_type: str, db, AIReview,
+                       strict: bool = False, on_stage=None):
     """
     Audio → Whisper → GPT → DB saqlash.
     audio_type = 'client' yoki 'master'
+    on_stage("transcribe" | "analyze" | "save") — jarayon bosqichini bildiradi
     """
+    on_stage = on_stage or (lambda stage: None)
+
     # 1) Audio → matn
-    transcript = transcribe_audio(audio_path)
+    on_stage("transcribe")
+    transcript = transcribe_audio(audio_path, strict=strict)
 
     if not transcript:
         return None
 
     # 2) AI tahlili
-    if audio_type == "client":
-        analysis = analyze_client_review(transcript)
-    else:
-        analysis = analyze_master_report(transcript)
+    on_stage("analyze")
+    analysis = analyze_transcript(transcript, audio_type, strict=strict)
+
+    # tahlil chiqmagan bo'lsa 0 ballik AIReview yozilmaydi
+    if not analysis:
+        return None
 
     # 3) DBga yozish
+    on_stage("save")
     ai_review = AIReview(
         order_id=order_id,
         audio_file=audio_path,
         audio_type=audio_type,
         transcript=transcript,
-        ai_summary=analysis.get("ai_summary", ""),
-        sentiment_score=analysis.get("sentiment_score", 0),
-        quality_score=analysis.get("quality_score", 0),
-        difficulty=analysis.get("difficulty", 0),
-        materials_used=analysis.get("materials_used", ""),
-        extra_cost=analysis.get("extra_cost", 0),
-        recommended=analysis.get("recommended", "")
+        **review_fields(analysis)
     )
 
     db.session.add(ai_review)
@@ -0,0 +1,216 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, attributes
+
+from models import db, Service, Order, OrderStatus, ServiceStatusStat, DailyOrderStat
+
+
+# ------------------------------------------------------------
+#  ANALYTICS ROLLUPS
+# ------------------------------------------------------------
+"""
+Order qo'shilganda, o'chirilganda yoki status / xizmati o'zgarganda
+rollup jadvallari shu flush ichida (bir tranzaksiyada) yangilanadi:
+
+    ServiceStatusStat  (service_id, status) → soni
+    DailyOrderStat     (day, status)        → soni
+
+Shuning uchun analitika sahifasi butun Order jadvalini skanerlamaydi.
+Query.update() kabi ORM'ni chetlab o'tuvchi o'zgarishlar hisobga
+olinmaydi — bunday holatda `flask analytics-rebuild` ishlatiladi.
+"""
+
+REVENUE_STATUSES = [OrderStatus.DONE, OrderStatus.PAYMENT_PENDING]
+
+
+# ---------------- INCREMENTAL ----------------
+
+def _old(obj, name):
+    hist = attributes.get_history(obj, name)
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(obj, name)
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _collect(session):
+    by_service = Counter()
+    by_day = Counter()
+
+    def add(service_id, status, created_at, delta):
+        status = status or OrderStatus.NEW
+        by_service[(service_id or 0, status)] += delta
+        by_day[(_day(created_at), status)] += delta
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            add(obj.service_id, obj.status, obj.created_at, +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            add(_old(obj, "service_id"), _old(obj, "status"), obj.created_at, -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Order):
+            continue
+        old = (_old(obj, "service_id"), _old(obj, "status"))
+        new = (obj.service_id, obj.status)
+        if old != new:
+            add(*old, obj.created_at, -1)
+            add(*new, obj.created_at, +1)
+
+    return by_service, by_day
+
+
+def _upsert(conn, table, keys, delta):
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(conn.dialect.name)
+
+    if dialect is not None:
+        stmt = (
+            dialect.insert(table)
+            .values(**keys, order_count=delta)
+            .on_conflict_do_update(
+                index_elements=list(keys),
+                set_={"order_count": table.c.order_count + delta}
+            )
+        )
+        conn.execute(stmt)
+        return
+
+    where = [table.c[k] == v for k, v in keys.items()]
+    result = conn.execute(
+        table.update().where(*where).values(order_count=table.c.order_count + delta)
+    )
+    if result.rowcount == 0:
+        conn.execute(table.insert().values(**keys, order_count=delta))
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_rollups(session, flush_context):
+    by_service, by_day = _collect(session)
+    if not by_service:
+        return
+
+    conn = session.connection()
+
+    for (service_id, status), delta in by_service.items():
+        if delta:
+            _upsert(conn, ServiceStatusStat.__table__,
+                    {"service_id": service_id, "status": status}, delta)
+
+    for (day, status), delta in by_day.items():
+        if delta:
+            _upsert(conn, DailyOrderStat.__table__,
+                    {"day": day, "status": status}, delta)
+
+
+# ---------------- REBUILD ----------------
+
+def rebuild_rollups():
+    """Rollup jadvallarini Order jadvalidan noldan qayta hisoblaydi."""
+    db.session.query(ServiceStatusStat).delete()
+    db.session.query(DailyOrderStat).delete()
+
+    service_rows = (
+        db.session.query(Order.service_id, Order.status, func.count(Order.id))
+        .group_by(Order.service_id, Order.status)
+        .all()
+    )
+    db.session.bulk_insert_mappings(ServiceStatusStat, [
+        {"service_id": service_id or 0, "status": status or OrderStatus.NEW, "order_count": cnt}
+        for service_id, status, cnt in service_rows
+    ])
+
+    by_day = Counter()
+    day_rows = (
+        db.session.query(func.date(Order.created_at), Order.status, func.count(Order.id))
+        .group_by(func.date(Order.created_at), Order.status)
+        .all()
+    )
+    for day, status, cnt in day_rows:
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        by_day[(day or date.today(), status or OrderStatus.NEW)] += cnt
+
+    db.session.bulk_insert_mappings(DailyOrderStat, [
+        {"day": day, "status": status, "order_count": cnt}
+        for (day, status), cnt in by_day.items()
+    ])
+
+    db.session.commit()
+    return len(service_rows), len(by_day)
+
+
+def ensure_rollups():
+    """Rollup hali qurilmagan bo'lsa (eski baza) — bir marta quradi."""
+    if ServiceStatusStat.query.first() is None and Order.query.first() is not None:
+        rebuild_rollups()
+
+
+# ---------------- READ ----------------
+
+def summary():
+    ensure_rollups()
+
+    rows = (
+        db.session.query(
+            ServiceStatusStat.service_id,
+            ServiceStatusStat.status,
+            ServiceStatusStat.order_count,
+            Service.name,
+            Service.price
+        )
+        .outerjoin(Service, Service.id == ServiceStatusStat.service_id)
+        .all()
+    )
+
+    total_orders = 0
+    done_orders = 0
+    revenue = 0
+    per_service = Counter()
+
+    for service_id, status, cnt, name, price in rows:
+        total_orders += cnt
+        if status == OrderStatus.DONE:
+            done_orders += cnt
+        if name is None:
+            continue
+        per_service[name] += cnt
+        if status in REVENUE_STATUSES:
+            revenue += cnt * (price or 0)
+
+    top_services = [(name, cnt) for name, cnt in per_service.most_common(5) if cnt > 0]
+
+    return {
+        "total_orders": total_orders,
+        "done_orders": done_orders,
+        "revenue": revenue,
+        "top_services": top_services,
+    }
+
+
+def daily_orders(days=30):
+    """Oxirgi `days` kun uchun kunlik buyurtmalar soni (grafik uchun)."""
+    start = date.today() - timedelta(days=days - 1)
+
+    rows = (
+        db.session.query(DailyOrderStat.day, func.sum(DailyOrderStat.order_count))
+        .filter(DailyOrderStat.day >= start)
+        .group_by(DailyOrderStat.day)
+        .all()
+    )
+    counts = {day: int(cnt) for day, cnt in rows}
+
+    labels = []
+    values = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        labels.append(day.strftime("%m-%d"))
+        values.append(counts.get(day, 0))
+    return labels, values
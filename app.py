@@ -1,26 +1,153 @@
-import os
-import requests
+import hmac
+import time
+from datetime import datetime, timedelta
+
 from flask import (
-    Flask, request, jsonify, render_template, redirect,
-    url_for, session, flash
+    Flask, Blueprint, current_app, request, jsonify, render_template, stream_template,
+    redirect, url_for, session, flash, Response, stream_with_context
 )
-from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
+from werkzeug.local import LocalProxy
 
 from config import Config
-from models import db, Category, Service, Order, OrderStatus, Message, AIReview
-from ai_service import analyze_audio_file
+from models import (
+    db, Category, Service, Order, OrderStatus, Message, AIReview, AIJob, AIJobStatus,
+    ProcessedUpdate, RateLimitBucket, Master
+)
+from db_engine import init_db
+from telegram_delivery import TelegramDelivery
+from conversation_cache import ConversationCache
+from update_dedup import UpdateDeduplicator
+from dispatcher import UpdateDispatcher, update_chat_id, update_user_id
+from rate_limit import ChatRateLimiter
+from catalog_cache import CatalogCache, watch_catalog
+from master_orders import (
+    OrderCardCache, active_orders_page, orders_keyboard, category_filter_keyboard,
+    order_button_text
+)
+from geo_index import GeoIndex
+from order_status import TransitionError, transition_orders, notify_transition
+from search import search
+from export import Export, ExportError
+from commands import register_commands
+from pagination import keyset_page, prefix_range, InvalidCursor
+import analytics
+import metrics
+from ai_schema import PARSE_STATS
+import ai_service
+from ai_service import cache_stats as ai_cache_stats
+from jobs import AIJobRunner
+from storage import save_upload, UploadTooLarge
 
 
 # ------------------------------------------------------------
-#  APP INITIALIZATION
+#  APP FACTORY
 # ------------------------------------------------------------
+"""
+Import vaqtida hech narsa qilinmaydi: DB engine, Telegram / AI
+workerlari va keshlar create_app() ichida yaratiladi. Og'ir modullar
+(openai, requests) birinchi ishlatilganda import qilinadi.
+
+Sxema (jadval, ustun, indekslar) ishga tushishda yaratilmaydi —
+deploydan oldin alohida qadam:
+
+    flask --app app init-db
+
+    gunicorn "app:create_app()"     — yoki eskicha: gunicorn app:app
+"""
+
+bp = Blueprint("main", __name__)
+
+
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    init_db(app, db)
+    register_commands(app)
+    # ai_service OpenAI client / kesh / limiterni shu sozlamalar bilan ochadi
+    ai_service.configure(app.config)
+
+    app.extensions["services"] = {
+        # Telegram'ga chiquvchi xabarlar — navbat orqali (webhook kutib qolmaydi)
+        "delivery": TelegramDelivery.from_config(app.config),
+
+        # user_webhook step mashinasi holati — har qadam bitta SELECT + bitta UPDATE
+        "conversations": ConversationCache(db, Order),
+
+        # /start va cat_<id> klaviaturalari — tayyor JSON, admin o'zgartirsa yangilanadi
+        "catalog": watch_catalog(CatalogCache(app.config["CATALOG_VERSION_FILE"])),
+
+        # usta bot: ord_<id> kartochkalari
+        "order_cards": OrderCardCache(ttl=app.config["ORDER_CARD_CACHE_TTL"]).watch(),
+
+        # eng yaqin buyurtmalar / ustalar (KD-tree, geohash)
+        "geo": GeoIndex.from_config(app.config).watch(),
+
+        # Telegram qayta yuborgan update'lar ikkinchi marta ishlanmaydi
+        "updates": UpdateDeduplicator.from_config(db, ProcessedUpdate, app.config),
+
+        # user bot flood himoyasi: chat / user bo'yicha token bucket (DBdan oldin)
+        "rate_limiter": ChatRateLimiter.from_config(db, RateLimitBucket, app.config),
+
+        # Webhook fast-ack: update navbatga, ishlov — chat bo'yicha tartibli workerlarda
+        "dispatcher": UpdateDispatcher.from_config(app),
+
+        # AI audio tahlil — fon workerlari (upload darhol qaytadi)
+        "ai_jobs": AIJobRunner.from_config(app),
+    }
+    app.before_request(app.extensions["services"]["ai_jobs"].ensure_started)
+
+    metrics.init_app(app)
+    _register_stats(app.extensions["services"])
+
+    app.register_blueprint(bp)
+    return app
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
 
-with app.app_context():
-    db.create_all()
+def _register_stats(services):
+    """Servislarning .stats lug'atlari /metrics da component_stats sifatida."""
+    for name in ("conversations", "catalog", "order_cards", "geo", "updates", "rate_limiter"):
+        service = services[name]
+        source = getattr(service, "backend", service)
+        metrics.REGISTRY.register_stats(name, lambda source=source: source.stats)
+
+    for name in ("delivery", "dispatcher"):
+        service = services[name]
+        metrics.REGISTRY.register_stats(
+            name, lambda service=service: {**service.stats, "pending": service.pending()}
+        )
+
+    metrics.REGISTRY.register_stats("ai_parse", lambda: PARSE_STATS)
+    metrics.REGISTRY.register_stats("ai_cache", ai_cache_stats)
+
+
+# handler'lar joriy ilovaning (current_app) servislariga shu nomlar orqali murojaat qiladi
+def _service(name):
+    return LocalProxy(lambda: current_app.extensions["services"][name])
+
+
+delivery = _service("delivery")
+conversations = _service("conversations")
+catalog = _service("catalog")
+order_cards = _service("order_cards")
+geo = _service("geo")
+updates = _service("updates")
+dispatcher = _service("dispatcher")
+rate_limiter = _service("rate_limiter")
+ai_jobs = _service("ai_jobs")
+
+
+_app = None
+
+
+def __getattr__(name):
+    """`app.app` (gunicorn app:app, eski skriptlar) — birinchi murojaatda yaratiladi."""
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app
 
 
 # ------------------------------------------------------------
@@ -28,37 +155,174 @@ with app.app_context():
 # ------------------------------------------------------------
 
 def send_user_message(chat_id, text, reply_markup=None):
-    token = app.config["TELEGRAM_BOT_TOKEN"]
+    token = current_app.config["TELEGRAM_BOT_TOKEN"]
     if not token: return
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
 
     if reply_markup:
         payload["reply_markup"] = reply_markup
 
-    requests.post(url, json=payload)
+    delivery.enqueue(token, "sendMessage", payload)
 
 
 def send_master_message(chat_id, text, reply_markup=None):
-    token = app.config["TELEGRAM_MASTER_BOT_TOKEN"]
+    token = current_app.config["TELEGRAM_MASTER_BOT_TOKEN"]
     if not token: return
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
 
     if reply_markup:
         payload["reply_markup"] = reply_markup
 
-    requests.post(url, json=payload)
+    delivery.enqueue(token, "sendMessage", payload)
+
+
+def edit_master_message(chat_id, message_id, text, reply_markup=None):
+    """Usta botdagi mavjud xabarni yangilaydi (sahifalash uchun)."""
+    if message_id is None:
+        return send_master_message(chat_id, text, reply_markup)
+
+    token = current_app.config["TELEGRAM_MASTER_BOT_TOKEN"]
+    if not token: return
+
+    payload = {"chat_id": chat_id, "message_id": message_id, "text": text, "parse_mode": "HTML"}
+
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+
+    delivery.enqueue(token, "editMessageText", payload)
 
 
 def admin_notify(text):
-    admin_id = app.config["TELEGRAM_ADMIN_CHAT_ID"]
+    admin_id = current_app.config["TELEGRAM_ADMIN_CHAT_ID"]
     if admin_id:
         send_user_message(admin_id, f"📢 Admin xabari:\n{text}")
 
 
+def get_master(chat_id, user=None):
+    """Usta bot foydalanuvchisi; birinchi murojaatda yaratiladi."""
+    master = Master.query.filter_by(chat_id=str(chat_id)).first()
+    if master is None:
+        name = " ".join(filter(None, [(user or {}).get("first_name"), (user or {}).get("last_name")]))
+        master = Master(chat_id=str(chat_id), name=name or None)
+        db.session.add(master)
+        db.session.commit()
+    return master
+
+
+def master_orders_view(master, page=0):
+    """/orders sahifasi: (matn, klaviatura)."""
+    page_size = current_app.config["MASTER_ORDERS_PAGE_SIZE"]
+    orders, total, page = active_orders_page(master, page, page_size, geo=geo)
+
+    if not total:
+        text = "Hozircha faol buyurtmalar yo‘q."
+    else:
+        text = f"Buyurtmalar ({total} ta):"
+    return text, orders_keyboard(orders, total, page, page_size, master)
+
+
+def notify_nearest_masters(order_id):
+    """Yangi buyurtma haqida eng yaqin bo'sh ustalarga xabar."""
+    order = db.session.get(Order, order_id)
+    if order is None or order.location_lat is None:
+        return
+
+    hits = geo.nearest_masters(
+        order.location_lat, order.location_lng,
+        k=current_app.config["GEO_NOTIFY_MASTERS"],
+        category_id=order.category_id,
+        max_km=current_app.config["GEO_NOTIFY_RADIUS_KM"],
+    )
+    if not hits:
+        return
+
+    # indeks boshqa workerda eskirgan bo'lishi mumkin — bandlik DBdan tekshiriladi
+    masters = {
+        m.id: m for m in
+        Master.query.filter(Master.id.in_([mid for _, mid in hits]), Master.is_available.is_(True))
+    }
+    kb = {"inline_keyboard": [[{"text": "👀 Ko‘rish", "callback_data": f"ord_{order.id}"}]]}
+
+    for km, master_id in hits:
+        master = masters.get(master_id)
+        if master is not None:
+            send_master_message(
+                master.chat_id,
+                f"🆕 Yangi buyurtma ({km:.1f} km)\n{order_button_text(order)}",
+                kb
+            )
+
+
+def accept_update(bot, handler, rate_limited=False):
+    """
+    Webhook: takror update'ni tashlab yuboradi, qolganini dispatcher'ga
+    beradi va darhol javob qaytaradi (WEBHOOK_WORKERS=0 bo'lsa — shu
+    so'rov ichida ishlanadi).
+
+    rate_limited — chat / user limitidan oshgan update handler'dan oldin
+    tashlanadi yoki kechiktiriladi (rate_limit.py).
+    """
+    update = request.get_json(silent=True)
+    if not update:
+        return jsonify({"ok": True})
+
+    # takror birinchi — Telegram qayta yuborgani limit tokenini sarflamasin
+    update_id = update.get("update_id")
+    if update_id is not None and not updates.claim(bot, update_id):
+        return jsonify({"ok": True})
+
+    delay = 0.0
+    if rate_limited:
+        delay = limit_update(bot, update)
+        if delay is None:
+            return jsonify({"ok": True})  # belgi qoladi — tashlangan update qayta ishlanmaydi
+
+    # kechiktirilgan update keyin navbatga sig'masa — belgi olinadi
+    def release(_update):
+        if update_id is not None:
+            updates.release(bot, update_id)
+
+    try:
+        accepted = dispatcher.submit(handler, update, delay=delay, on_drop=release)
+    except Exception:
+        if update_id is not None:
+            updates.release(bot, update_id)
+        raise
+
+    if not accepted:
+        # navbat to'la — Telegram keyinroq qayta yuboradi
+        if update_id is not None:
+            updates.release(bot, update_id)
+        return jsonify({"ok": False}), 503
+
+    return jsonify({"ok": True})
+
+
+def limit_update(bot, update, can_delay=None):
+    """
+    Kutish sekundi (0.0 — darhol) yoki None — update tashlab yuboriladi.
+    can_delay — chaqiruvchi o'zi kuta oladimi (standart: fon workerlari bo'lsa).
+    """
+    chat_id, user_id = update_chat_id(update), update_user_id(update)
+    keys = [f"chat:{chat_id}"]
+    if user_id is not None and user_id != chat_id:
+        keys.append(f"user:{user_id}")
+
+    # webhook'da kechiktirish faqat fon workerlari bilan (so'rov ichida kutib turilmaydi)
+    if can_delay is None:
+        can_delay = dispatcher.workers > 0
+    delay = rate_limiter.reserve(keys, can_delay=can_delay)
+
+    result = "dropped" if delay is None else "delayed" if delay else "allowed"
+    metrics.inc("rate_limit_updates_total", bot=bot, result=result)
+
+    if delay is None and rate_limiter.should_warn(keys[0]):
+        send_user_message(chat_id, "⏳ Juda ko‘p xabar yuboryapsiz — biroz kutib, qayta urinib ko‘ring.")
+    return delay
+
+
 # ------------------------------------------------------------
 # AUTH (ADMIN PANEL)
 # ------------------------------------------------------------
@@ -66,13 +330,13 @@ def admin_notify(text):
 def login_required(fn):
     def wrap(*args, **kwargs):
         if not session.get("admin_logged_in"):
-            return redirect(url_for("admin_login"))
+            return redirect(url_for("main.admin_login"))
         return fn(*args, **kwargs)
     wrap.__name__ = fn.__name__
     return wrap
 
 
-@app.route("/admin/login", methods=["GET", "POST"])
+@bp.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     if request.method == "POST":
         name = request.form["username"]
@@ -87,36 +351,36 @@ def admin_login():
     return render_template("login.html")
 
 
-@app.route("/admin/logout")
+@bp.route("/admin/logout")
 def admin_logout():
     session.clear()
-    return redirect(url_for("admin_login"))
+    return redirect(url_for("main.admin_login"))
 
 
 # ------------------------------------------------------------
 # ADMIN PANEL
 # ------------------------------------------------------------
 
-@app.route("/")
+@bp.route("/")
 def home():
     return redirect("/admin/dashboard")
 
 
-@app.route("/admin/dashboard")
+@bp.route("/admin/dashboard")
 @login_required
 def admin_dashboard():
     orders = Order.query.order_by(Order.created_at.desc()).limit(20).all()
     return render_template("dashboard.html", orders=orders, OrderStatus=OrderStatus)
 
 
-@app.route("/admin/categories")
+@bp.route("/admin/categories")
 @login_required
 def admin_categories():
     categories = Category.query.all()
     return render_template("categories.html", categories=categories)
 
 
-@app.route("/admin/categories/add", methods=["POST"])
+@bp.route("/admin/categories/add", methods=["POST"])
 @login_required
 def admin_add_category():
     name = request.form["name"]
@@ -128,7 +392,7 @@ def admin_add_category():
     return redirect("/admin/categories")
 
 
-@app.route("/admin/categories/<int:id>/delete", methods=["POST"])
+@bp.route("/admin/categories/<int:id>/delete", methods=["POST"])
 @login_required
 def admin_delete_category(id):
     cat = Category.query.get(id)
@@ -137,7 +401,7 @@ def admin_delete_category(id):
     return redirect("/admin/categories")
 
 
-@app.route("/admin/services")
+@bp.route("/admin/services")
 @login_required
 def admin_services():
     services = Service.query.all()
@@ -145,7 +409,7 @@ def admin_services():
     return render_template("services.html", services=services, categories=categories)
 
 
-@app.route("/admin/services/add", methods=["POST"])
+@bp.route("/admin/services/add", methods=["POST"])
 @login_required
 def admin_add_service():
     srv = Service(
@@ -159,7 +423,7 @@ def admin_add_service():
     return redirect("/admin/services")
 
 
-@app.route("/admin/services/<int:id>/delete", methods=["POST"])
+@bp.route("/admin/services/<int:id>/delete", methods=["POST"])
 @login_required
 def admin_delete_service(id):
     srv = Service.query.get(id)
@@ -168,20 +432,135 @@ def admin_delete_service(id):
     return redirect("/admin/services")
 
 
-@app.route("/admin/orders")
+@bp.route("/admin/orders")
 @login_required
 def admin_orders():
-    status = request.args.get("status")
-    query = Order.query
+    try:
+        query, filters = filtered_orders_query(request.args)
+    except InvalidFilter as e:
+        flash(str(e), "danger")
+        return redirect(url_for("main.admin_orders"))
+    status = filters.get("status")
+
+    try:
+        page = keyset_page(
+            query, Order.created_at, Order.id,
+            limit=current_app.config["ADMIN_ORDERS_PAGE_SIZE"],
+            after=request.args.get("after"),
+            before=request.args.get("before")
+        )
+    except InvalidCursor:
+        return redirect(url_for("main.admin_orders", status=status or None))
+
+    render = stream_template if current_app.config["ADMIN_ORDERS_STREAM"] else render_template
+    return render(
+        "orders.html",
+        orders=page.items,
+        page=page,
+        filters=filters,
+        OrderStatus=OrderStatus
+    )
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def filtered_orders_query(args):
+    """
+    admin_orders filtrlari (status, sana, telefon prefiksi): (query, filters).
+    Noto'g'ri status / sana — InvalidFilter (filtrsiz hammasi tanlanib qolmasin).
+    """
+    status = args.get("status")
+    date_from = args.get("date_from")
+    date_to = args.get("date_to")
+    phone = args.get("phone", "").strip()
+
+    query = Order.query.options(joinedload(Order.service))
 
     if status:
-        query = query.filter_by(status=OrderStatus(status))
+        try:
+            query = query.filter_by(status=OrderStatus(status))
+        except ValueError:
+            raise InvalidFilter(f"Noma'lum status: {status}") from None
+
+    if date_from:
+        query = query.filter(Order.created_at >= _filter_date(date_from))
+
+    if date_to:
+        day_end = _filter_date(date_to) + timedelta(days=1)
+        query = query.filter(Order.created_at < day_end)
+
+    if phone:
+        query = query.filter(prefix_range(Order.phone, phone))
 
-    orders = query.order_by(Order.created_at.desc()).all()
-    return render_template("orders.html", orders=orders, OrderStatus=OrderStatus)
+    filters = {
+        k: v for k, v in
+        {"status": status, "date_from": date_from, "date_to": date_to, "phone": phone}.items()
+        if v
+    }
+    return query, filters
 
 
-@app.route("/admin/orders/<int:id>", methods=["GET", "POST"])
+def _filter_date(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidFilter(f"Sana YYYY-MM-DD bo'lishi kerak: {value}") from None
+
+
+@bp.route("/admin/orders/bulk_status", methods=["POST"])
+@login_required
+def admin_orders_bulk_status():
+    """
+    Ko'p buyurtmani bitta tranzaksiyada yangi statusga o'tkazadi.
+    Forma: ids (belgilanganlar) yoki scope=filter (filtrga mos hammasi).
+    JSON: {"ids": [...], "status": "CLOSED"}
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+
+    if data is not None:
+        if not isinstance(data, dict):
+            return jsonify({"ok": False, "error": "JSON obyekt kutilgan: {\"ids\": [...], \"status\": ...}"}), 400
+        ids, new_status, filters = data.get("ids", []), data.get("status"), {}
+        if not isinstance(ids, list):
+            return jsonify({"ok": False, "error": "ids ro'yxat bo'lishi kerak"}), 400
+    else:
+        new_status = request.form.get("new_status")
+        try:
+            query, filters = filtered_orders_query(request.form)
+        except InvalidFilter as e:
+            flash(str(e), "danger")
+            return redirect(url_for("main.admin_orders"))
+        if request.form.get("scope") == "filter":
+            ids = [id for (id,) in query.with_entities(Order.id)]
+        else:
+            ids = request.form.getlist("ids")
+
+    try:
+        result = transition_orders(ids, new_status)
+    except TransitionError as e:
+        if data is not None:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(url_for("main.admin_orders", **filters))
+
+    notify_transition(result, send_user_message, admin_notify)
+
+    if data is not None:
+        return jsonify({
+            "ok": True,
+            "moved": result.moved_ids,
+            "skipped": {str(k): v for k, v in result.skipped.items()},
+        })
+
+    flash(f"{len(result.moved)} ta buyurtma → {result.status.value}", "success")
+    if result.skipped:
+        flash(f"{len(result.skipped)} ta o'tkazib yuborildi (mos o'tish yo'q)", "warning")
+    return redirect(url_for("main.admin_orders", **filters))
+
+
+@bp.route("/admin/orders/<int:id>", methods=["GET", "POST"])
 @login_required
 def admin_order_detail(id):
     order = Order.query.get(id)
@@ -216,56 +595,105 @@ def admin_order_detail(id):
 
     ai_data = AIReview.query.filter_by(order_id=id).all()
 
+    ai_jobs_list = (
+        AIJob.query.filter_by(order_id=id)
+        .filter(AIJob.status != AIJobStatus.DONE)
+        .order_by(AIJob.id)
+        .all()
+    )
+
     return render_template(
         "order_detail.html",
         order=order,
         messages=messages,
         ai_data=ai_data,
-        OrderStatus=OrderStatus
+        ai_jobs=ai_jobs_list,
+        OrderStatus=OrderStatus,
+        AIJobStatus=AIJobStatus
     )
 
 
 # ------------------------------------------------------------
-#  ANALYTIKA PANELI
+#  QIDIRUV
 # ------------------------------------------------------------
 
-from sqlalchemy import func
+@bp.route("/admin/search")
+@login_required
+def admin_search():
+    q = request.args.get("q", "").strip()
+    page = request.args.get("page", 0, type=int)
+
+    started = time.perf_counter()
+    result = search(q, page, current_app.config["SEARCH_PAGE_SIZE"])
+
+    # "#123" / "123" — buyurtma raqami bo'yicha to'g'ridan-to'g'ri
+    exact = None
+    if q.lstrip("#").isdigit() and len(q) <= 10:
+        exact = db.session.get(Order, int(q.lstrip("#")))
+
+    return render_template(
+        "search.html", result=result, exact=exact,
+        elapsed_ms=(time.perf_counter() - started) * 1000
+    )
+
+
+# ------------------------------------------------------------
+#  ANALYTIKA PANELI
+# ------------------------------------------------------------
 
-@app.route("/admin/analytics")
+@bp.route("/admin/analytics")
 @login_required
 def admin_analytics():
-    total_orders = Order.query.count()
-    done_orders = Order.query.filter(Order.status == OrderStatus.DONE).count()
-
-    # Daromad
-    revenue = (
-        db.session.query(func.sum(Service.price))
-        .join(Order, Order.service_id == Service.id)
-        .filter(Order.status.in_([OrderStatus.DONE, OrderStatus.PAYMENT_PENDING]))
-        .scalar() or 0
-    )
+    stats = analytics.summary()
+    revenue = stats["revenue"]
 
     master_percent = Config.MASTER_SHARE_PERCENT
     master_cost = revenue * (master_percent / 100)
     profit = revenue - master_cost
 
-    top_services = (
-        db.session.query(Service.name, func.count(Order.id))
-        .join(Order)
-        .group_by(Service.id)
-        .order_by(func.count(Order.id).desc())
-        .limit(5)
-        .all()
-    )
+    day_labels, day_values = analytics.daily_orders(days=30)
 
     return render_template(
         "analytics.html",
-        total_orders=total_orders,
-        done_orders=done_orders,
+        total_orders=stats["total_orders"],
+        done_orders=stats["done_orders"],
         revenue=int(revenue),
         master_cost=int(master_cost),
         profit=int(profit),
-        top_services=top_services
+        top_services=stats["top_services"],
+        day_labels=day_labels,
+        day_values=day_values
+    )
+
+
+@bp.route("/admin/export/<dataset>.<fmt>")
+def admin_export(dataset, fmt):
+    """
+    Oqimli CSV / Parquet. Admin sessiyasi yoki EXPORT_TOKEN (BI uchun Bearer).
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD&status=DONE&status=CLOSED&incremental=1&watermark=nom
+    """
+    token = current_app.config["EXPORT_TOKEN"]
+    if not session.get("admin_logged_in") and not (
+        token and request.headers.get("Authorization") == f"Bearer {token}"
+    ):
+        return redirect(url_for("main.admin_login"))
+
+    try:
+        job = Export(
+            dataset, fmt,
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+            statuses=request.args.getlist("status"),
+            incremental=request.args.get("incremental") == "1",
+            watermark=request.args.get("watermark"),
+            chunk_size=current_app.config["EXPORT_CHUNK_SIZE"],
+        )
+    except ExportError as e:
+        return str(e), 400
+
+    return Response(
+        stream_with_context(job), mimetype=job.mimetype,
+        headers={"Content-Disposition": f"attachment; filename={job.filename}"}
     )
 
 
@@ -273,36 +701,102 @@ def admin_analytics():
 #  AI AUDIO YUKLASH (FOYDALANUVCHI + USTA)
 # ------------------------------------------------------------
 
-@app.route("/admin/upload_audio/<int:order_id>/<string:user_type>", methods=["POST"])
+@bp.route("/admin/upload_audio/<int:order_id>/<string:user_type>", methods=["POST"])
 @login_required
 def upload_audio(order_id, user_type):
     if "audio" not in request.files:
         flash("Audio topilmadi!", "danger")
         return redirect(f"/admin/orders/{order_id}")
 
-    file = request.files["audio"]
-    filename = secure_filename(file.filename)
-    save_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-    file.save(save_path)
+    # bir nechta fayl tanlash mumkin (masalan ustaning bir kunlik hisobotlari)
+    job_ids = []
+    for file in request.files.getlist("audio"):
+        if not file.filename:
+            continue
+        try:
+            save_path = save_upload(
+                file, current_app.config["UPLOAD_FOLDER"],
+                max_bytes=current_app.config["UPLOAD_MAX_MB"] * 1024 * 1024
+            )
+        except UploadTooLarge:
+            flash(f"{file.filename}: audio juda katta (maksimum {current_app.config['UPLOAD_MAX_MB']} MB)", "danger")
+            continue
 
-    # AI orqali tahlil
-    ai_review = analyze_audio_file(order_id, save_path, user_type, db, AIReview)
+        # AI tahlili fonda bajariladi
+        job_ids.append(ai_jobs.submit(order_id, save_path, user_type).id)
 
-    flash("AI tahlili tayyor!", "success")
+    if job_ids:
+        ids = ", ".join(f"#{i}" for i in job_ids)
+        flash(f"Audio qabul qilindi, AI tahlil navbatda ({ids})", "info")
     return redirect(f"/admin/orders/{order_id}")
 
 
+@bp.app_errorhandler(413)
+def upload_too_large(e):
+    flash(f"Yuklanayotgan fayllar juda katta (jami maksimum {current_app.config['UPLOAD_REQUEST_MAX_MB']} MB)", "danger")
+    return redirect(request.referrer or "/admin/orders")
+
+
+@bp.route("/admin/ai_jobs/<int:id>")
+@login_required
+def admin_ai_job(id):
+    job = db.get_or_404(AIJob, id)
+    return jsonify({
+        "id": job.id,
+        "order_id": job.order_id,
+        "status": job.status.value,
+        "stage": job.stage,
+        "attempts": job.attempts,
+        "error": job.error,
+        "ai_review_id": job.ai_review_id,
+    })
+
+
+# ------------------------------------------------------------
+# METRICS
+# ------------------------------------------------------------
+
+@bp.route("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus scrape: METRICS_TOKEN (Bearer) yoki admin sessiyasi bilan.
+    Ikkalasi ham bo'lmasa — 404, agar METRICS_PUBLIC=1 yoqilmagan bo'lsa.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    authorized = session.get("admin_logged_in") or (
+        token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    )
+    if not authorized:
+        if token:
+            return "", 401
+        if not current_app.config["METRICS_PUBLIC"]:
+            return "", 404
+    return metrics.REGISTRY.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
+@bp.route("/admin/metrics")
+@login_required
+def admin_metrics():
+    return render_template(
+        "metrics.html",
+        histograms=metrics.REGISTRY.histograms(),
+        counters=metrics.REGISTRY.counters(),
+        stats=metrics.REGISTRY.stats(),
+        enabled=metrics.REGISTRY.enabled,
+    )
+
+
 # ------------------------------------------------------------
 # BOT WEBHOOK — CLIENT BOT
 # ------------------------------------------------------------
 
-@app.route("/telegram/user_webhook", methods=["POST"])
+@bp.route("/telegram/user_webhook", methods=["POST"])
 def user_webhook():
-    update = request.get_json()
+    return accept_update("user", handle_user_update, rate_limited=True)
 
-    if not update:
-        return jsonify({"ok": True})
 
+@metrics.timed_handler("user", commands=("/start",))
+def handle_user_update(update):
     # MESSAGE HANDLER
     if "message" in update:
         msg = update["message"]
@@ -313,76 +807,64 @@ def user_webhook():
         location = msg.get("location")
 
         # Get/create order
-        order = Order.query.filter_by(
-            user_id=str(user_id),
-            chat_id=str(chat_id)
-        ).order_by(Order.id.desc()).first()
-
-        if not order:
-            order = Order(
-                user_id=str(user_id),
-                chat_id=str(chat_id),
+        state = conversations.load(user_id, chat_id)
+
+        if not state:
+            state = conversations.create(
+                user_id, chat_id,
                 step="category",
                 status=OrderStatus.NEW
             )
-            db.session.add(order)
-            db.session.commit()
 
         # START
         if text == "/start":
-            order.step = "category"
-            order.status = OrderStatus.NEW
-            db.session.commit()
-
-            categories = Category.query.all()
-            kb = {"inline_keyboard": [
-                [{"text": f"{c.icon or ''} {c.name}", "callback_data": f"cat_{c.id}"}]
-                for c in categories
-            ]}
+            conversations.update(
+                user_id, chat_id, state, "category",
+                status=OrderStatus.NEW
+            )
 
-            send_user_message(chat_id, "Xizmat turini tanlang:", kb)
-            return jsonify({"ok": True})
+            send_user_message(chat_id, "Xizmat turini tanlang:", catalog.category_keyboard())
+            return
 
         # CONTACT
-        if order.step == "phone":
+        if state.step == "phone":
+            fields = {}
             if contact:
-                order.phone = contact["phone_number"]
+                fields["phone"] = contact["phone_number"]
             elif text:
-                order.phone = text
+                fields["phone"] = text
 
-            order.step = "location"
-            db.session.commit()
+            conversations.update(user_id, chat_id, state, "location", **fields)
 
             kb = {
                 "keyboard": [[{"text": "📍 Lokatsiyani ulashish", "request_location": True}]],
                 "resize_keyboard": True
             }
             send_user_message(chat_id, "Lokatsiyani yuboring:", kb)
-            return jsonify({"ok": True})
+            return
 
         # LOCATION
-        if order.step == "location":
+        if state.step == "location":
             if location:
-                order.location_lat = location["latitude"]
-                order.location_lng = location["longitude"]
+                fields = {
+                    "location_lat": location["latitude"],
+                    "location_lng": location["longitude"],
+                }
             else:
-                order.address_text = text
+                fields = {"address_text": text}
 
-            order.step = "comment"
-            db.session.commit()
+            conversations.update(user_id, chat_id, state, "comment", **fields)
 
             send_user_message(
                 chat_id,
                 "Ustaga izoh qoldiring:",
                 {"remove_keyboard": True}
             )
-            return jsonify({"ok": True})
+            return
 
         # COMMENT
-        if order.step == "comment" and text:
-            order.comment = text
-            order.step = "payment"
-            db.session.commit()
+        if state.step == "comment" and text:
+            conversations.update(user_id, chat_id, state, "payment", comment=text)
 
             kb = {
                 "inline_keyboard": [
@@ -393,15 +875,15 @@ def user_webhook():
                 ]
             }
             send_user_message(chat_id, "To‘lov turini tanlang:", kb)
-            return jsonify({"ok": True})
+            return
 
         # CHAT WITH ADMIN
-        if order.step == "chat" and text:
-            db.session.add(Message(order_id=order.id, from_admin=False, text=text))
+        if state.step == "chat" and text:
+            db.session.add(Message(order_id=state.order_id, from_admin=False, text=text))
             db.session.commit()
 
-            admin_notify(f"Mijozdan xabar (#{order.id}):\n{text}")
-            return jsonify({"ok": True})
+            admin_notify(f"Mijozdan xabar (#{state.order_id}):\n{text}")
+            return
 
 
     # CALLBACK HANDLER
@@ -411,47 +893,41 @@ def user_webhook():
         chat_id = cq["message"]["chat"]["id"]
         user_id = cq["from"]["id"]
 
-        order = Order.query.filter_by(
-            user_id=str(user_id),
-            chat_id=str(chat_id)
-        ).order_by(Order.id.desc()).first()
+        state = conversations.load(user_id, chat_id)
+        if not state:
+            return
 
         # CATEGORY
         if data.startswith("cat_"):
             cat_id = int(data.split("_")[1])
-            order.category_id = cat_id
-            order.step = "service"
-            db.session.commit()
-
-            services = Service.query.filter_by(category_id=cat_id).all()
-            kb = {"inline_keyboard": [
-                [{"text": s.name, "callback_data": f"srv_{s.id}"}] for s in services
-            ]}
+            conversations.update(user_id, chat_id, state, "service", category_id=cat_id)
 
-            send_user_message(chat_id, "Xizmatni tanlang:", kb)
-            return jsonify({"ok": True})
+            send_user_message(chat_id, "Xizmatni tanlang:", catalog.service_keyboard(cat_id))
+            return
 
         # SERVICE
         if data.startswith("srv_"):
             srv_id = int(data.split("_")[1])
-            order.service_id = srv_id
-            order.step = "phone"
-            order.status = OrderStatus.PENDING
-            db.session.commit()
+            conversations.update(
+                user_id, chat_id, state, "phone",
+                service_id=srv_id,
+                status=OrderStatus.PENDING
+            )
 
             kb = {
                 "keyboard": [[{"text": "📱 Kontakt ulashish", "request_contact": True}]],
                 "resize_keyboard": True
             }
             send_user_message(chat_id, "Telefon raqamingizni yuboring:", kb)
-            return jsonify({"ok": True})
+            return
 
         # PAYMENT
         if data.startswith("pay_"):
-            order.payment_method = data.replace("pay_", "")
-            order.step = "done"
-            order.status = OrderStatus.IN_PROGRESS
-            db.session.commit()
+            conversations.update(
+                user_id, chat_id, state, "done",
+                payment_method=data.replace("pay_", ""),
+                status=OrderStatus.IN_PROGRESS
+            )
 
             send_user_message(
                 chat_id,
@@ -459,22 +935,21 @@ def user_webhook():
                 {"remove_keyboard": True}
             )
 
-            admin_notify(f"Yangi buyurtma #{order.id}")
-            return jsonify({"ok": True})
-
-    return jsonify({"ok": True})
+            admin_notify(f"Yangi buyurtma #{state.order_id}")
+            notify_nearest_masters(state.order_id)
 
 
 # ------------------------------------------------------------
 # BOT WEBHOOK — MASTER (USTA) BOT
 # ------------------------------------------------------------
 
-@app.route("/telegram/master_webhook", methods=["POST"])
+@bp.route("/telegram/master_webhook", methods=["POST"])
 def master_webhook():
-    update = request.get_json()
-    if not update:
-        return jsonify({"ok": True})
+    return accept_update("master", handle_master_update)
 
+
+@metrics.timed_handler("master", commands=("/start", "/orders", "/busy", "/free"))
+def handle_master_update(update):
     # MESSAGE
     if "message" in update:
         msg = update["message"]
@@ -485,45 +960,99 @@ def master_webhook():
         if text == "/start":
             send_master_message(chat_id,
                 "Assalomu alaykum, Usta!\n"
-                "Buyurtmalar ro‘yxati: /orders"
+                "Buyurtmalar ro‘yxati: /orders\n"
+                "📍 Lokatsiyangizni yuborsangiz, yaqin buyurtmalar haqida xabar olasiz.\n"
+                "Band bo‘lsangiz: /busy, bo‘sh: /free"
             )
-            return jsonify({"ok": True})
+            return
 
-        # /orders
-        if text == "/orders":
-            orders = Order.query.filter(
-                Order.status.in_([OrderStatus.PENDING, OrderStatus.IN_PROGRESS])
-            ).all()
+        # BANDLIK — yangi buyurtma xabarlari faqat bo'sh ustalarga
+        if text in ("/busy", "/free"):
+            master = get_master(chat_id, msg.get("from"))
+            master.is_available = text == "/free"
+            db.session.commit()
 
-            if not orders:
-                send_master_message(chat_id, "Hozircha faol buyurtmalar yo‘q.")
-                return jsonify({"ok": True})
+            send_master_message(
+                chat_id,
+                "✅ Yangi buyurtmalar yuboriladi." if master.is_available
+                else "⏸ Yangi buyurtmalar yuborilmaydi. Qaytish: /free"
+            )
+            return
+
+        # LOCATION — /orders yaqinlik bo'yicha tartib uchun
+        if msg.get("location"):
+            master = get_master(chat_id, msg.get("from"))
+            master.location_lat = msg["location"]["latitude"]
+            master.location_lng = msg["location"]["longitude"]
+            master.location_updated_at = datetime.utcnow()
+            db.session.commit()
 
-            kb = {"inline_keyboard": [
-                [{"text": f"#{o.id} - {o.service.name}", "callback_data": f"ord_{o.id}"}]
-                for o in orders
-            ]}
-            send_master_message(chat_id, "Buyurtmalar:", kb)
-            return jsonify({"ok": True})
+            send_master_message(chat_id, "📍 Lokatsiya saqlandi. Buyurtmalar: /orders")
+            return
+
+        # /orders
+        if text == "/orders":
+            master = get_master(chat_id, msg.get("from"))
+            text, kb = master_orders_view(master)
+            send_master_message(chat_id, text, kb)
+            return
 
     # CALLBACK
     if "callback_query" in update:
         cq = update["callback_query"]
         data = cq["data"]
         chat_id = cq["message"]["chat"]["id"]
+        message_id = cq["message"].get("message_id")
+
+        # /orders sahifalari
+        if data.startswith("ol_"):
+            master = get_master(chat_id, cq.get("from"))
+            text, kb = master_orders_view(master, page=int(data[3:]))
+            edit_master_message(chat_id, message_id, text, kb)
+            return
+
+        # kategoriya filtri
+        if data == "oc":
+            master = get_master(chat_id, cq.get("from"))
+            kb = category_filter_keyboard(
+                Category.query.order_by(Category.id).all(), master.category_id
+            )
+            edit_master_message(chat_id, message_id, "Kategoriyani tanlang:", kb)
+            return
+
+        if data.startswith("of_"):
+            master = get_master(chat_id, cq.get("from"))
+            master.category_id = int(data[3:]) or None
+            db.session.commit()
+
+            text, kb = master_orders_view(master)
+            edit_master_message(chat_id, message_id, text, kb)
+            return
+
+        # yaqinlik bo'yicha tartib
+        if data.startswith("on_"):
+            master = get_master(chat_id, cq.get("from"))
+            master.near_first = data == "on_1"
+            db.session.commit()
+
+            if master.near_first and master.location_lat is None:
+                kb = {
+                    "keyboard": [[{"text": "📍 Lokatsiyani ulashish", "request_location": True}]],
+                    "resize_keyboard": True
+                }
+                send_master_message(chat_id, "Yaqin buyurtmalar uchun lokatsiyani yuboring:", kb)
+                return
+
+            text, kb = master_orders_view(master)
+            edit_master_message(chat_id, message_id, text, kb)
+            return
 
         if data.startswith("ord_"):
             order_id = int(data.replace("ord_", ""))
-            order = Order.query.get(order_id)
-
-            text = (
-                f"Buyurtma #{order.id}\n"
-                f"Xizmat: {order.service.name}\n"
-                f"Telefon: {order.phone}\n"
-                f"Izoh: {order.comment}\n"
-                f"To‘lov: {order.payment_method}\n"
-                "\nStatusni tanlang:"
-            )
+            text = order_cards.get(order_id)
+            if text is None:
+                send_master_message(chat_id, "Buyurtma topilmadi.")
+                return
 
             kb = {
                 "inline_keyboard": [
@@ -535,7 +1064,7 @@ def master_webhook():
             }
 
             send_master_message(chat_id, text, kb)
-            return jsonify({"ok": True})
+            return
 
         if data.startswith("st_"):
             _, order_id, status = data.split("_")
@@ -557,14 +1086,10 @@ def master_webhook():
                 send_user_message(order.chat_id, "Ish tugatildi! 💳 To‘lov kutilmoqda.")
                 admin_notify(f"Usta #{order.id} ishni tugatdi")
 
-            return jsonify({"ok": True})
-
-    return jsonify({"ok": True})
-
 
 # ------------------------------------------------------------
 # RUN APP
 # ------------------------------------------------------------
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    create_app().run(host="0.0.0.0", port=5000)
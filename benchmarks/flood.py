@@ -0,0 +1,147 @@
+"""
+Bitta chat flood qilganda boshqa mijozlar kechikishi (rate_limit.py).
+
+Har bir rejim alohida jarayonda, 10k buyurtmali vaqtinchalik SQLite
+bazada (Telegram — fake_telegram.py):
+
+    quiet      — flood yo'q, oddiy mijozlar funnel'i (benchmarks.load)
+    flood      — bitta chat parallel oqimlarda sekundiga --flood-rate ta
+                 /start va matn yuboradi, RATE_LIMIT_ENABLED=0
+    limited    — xuddi shu flood, limiter yoqilgan
+
+Oddiy mijozlar uchun p50 / p95 / p99, flood chatidan ishlangan
+update'lar soni va Telegram'ga yuborilgan xabarlar chiqariladi.
+
+    python -m benchmarks.flood
+    python -m benchmarks.flood --chats 300 --flood-rate 400
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.load import CHAT_BASE, Updates, _env, summarize, user_funnel
+
+FLOOD_CHAT = CHAT_BASE - 100
+
+MODES = {
+    "quiet": (0, "0"),
+    "flood": (None, "0"),
+    "limited": (None, "1"),
+}
+
+
+def run_mode(mode, chats, flood_threads, flood_rate):
+    tmpdir = tempfile.mkdtemp(prefix=f"flood_{mode}_")
+    try:
+        return _run_mode(mode, chats, flood_threads, flood_rate, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _run_mode(mode, chats, flood_threads, flood_rate, tmpdir):
+    logging.disable(logging.CRITICAL)
+    threads, enabled = MODES[mode]
+    threads = flood_threads if threads is None else threads
+
+    from fake_telegram import FakeTelegram
+    telegram = FakeTelegram()
+    os.environ.update(_env(tmpdir, telegram.start()))
+    os.environ["RATE_LIMIT_ENABLED"] = enabled
+
+    import app as web
+    from benchmarks.query_plans import seed
+    from models import db, create_schema
+
+    flask_app = web.create_app()
+    with flask_app.app_context():
+        create_schema(db.engine)
+        seed(10000)
+
+    updates = Updates()
+    id_lock = threading.Lock()
+    stop = threading.Event()
+    flood_sent = defaultdict(int)
+
+    def flood():
+        # ochiq sikl: javob tez qaytsa ham sekundiga flood_rate / threads tadan ko'p emas
+        client = flask_app.test_client()
+        interval = threads / flood_rate
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+            with id_lock:
+                text = "/start" if flood_sent["total"] % 2 else "Tezroq!!!"
+                update = updates.message(FLOOD_CHAT, text=text)
+                flood_sent["total"] += 1
+            client.post("/telegram/user_webhook", json=update)
+
+    workers = [threading.Thread(target=flood, daemon=True) for _ in range(threads)]
+    for t in workers:
+        t.start()
+
+    client = flask_app.test_client()
+    rnd = random.Random(42)
+    samples, errors = [], 0
+    started = time.perf_counter()
+
+    for n in range(chats):
+        with id_lock:
+            funnel = user_funnel(updates, CHAT_BASE + n, rnd.randint(1, 10), rnd.randint(1, 50), rnd)
+        for _, update in funnel:
+            start = time.perf_counter()
+            resp = client.post("/telegram/user_webhook", json=update)
+            samples.append(time.perf_counter() - start)
+            errors += resp.status_code != 200
+
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in workers:
+        t.join()
+
+    # limiter o'chiq bo'lsa flood update'larining hammasi ishlanadi
+    flood_processed = flood_sent["total"]
+    if enabled == "1":
+        stats = flask_app.extensions["services"]["rate_limiter"].stats
+        flood_processed = stats["allowed"] + stats["delayed"] - len(samples)
+
+    with flask_app.app_context():
+        web.delivery.flush(30)
+
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "users": summarize(samples, errors),
+        "flood_sent": flood_sent["total"],
+        "flood_processed": flood_processed,
+        "telegram_sent": len(telegram.sent),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200, help="oddiy mijozlar (har biri 7 ta update)")
+    parser.add_argument("--flood-threads", type=int, default=2)
+    parser.add_argument("--flood-rate", type=float, default=200, help="flood update'lari / sekund")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'rejim':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'xato':>6}"
+          f"{'flood yubordi':>15}{'flood ishlandi':>16}{'Telegram':>10}")
+    for mode in MODES:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run_mode, (mode, args.chats, args.flood_threads, args.flood_rate))
+        u = r["users"]
+        print(f"{mode:<10}{u['p50_ms']:>9.1f}{u['p95_ms']:>9.1f}{u['p99_ms']:>9.1f}{u['errors']:>6}"
+              f"{r['flood_sent']:>15}{r['flood_processed']:>16}{r['telegram_sent']:>10}")
+
+
+if __name__ == "__main__":
+    main()
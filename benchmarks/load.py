@@ -0,0 +1,292 @@
+"""
+Offline yuklama benchmarki: bot funnel va admin sahifalari.
+
+Har bir baza hajmi (10k / 100k / 1M buyurtma) alohida jarayonda:
+vaqtinchalik SQLite baza to'ldiriladi (benchmarks.query_plans.seed),
+Telegram Bot API — fake_telegram.py, OpenAI — fake_openai.py.
+
+- bot: user_webhook orqali /start → cat_ → srv_ → telefon → lokatsiya →
+  izoh → pay_, keyin master_webhook orqali /orders → ord_ → st_start → st_done
+- admin: admin_orders (birinchi sahifa va status filtri), admin_analytics,
+  admin_order_detail (tasodifiy buyurtma)
+
+Har bir qadam uchun p50 / p95 / p99 va throughput chiqariladi.
+--check bilan natija benchmarks/baseline.json dagi p95 bilan
+solishtiriladi: --tolerance dan ko'proq sekinlashgan qadam bo'lsa — exit 1.
+
+    python -m benchmarks.load                               # 10k, 100k
+    python -m benchmarks.load --sizes 10000,100000,1000000
+    python -m benchmarks.load --save-baseline
+    python -m benchmarks.load --check
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+CHAT_BASE = 10 ** 9          # seed qilingan chat_id'lar bilan to'qnashmasin
+MASTER_CHAT = CHAT_BASE - 1
+
+
+def _env(tmpdir, api_url):
+    return {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmpdir, 'load.db')}",
+        "CATALOG_VERSION_FILE": os.path.join(tmpdir, ".catalog_version"),
+        "TELEGRAM_API_URL": api_url,
+        "TELEGRAM_BOT_TOKEN": "USER",
+        "TELEGRAM_MASTER_BOT_TOKEN": "MASTER",
+        "TELEGRAM_ADMIN_CHAT_ID": "1",
+        "WEBHOOK_WORKERS": "0",
+        "AI_JOB_WORKERS": "0",
+        "AI_CACHE_ENABLED": "0",
+    }
+
+
+# ---------------- BOT FUNNEL ----------------
+
+class Updates:
+    def __init__(self):
+        self._next = 0
+
+    def _id(self):
+        self._next += 1
+        return self._next
+
+    def message(self, chat, **fields):
+        msg = {"chat": {"id": chat}, "from": {"id": chat}, **fields}
+        return {"update_id": self._id(), "message": msg}
+
+    def callback(self, chat, data, message_id=1):
+        return {"update_id": self._id(), "callback_query": {
+            "data": data, "from": {"id": chat},
+            "message": {"chat": {"id": chat}, "message_id": message_id},
+        }}
+
+
+def user_funnel(updates, chat, category_id, service_id, rnd):
+    lat, lng = 41.3 + rnd.uniform(-0.1, 0.1), 69.24 + rnd.uniform(-0.1, 0.1)
+    return [
+        ("/start", updates.message(chat, text="/start")),
+        ("cat_", updates.callback(chat, f"cat_{category_id}")),
+        ("srv_", updates.callback(chat, f"srv_{service_id}")),
+        ("phone", updates.message(chat, contact={"phone_number": f"+99890{chat % 10**7:07d}"})),
+        ("location", updates.message(chat, location={"latitude": lat, "longitude": lng})),
+        ("comment", updates.message(chat, text="Kran oqyapti, tezroq keling")),
+        ("pay_", updates.callback(chat, "pay_CASH")),
+    ]
+
+
+def master_funnel(updates, order_id):
+    return [
+        ("/orders", updates.message(MASTER_CHAT, text="/orders")),
+        ("ord_", updates.callback(MASTER_CHAT, f"ord_{order_id}")),
+        ("st_start", updates.callback(MASTER_CHAT, f"st_{order_id}_start")),
+        ("st_done", updates.callback(MASTER_CHAT, f"st_{order_id}_done")),
+    ]
+
+
+# ---------------- BIR HAJM (alohida jarayon) ----------------
+
+def run_size(n_orders, chats, repeats):
+    tmpdir = tempfile.mkdtemp(prefix=f"load_{n_orders}_")
+    try:
+        return _run_size(n_orders, chats, repeats, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _run_size(n_orders, chats, repeats, tmpdir):
+    logging.disable(logging.CRITICAL)
+
+    from fake_telegram import FakeTelegram
+    telegram = FakeTelegram()
+    os.environ.update(_env(tmpdir, telegram.start()))
+
+    import ai_service
+    import app as web
+    from analytics import rebuild_rollups
+    from benchmarks.query_plans import seed
+    from fake_openai import FakeOpenAI
+    from models import db, Order, Master, create_schema
+
+    ai_service.set_client(FakeOpenAI())
+    flask_app = web.create_app()
+    rnd = random.Random(42)
+
+    t = time.perf_counter()
+    with flask_app.app_context():
+        create_schema(db.engine)
+        seed(n_orders)
+        db.session.add_all([
+            Master(chat_id=str(CHAT_BASE - 2 - i), name=f"Usta {i}", is_available=True,
+                   location_lat=41.3 + rnd.uniform(-0.2, 0.2),
+                   location_lng=69.24 + rnd.uniform(-0.2, 0.2))
+            for i in range(50)
+        ])
+        db.session.commit()
+        rebuild_rollups()
+        db.session.commit()
+    seed_seconds = time.perf_counter() - t
+
+    client = flask_app.test_client()
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+
+    def timed(name, method, path, **kwargs):
+        start = time.perf_counter()
+        resp = getattr(client, method)(path, **kwargs)
+        resp.get_data()     # stream_template bo'lsa ham to'liq o'qiladi
+        timings[name].append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            errors[name] += 1
+
+    # bot funnel
+    updates = Updates()
+    for n in range(chats):
+        chat = CHAT_BASE + n
+        for label, update in user_funnel(updates, chat, rnd.randint(1, 10), rnd.randint(1, 50), rnd):
+            timed(f"bot {label}", "post", "/telegram/user_webhook", json=update)
+
+        with flask_app.app_context():
+            order_id = (
+                db.session.query(Order.id)
+                .filter(Order.chat_id == str(chat))
+                .order_by(Order.id.desc())
+                .limit(1)
+                .scalar()
+            )
+        for label, update in master_funnel(updates, order_id):
+            timed(f"bot {label}", "post", "/telegram/master_webhook", json=update)
+
+    with flask_app.app_context():
+        web.delivery.flush(30)
+
+    # admin sahifalari
+    with client.session_transaction() as session:
+        session["admin_logged_in"] = True
+
+    for _ in range(repeats):
+        timed("admin orders", "get", "/admin/orders")
+        timed("admin orders?status", "get", "/admin/orders?status=PENDING")
+        timed("admin analytics", "get", "/admin/analytics")
+        timed("admin order_detail", "get", f"/admin/orders/{rnd.randint(1, n_orders)}")
+
+    return {
+        "orders": n_orders,
+        "seed_seconds": seed_seconds,
+        "telegram_sent": len(telegram.sent),
+        "steps": {name: summarize(samples, errors[name]) for name, samples in timings.items()},
+    }
+
+
+def percentile(sorted_samples, q):
+    index = min(len(sorted_samples) - 1, max(0, round(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples, errors=0):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "rps": len(samples) / sum(samples) if sum(samples) else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+    }
+
+
+# ---------------- BASELINE ----------------
+
+def compare(results, baseline, tolerance, slack_ms):
+    """[(hajm, qadam, baseline p95, hozirgi p95), ...] — sekinlashganlar."""
+    regressions = []
+    for size, result in results.items():
+        base_steps = baseline.get(str(size), {})
+        for name, stats in result["steps"].items():
+            base = base_steps.get(name)
+            if base is None:
+                continue
+            if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance) + slack_ms:
+                regressions.append((size, name, base["p95_ms"], stats["p95_ms"]))
+    return regressions
+
+
+def to_baseline(results):
+    return {
+        str(size): {
+            name: {"p50_ms": round(s["p50_ms"], 2), "p95_ms": round(s["p95_ms"], 2)}
+            for name, s in sorted(result["steps"].items())
+        }
+        for size, result in results.items()
+    }
+
+
+# ---------------- CLI ----------------
+
+def print_result(result):
+    print(f"\n{result['orders']:,} buyurtma (seed {result['seed_seconds']:.1f} s, "
+          f"Telegram'ga {result['telegram_sent']} ta xabar)")
+    print(f"{'qadam':<24}{'soni':>6}{'xato':>6}{'so`rov/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, s in sorted(result["steps"].items()):
+        print(f"{name:<24}{s['count']:>6}{s['errors']:>6}{s['rps']:>10.1f}"
+              f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--chats", type=int, default=200, help="funnel'dan o'tadigan mijozlar")
+    parser.add_argument("--repeats", type=int, default=30, help="har bir admin sahifasi")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="p95 ruxsat etilgan o'sishi (0.5 = +50%%)")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="kichik qiymatlar uchun qo'shimcha")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        with ctx.Pool(1) as pool:
+            results[size] = pool.apply(run_size, (size, args.chats, args.repeats))
+        print_result(results[size])
+
+    failed = any(s["errors"] for r in results.values() for s in r["steps"].values())
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(to_baseline(results))
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline yozildi: {args.baseline}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.slack_ms)
+        print()
+        for size, name, before, now in regressions:
+            print(f"REGRESSIYA {size:,} / {name}: p95 {before:.1f} → {now:.1f} ms")
+        if not regressions:
+            print(f"Baseline bilan mos (tolerance +{args.tolerance:.0%}, slack {args.slack_ms} ms)")
+        failed = failed or bool(regressions)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Order qidiruvlari uchun EXPLAIN QUERY PLAN auditi.
+
+Vaqtinchalik SQLite bazaga ~1M buyurtma yoziladi va ilovadagi issiq
+so'rovlarning rejasi tekshiriladi: har biri indeks orqali ishlashi,
+to'liq jadval skaneri yoki ORDER BY uchun vaqtinchalik B-tree
+ishlatmasligi kerak. Biror so'rov indeksni ishlatmasa — exit code 1.
+
+    python -m benchmarks.query_plans              # 1 000 000 buyurtma
+    python -m benchmarks.query_plans --orders 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from models import db, Category, Service, Order, OrderStatus, Message, AIReview
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n_orders, batch=50000):
+    rnd = random.Random(42)
+    statuses = [s.name for s in OrderStatus]
+    start = datetime(2025, 1, 1)
+
+    db.session.add_all([Category(id=i, name=f"Kategoriya {i}") for i in range(1, 11)])
+    db.session.add_all([
+        Service(id=i, name=f"Xizmat {i}", price=10000 * i, category_id=(i % 10) + 1)
+        for i in range(1, 51)
+    ])
+    db.session.commit()
+
+    conn = db.session.connection()
+    for offset in range(0, n_orders, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, n_orders)):
+            user = rnd.randrange(n_orders // 5 + 1)
+            rows.append({
+                "user_id": str(user),
+                "chat_id": str(user),
+                "category_id": rnd.randint(1, 10),
+                "service_id": rnd.randint(1, 50),
+                "phone": f"+99890{rnd.randrange(10**7):07d}",
+                "status": rnd.choice(statuses),
+                "step": "done",
+                "created_at": start + timedelta(seconds=i * 30),
+            })
+        conn.execute(Order.__table__.insert(), rows)
+
+        conn.execute(Message.__table__.insert(), [
+            {"order_id": rnd.randint(1, n_orders), "text": "salom", "from_admin": False,
+             "created_at": start + timedelta(seconds=i)}
+            for i in range(batch // 10)
+        ])
+        conn.execute(AIReview.__table__.insert(), [
+            {"order_id": rnd.randint(1, n_orders), "audio_type": "client",
+             "created_at": start + timedelta(seconds=i)}
+            for i in range(batch // 50)
+        ])
+    db.session.commit()
+    db.session.execute(db.text("ANALYZE"))
+
+
+def hot_queries():
+    """Ilovadagi issiq so'rovlar — app.py dagi bilan bir xil shaklda."""
+    active = [OrderStatus.PENDING, OrderStatus.IN_PROGRESS]
+    return {
+        "webhook: chat faol buyurtmasi": (
+            db.session.query(Order.id, Order.step)
+            .filter_by(user_id="123", chat_id="123")
+            .order_by(Order.id.desc()).limit(1)
+        ),
+        "admin_orders: status filter": (
+            Order.query.filter_by(status=OrderStatus.DONE)
+            .order_by(Order.created_at.desc()).limit(50)
+        ),
+        "usta /orders: faol buyurtmalar": (
+            Order.query.filter(Order.status.in_(active)).limit(50)
+        ),
+        "dashboard: so'nggi buyurtmalar": (
+            Order.query.order_by(Order.created_at.desc()).limit(20)
+        ),
+        "order_detail: xabarlar": (
+            Message.query.filter_by(order_id=1).order_by(Message.created_at)
+        ),
+        "order_detail: AI tahlillar": (
+            AIReview.query.filter_by(order_id=1)
+        ),
+        "cat_ callback: xizmatlar": (
+            Service.query.filter_by(category_id=1)
+        ),
+    }
+
+
+def explain(query):
+    sql = str(query.statement.compile(
+        dialect=db.engine.dialect,
+        compile_kwargs={"literal_binds": True}
+    ))
+    rows = db.session.execute(db.text("EXPLAIN QUERY PLAN " + sql)).all()
+    return [row[-1] for row in rows]
+
+
+def is_bad(detail):
+    if "USE TEMP B-TREE" in detail:
+        return True
+    return detail.startswith("SCAN") and "USING" not in detail
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--db", help="baza fayli (standart: vaqtinchalik)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "plans.db")
+    app = make_app(db_path)
+
+    with app.app_context():
+        db.create_all()
+
+        if not Order.query.first():
+            t = time.perf_counter()
+            seed(args.orders)
+            print(f"{args.orders} buyurtma yozildi ({time.perf_counter() - t:.1f}s)")
+
+        failed = 0
+        for name, query in hot_queries().items():
+            plan = explain(query)
+            bad = [d for d in plan if is_bad(d)]
+
+            t = time.perf_counter()
+            query.all()
+            ms = (time.perf_counter() - t) * 1000
+
+            print(f"{'FAIL' if bad else 'ok  '} {name} ({ms:.1f} ms)")
+            for detail in plan:
+                print(f"       {detail}")
+            failed += bool(bad)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
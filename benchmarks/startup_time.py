@@ -0,0 +1,121 @@
+"""
+Web jarayon ishga tushish vaqti: import, create_app(), birinchi so'rov
+va fork (gunicorn --preload master'dan worker ochish).
+
+Har bir o'lchov yangi python jarayonida (sovuq start). Ikki rejim:
+- lazy  — hozirgi holat: openai / requests birinchi ishlatilganda import
+- eager — eski xatti-harakat: og'ir modullar va sxema import vaqtida
+
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --runs 10 --forks 50
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, os, resource, sys, time
+
+eager = sys.argv[1] == "eager"
+forks = int(sys.argv[2])
+
+t0 = time.perf_counter()
+if eager:
+    import openai, requests
+import app as web
+t1 = time.perf_counter()
+
+flask_app = web.create_app()
+if eager:
+    from models import db, create_schema
+    with flask_app.app_context():
+        create_schema(db.engine)
+t2 = time.perf_counter()
+
+flask_app.test_client().get("/")
+t3 = time.perf_counter()
+
+fork_times = []
+for _ in range(forks):
+    t = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    fork_times.append(time.perf_counter() - t)
+
+print(json.dumps({
+    "import": t1 - t0,
+    "create_app": t2 - t1,
+    "first_request": t3 - t2,
+    "fork": sorted(fork_times)[len(fork_times) // 2] if fork_times else 0.0,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": sorted(m for m in ("openai", "requests") if m in sys.modules),
+}))
+"""
+
+
+def _env(tmpdir):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmpdir, 'startup.db')}",
+        "CATALOG_VERSION_FILE": os.path.join(tmpdir, ".catalog_version"),
+        "AI_JOB_WORKERS": "0",
+        "WEBHOOK_WORKERS": "0",
+        "PYTHONPATH": ROOT,
+    })
+    return env
+
+
+def measure(mode, runs, forks, tmpdir):
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, mode, str(forks)],
+            cwd=tmpdir, env=_env(tmpdir), capture_output=True, text=True, check=True,
+        ).stdout
+        sample = json.loads(out.strip().splitlines()[-1])
+        sample["total"] = time.perf_counter() - t
+        samples.append(sample)
+
+    result = {
+        key: statistics.median(s[key] for s in samples)
+        for key in ("import", "create_app", "first_request", "fork", "rss_mb", "total")
+    }
+    result["mode"] = mode
+    result["heavy"] = ",".join(samples[-1]["heavy"]) or "—"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--forks", type=int, default=20)
+    parser.add_argument("--modes", default="eager,lazy")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="startup_time_")
+    try:
+        print(f"{args.runs} ta sovuq start, har birida {args.forks} ta fork (mediana)\n")
+        print(f"{'rejim':<7}{'import':>9}{'create':>9}{'1-so`rov':>10}{'jami':>9}"
+              f"{'fork':>9}{'RSS MB':>9}  og'ir modullar")
+        for mode in args.modes.split(","):
+            r = measure(mode, args.runs, args.forks, tmpdir)
+            print(f"{r['mode']:<7}{r['import'] * 1000:>7.0f}ms{r['create_app'] * 1000:>7.0f}ms"
+                  f"{r['first_request'] * 1000:>8.0f}ms{r['total'] * 1000:>7.0f}ms"
+                  f"{r['fork'] * 1000:>7.2f}ms{r['rss_mb']:>9.1f}  {r['heavy']}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Webhook yozish o'tkazuvchanligi: bir nechta jarayon (gunicorn workerlari
+kabi) bitta SQLite bazaga bir vaqtda user_webhook funnelini yuboradi.
+
+Ikkala engine profili solishtiriladi (db_engine.py):
+- default    — rollback journal, pysqlite standart kutishi
+- production — WAL + busy_timeout + synchronous=NORMAL
+
+    python -m benchmarks.webhook_writes
+    python -m benchmarks.webhook_writes --workers 8 --chats 100
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+
+def _funnel(chat, cid, sid, next_id):
+    def msg(**kw):
+        m = {"chat": {"id": chat}, "from": {"id": chat}}
+        m.update(kw)
+        return {"update_id": next_id(), "message": m}
+
+    def cb(data):
+        return {"update_id": next_id(), "callback_query": {
+            "data": data, "from": {"id": chat}, "message": {"chat": {"id": chat}}
+        }}
+
+    return [
+        msg(text="/start"),
+        cb(f"cat_{cid}"),
+        cb(f"srv_{sid}"),
+        msg(contact={"phone_number": f"+99890{chat:07d}"}),
+        msg(location={"latitude": 41.3, "longitude": 69.2}),
+        msg(text="tez keling"),
+        cb("pay_CASH"),
+    ]
+
+
+def _env(db_path, profile):
+    return {
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "DB_PROFILE": profile,
+        "TELEGRAM_BOT_TOKEN": "",
+        "TELEGRAM_MASTER_BOT_TOKEN": "",
+        "TELEGRAM_ADMIN_CHAT_ID": "",
+        "WEBHOOK_WORKERS": "0",
+        "AI_JOB_WORKERS": "0",
+        "AI_CACHE_ENABLED": "0",
+    }
+
+
+def _worker(args):
+    worker_id, db_path, profile, chats, cid, sid, start_at = args
+    os.environ.update(_env(db_path, profile))
+    logging.disable(logging.CRITICAL)
+
+    import app as web
+
+    client = web.create_app().test_client()
+    counter = iter(range(worker_id * 10_000_000, (worker_id + 1) * 10_000_000))
+
+    updates = []
+    for n in range(chats):
+        updates += _funnel(worker_id * 100_000 + n, cid, sid, lambda: next(counter))
+
+    # barcha jarayonlar bir vaqtda boshlaydi
+    time.sleep(max(0.0, start_at - time.time()))
+
+    latencies, errors = [], 0
+    for update in updates:
+        t = time.perf_counter()
+        try:
+            status = client.post("/telegram/user_webhook", json=update).status_code
+        except Exception:
+            status = 500
+        latencies.append(time.perf_counter() - t)
+        if status != 200:
+            errors += 1
+    return latencies, errors
+
+
+def run(profile, workers, chats, tmpdir):
+    db_path = os.path.join(tmpdir, f"{profile}.db")
+    os.environ.update(_env(db_path, profile))
+
+    # sxema va katalog (alohida jarayonda — bu jarayon toza qoladi)
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        cid, sid = pool.apply(_seed, (db_path, profile))
+
+    start_at = time.time() + 3
+    jobs = [(i, db_path, profile, chats, cid, sid, start_at) for i in range(workers)]
+
+    with ctx.Pool(workers) as pool:
+        results = pool.map(_worker, jobs)
+    elapsed = time.time() - start_at
+
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    return {
+        "profile": profile,
+        "updates": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def _seed(db_path, profile):
+    os.environ.update(_env(db_path, profile))
+    logging.disable(logging.CRITICAL)
+
+    import app as web
+    from models import db, Category, Service, create_schema
+
+    with web.create_app().app_context():
+        create_schema(db.engine)
+        category = Category(name="Santexnika", icon="🔧")
+        db.session.add(category)
+        db.session.flush()
+        service = Service(name="Kran", price=50000, category_id=category.id)
+        db.session.add(service)
+        db.session.commit()
+        return category.id, service.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=50, help="har bir jarayonda")
+    parser.add_argument("--profiles", default="default,production")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="webhook_writes_")
+    try:
+        print(f"{args.workers} jarayon × {args.chats} chat × 7 update\n")
+        print(f"{'profil':<12}{'update':>8}{'xato':>7}{'update/s':>11}{'p50 ms':>9}{'p99 ms':>9}")
+        for profile in args.profiles.split(","):
+            r = run(profile, args.workers, args.chats, tmpdir)
+            print(f"{r['profile']:<12}{r['updates']:>8}{r['errors']:>7}"
+                  f"{r['throughput']:>11.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
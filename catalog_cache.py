@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Category, Service
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  KATALOG KESHI (kategoriya / xizmat klaviaturalari)
+# ------------------------------------------------------------
+"""
+/start va cat_<id> uchun inline klaviaturalar oldindan qurilib,
+tayyor JSON satr holida saqlanadi — bot so'rovlarida DB ishlatilmaydi.
+
+Katalog faqat admin paneldan o'zgaradi. Category / Service o'zgargan
+tranzaksiya commit bo'lganda versiya fayli (CATALOG_VERSION_FILE)
+yangilanadi. Har bir gunicorn worker o'qishdan oldin faylning
+mtime'ini tekshiradi (bitta stat() chaqiruvi) va versiya o'zgargan
+bo'lsa katalogni 2 ta so'rov bilan qayta yuklaydi.
+
+Versiya fayli bitta serverdagi jarayonlar uchun; bir nechta server
+bo'lsa umumiy diskda turishi kerak.
+"""
+
+
+class CatalogCache:
+    def __init__(self, version_file):
+        self.version_file = version_file
+
+        self.stats = {"hits": 0, "reloads": 0}
+
+        self._version = None
+        self._categories = None
+        self._services = {}
+        self._lock = threading.Lock()
+
+    # ---------------- PUBLIC API ----------------
+
+    def category_keyboard(self):
+        """Kategoriyalar inline klaviaturasi (JSON satr)."""
+        self._ensure_fresh()
+        return self._categories
+
+    def service_keyboard(self, category_id):
+        """Kategoriya xizmatlari klaviaturasi (JSON satr)."""
+        self._ensure_fresh()
+        return self._services.get(category_id, _EMPTY_KEYBOARD)
+
+    def invalidate(self):
+        """Barcha workerlardagi keshni eskirgan deb belgilaydi."""
+        tmp = f"{self.version_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp, self.version_file)
+
+        # shu jarayonda mtime bir xil chiqib qolsa ham qayta yuklansin
+        with self._lock:
+            self._version = None
+
+    # ---------------- INTERNALS ----------------
+
+    def _current_version(self):
+        try:
+            st = os.stat(self.version_file)
+        except FileNotFoundError:
+            return 0
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _ensure_fresh(self):
+        version = self._current_version()
+        if version == self._version:
+            self.stats["hits"] += 1
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+            self._load()
+            self._version = version
+            self.stats["reloads"] += 1
+
+    def _load(self):
+        categories = Category.query.order_by(Category.id).all()
+        services = Service.query.order_by(Service.id).all()
+
+        self._categories = _keyboard(
+            (f"{c.icon or ''} {c.name}", f"cat_{c.id}") for c in categories
+        )
+
+        by_category = {}
+        for s in services:
+            by_category.setdefault(s.category_id, []).append((s.name, f"srv_{s.id}"))
+        self._services = {cid: _keyboard(rows) for cid, rows in by_category.items()}
+
+
+def _keyboard(buttons):
+    return json.dumps(
+        {"inline_keyboard": [[{"text": text, "callback_data": data}] for text, data in buttons]},
+        ensure_ascii=False
+    )
+
+
+_EMPTY_KEYBOARD = _keyboard(())
+
+
+# ---------------- INVALIDATION ----------------
+
+# listener'lar Session klassiga modul importida bir marta ulanadi;
+# create_app har chaqirilganda faqat kesh ro'yxatga qo'shiladi
+_watched = weakref.WeakSet()
+
+
+def watch_catalog(cache):
+    """Category / Service o'zgargan har bir commitdan keyin cache.invalidate()."""
+    _watched.add(cache)
+    return cache
+
+
+def _mark(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Category, Service)):
+            session.info["catalog_changed"] = True
+            return
+
+
+def _bump(session):
+    if session.info.pop("catalog_changed", False):
+        for cache in list(_watched):
+            try:
+                cache.invalidate()
+            except OSError:
+                log.exception("Katalog versiya faylini yozib bo'lmadi")
+
+
+def _reset(session):
+    session.info.pop("catalog_changed", None)
+
+
+for _name, _fn in (("after_flush", _mark), ("after_commit", _bump), ("after_rollback", _reset)):
+    if not event.contains(Session, _name, _fn):
+        event.listen(Session, _name, _fn)
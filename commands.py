@@ -0,0 +1,256 @@
+import os
+
+import click
+from sqlalchemy import inspect
+
+from models import (
+    db, AIReview, AIJob, AIJobStatus, Order, OrderStatus, Master, ServiceStatusStat, DailyOrderStat,
+    create_missing_indexes, create_missing_columns, create_schema
+)
+from analytics import rebuild_rollups
+
+
+# ------------------------------------------------------------
+#  FLASK CLI BUYRUQLARI
+# ------------------------------------------------------------
+"""
+    flask --app app init-db            — sxema: jadvallar, ustunlar, indekslar (deploydan oldin)
+    flask --app app db-indexes         — eski bazaga yangi ustun / indekslarni qo'shish
+    flask --app app geo-backfill       — lokatsiyasi bor eski yozuvlarga geohash yozish
+    flask --app app search-rebuild     — qidiruv indeksini (FTS5) noldan qurish
+    flask --app app export             — buyurtmalar / AI tahlillari CSV yoki Parquet'ga
+    flask --app app analytics-rebuild  — analitika rollup jadvallarini qayta qurish
+    flask --app app ai-jobs-run        — navbatdagi AI vazifalarni shu jarayonda bajarish
+    flask --app app ai-cache           — AI kesh holati (--clear bilan tozalash)
+    flask --app app ai-reanalyze       — AIReview / yuklangan audiolarni ommaviy qayta tahlil
+    flask --app app storage-gc         — hech qayerda ishlatilmayotgan audio fayllarni o'chirish
+"""
+
+
+def register_commands(app):
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Jadvallar, yetishmayotgan ustun / indekslar va upload papkasi."""
+        from search import create_search_index, rebuild_search_index
+
+        inspector = inspect(db.engine)
+        new_rollups = not all(
+            inspector.has_table(model.__tablename__) for model in (ServiceStatusStat, DailyOrderStat)
+        )
+
+        created = create_schema(db.engine)
+        if new_rollups:
+            # eski bazada — rollup'ga tarixiy buyurtmalar ham tushadi (deploydan
+            # keyingi birinchi buyurtma jadvalni to'ldirgach ensure_rollups buni sezmaydi)
+            services, days = rebuild_rollups()
+            created.append(f"analytics rollup ({services} + {days} ta qator)")
+        if create_search_index(db.engine):
+            # eski bazada — mavjud yozuvlar ham qidiruvga tushadi
+            created.append(f"search_fts ({rebuild_search_index()} ta yozuv)")
+        os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+
+        for name in created:
+            click.echo(f"+ {name}")
+        click.echo("Sxema tayyor.")
+
+    @app.cli.command("db-indexes")
+    def db_indexes():
+        """Modellarda e'lon qilingan, bazada yo'q ustun va indekslarni yaratadi."""
+        created = create_missing_columns(db.engine) + create_missing_indexes(db.engine)
+
+        if not created:
+            click.echo("Barcha ustun va indekslar joyida.")
+            return
+
+        for name in created:
+            click.echo(f"+ {name}")
+
+    @app.cli.command("geo-backfill")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    def geo_backfill(chunk_size):
+        """geohash ustuni bo'sh, lekin lokatsiyasi bor Order / Master yozuvlari."""
+        from geo import geohash_encode
+        from models import GEOHASH_PRECISION
+
+        for model in (Order, Master):
+            total = 0
+            while True:
+                rows = (
+                    db.session.query(model.id, model.location_lat, model.location_lng)
+                    .filter(model.geohash.is_(None),
+                            model.location_lat.isnot(None), model.location_lng.isnot(None))
+                    .limit(chunk_size)
+                    .all()
+                )
+                if not rows:
+                    break
+
+                db.session.bulk_update_mappings(model, [
+                    {"id": id, "geohash": geohash_encode(lat, lng, GEOHASH_PRECISION)}
+                    for id, lat, lng in rows
+                ])
+                db.session.commit()
+                total += len(rows)
+
+            click.echo(f"{model.__name__}: {total} ta yozuvga geohash yozildi")
+
+    @app.cli.command("search-rebuild")
+    @click.option("--chunk-size", default=5000, show_default=True)
+    def search_rebuild(chunk_size):
+        """Qidiruv indeksini (search_fts) Order / Message / AIReview dan qayta qurish."""
+        from search import create_search_index, fts_available, rebuild_search_index
+
+        create_search_index(db.engine)
+        if not fts_available(db.session.connection()):
+            click.echo("FTS5 mavjud emas — qidiruv LIKE bo'yicha ishlaydi.")
+            return
+
+        total = rebuild_search_index(
+            chunk_size=chunk_size, progress=lambda n: click.echo(f"  {n} ta yozuv")
+        )
+        click.echo(f"Tayyor: {total} ta yozuv indekslandi.")
+
+    @app.cli.command("export")
+    @click.argument("dataset", type=click.Choice(["orders", "reviews"]))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "parquet"]), default="csv", show_default=True)
+    @click.option("--output", "-o", help="Fayl yo'li ('-' — stdout); berilmasa DATASET_VAQT.FORMAT")
+    @click.option("--from", "date_from", type=click.DateTime(["%Y-%m-%d"]), help="Yaratilgan sana, shu kundan")
+    @click.option("--to", "date_to", type=click.DateTime(["%Y-%m-%d"]), help="Yaratilgan sana, shu kungacha (kiradi)")
+    @click.option("--status", multiple=True, type=click.Choice([s.value for s in OrderStatus]))
+    @click.option("--incremental", is_flag=True, help="Oxirgi watermark'dan keyin o'zgarganlar")
+    @click.option("--watermark", help="Watermark nomi (standart — dataset nomi)")
+    @click.option("--chunk-size", default=5000, show_default=True)
+    def export(dataset, fmt, output, date_from, date_to, status, incremental, watermark, chunk_size):
+        """Buyurtmalar yoki AI tahlillarini oqim bilan faylga yozadi (xotira o'zgarmas)."""
+        from export import Export, ExportError
+
+        try:
+            job = Export(dataset, fmt, date_from=date_from, date_to=date_to, statuses=status,
+                         incremental=incremental, watermark=watermark, chunk_size=chunk_size)
+        except ExportError as e:
+            raise click.UsageError(str(e))
+
+        if incremental:
+            since = job.since.isoformat(sep=" ") if job.since else "boshidan"
+            click.echo(f"Watermark '{job.watermark}': {since}", err=True)
+
+        if output == "-":
+            out = click.get_binary_stream("stdout")
+            for chunk in job:
+                out.write(chunk)
+            out.flush()
+        else:
+            # yarim yozilgan fayl qolmasin — oxirida nomi o'zgartiriladi
+            output = output or job.filename
+            tmp = output + ".part"
+            with open(tmp, "wb") as f:
+                for chunk in job:
+                    f.write(chunk)
+            os.replace(tmp, output)
+
+        click.echo(f"{job.rows} ta qator → {output}", err=True)
+
+    @app.cli.command("analytics-rebuild")
+    def analytics_rebuild():
+        """Analitika rollup jadvallarini Order jadvalidan qayta quradi."""
+        services, days = rebuild_rollups()
+        click.echo(f"Rollup qayta qurildi: {services} xizmat/status, {days} kun/status")
+
+    @app.cli.command("ai-jobs-run")
+    def ai_jobs_run():
+        """Navbatdagi AI audio vazifalarini bajaradi va chiqadi."""
+        from jobs import AIJobRunner
+
+        done = AIJobRunner.from_config(app).run_pending()
+        click.echo(f"Bajarildi: {done} ta vazifa")
+
+    @app.cli.command("ai-cache")
+    @click.option("--clear", is_flag=True, help="Keshni to'liq tozalash")
+    def ai_cache(clear):
+        """Whisper / GPT natijalari keshi holati."""
+        from ai_service import get_cache
+
+        cache = get_cache()
+        if cache is None:
+            click.echo("AI kesh o'chirilgan (AI_CACHE_ENABLED=0).")
+            return
+
+        if clear:
+            cache.clear()
+
+        info = cache.summary()
+        click.echo(f"Yozuvlar: {info['entries']}")
+        click.echo(f"Hajm: {info['bytes'] / 1024:.1f} KB / {cache.max_bytes // (1024 * 1024)} MB")
+
+    @app.cli.command("ai-reanalyze")
+    @click.option("--source", type=click.Choice(["reviews", "uploads", "all"]), default="reviews",
+                  help="reviews — mavjud AIReview yozuvlari, uploads — tahlil qilinmagan fayllar")
+    @click.option("--audio-type", type=click.Choice(["client", "master"]))
+    @click.option("--concurrency", default=4, show_default=True, help="Parallel AI so'rovlar")
+    @click.option("--batch-size", default=50, show_default=True, help="Bitta commitdagi yozuvlar")
+    @click.option("--checkpoint", default="ai_reanalyze.json", show_default=True)
+    @click.option("--restart", is_flag=True, help="Checkpointni e'tiborsiz qoldirib boshidan")
+    @click.option("--retranscribe", is_flag=True, help="Mavjud transcriptni ham Whisper bilan yangilash")
+    @click.option("--limit", type=int)
+    def ai_reanalyze(source, audio_type, concurrency, batch_size, checkpoint,
+                     restart, retranscribe, limit):
+        """Tarixiy audio yozuvlarni ommaviy qayta tahlil qiladi (davom ettirsa bo'ladi)."""
+        import itertools
+        from collections import Counter
+        from ai_batch import Checkpoint, iter_reviews, iter_upload_files, run_batch
+
+        if restart and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        state = Checkpoint(checkpoint)
+
+        sources = []
+        skipped = Counter()
+        if source in ("reviews", "all"):
+            sources.append(iter_reviews(
+                after_id=state.review_id, audio_type=audio_type, retry_ids=state.failed_reviews
+            ))
+        if source in ("uploads", "all"):
+            sources.append(iter_upload_files(
+                app.config["UPLOAD_FOLDER"], done=state.files,
+                audio_type=audio_type, stats=skipped
+            ))
+
+        def progress(stats):
+            click.echo(f"  bajarildi: {stats['done']}, xato: {stats['failed']}")
+
+        stats = run_batch(
+            itertools.chain(*sources), state,
+            concurrency=concurrency,
+            batch_size=batch_size,
+            retranscribe=retranscribe,
+            limit=limit,
+            on_progress=progress
+        )
+
+        click.echo(f"Tayyor: {stats['done']} ta, xato: {stats['failed']} ta, "
+                   f"buyurtmasiz fayllar: {skipped['orphans']} ta, "
+                   f"navbatdagi AIJob fayllari: {skipped['pending_jobs']} ta")
+
+    @app.cli.command("storage-gc")
+    @click.option("--dry-run", is_flag=True, help="Faqat ko'rsatish, o'chirmaslik")
+    @click.option("--min-age-hours", default=24, show_default=True,
+                  help="Shundan yangi fayllarga tegilmaydi (yuklanayotgan / navbatdagi)")
+    def storage_gc(dry_run, min_age_hours):
+        """AIReview yoki tugallanmagan AIJob ishlatmayotgan audio fayllarni o'chiradi."""
+        from storage import collect_garbage
+
+        referenced = {path for (path,) in db.session.query(AIReview.audio_file).yield_per(1000)}
+        referenced |= {
+            path for (path,) in
+            db.session.query(AIJob.audio_file)
+            .filter(AIJob.status != AIJobStatus.DONE)
+            .yield_per(1000)
+        }
+
+        removed, freed = collect_garbage(
+            app.config["UPLOAD_FOLDER"], referenced,
+            min_age=min_age_hours * 3600, dry_run=dry_run
+        )
+        verb = "o'chiriladi" if dry_run else "o'chirildi"
+        click.echo(f"{removed} ta fayl {verb} ({freed / (1024 * 1024):.1f} MB)")
@@ -10,6 +10,18 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Engine profili (db_engine.py): production — SQLite uchun WAL / busy_timeout,
+    # server DB uchun ulanishlar pool'i; default — SQLAlchemy standarti
+    DB_PROFILE = os.environ.get("DB_PROFILE", "production")
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 15000))
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+
     # Admin login
     ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
     ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin123")
@@ -21,12 +33,109 @@ class Config:
     # Admin chat ID
     TELEGRAM_ADMIN_CHAT_ID = os.environ.get("TELEGRAM_ADMIN_CHAT_ID", "")
 
+    # Telegram'ga chiquvchi xabarlar navbati
+    # (offline test uchun: TELEGRAM_API_URL=http://127.0.0.1:8081 — fake_telegram.py)
+    TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+    TELEGRAM_DELIVERY_WORKERS = int(os.environ.get("TELEGRAM_DELIVERY_WORKERS", 4))
+    TELEGRAM_DELIVERY_RETRIES = int(os.environ.get("TELEGRAM_DELIVERY_RETRIES", 5))
+    TELEGRAM_DELIVERY_TIMEOUT = float(os.environ.get("TELEGRAM_DELIVERY_TIMEOUT", 10))
+
     # AI – Whisper + GPT-4o-mini
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+    AI_REQUEST_TIMEOUT = float(os.environ.get("AI_REQUEST_TIMEOUT", 120))
+    # GPT buzuq JSON qaytarsa necha marta qayta so'raladi
+    AI_PARSE_MAX_REASKS = int(os.environ.get("AI_PARSE_MAX_REASKS", 1))
+
+    # GPT so'rovlari: umumiy limit va batch tahlil (bitta so'rovda bir nechta transcript)
+    AI_REQUESTS_PER_MINUTE = int(os.environ.get("AI_REQUESTS_PER_MINUTE", 300))
+    AI_BATCH_MAX_TOKENS = int(os.environ.get("AI_BATCH_MAX_TOKENS", 8000))
+    AI_BATCH_MAX_ITEMS = int(os.environ.get("AI_BATCH_MAX_ITEMS", 10))
+    AI_BATCH_CONCURRENCY = int(os.environ.get("AI_BATCH_CONCURRENCY", 4))
+
+    # Whisper / GPT natijalari keshi (kontent hash bo'yicha, alohida SQLite fayl)
+    AI_CACHE_ENABLED = os.environ.get("AI_CACHE_ENABLED", "1") == "1"
+    # Flask instance papkasi (SQLite DB yonida) — repo / CWD ga yozilmaydi
+    AI_CACHE_PATH = os.environ.get(
+        "AI_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "ai_cache.db")
+    )
+    AI_CACHE_MAX_MB = int(os.environ.get("AI_CACHE_MAX_MB", 50))
+
+    # AI audio tahlil navbati (fon workerlari)
+    AI_JOB_WORKERS = int(os.environ.get("AI_JOB_WORKERS", 2))
+    AI_JOB_MAX_ATTEMPTS = int(os.environ.get("AI_JOB_MAX_ATTEMPTS", 3))
+    AI_JOB_TIMEOUT = int(os.environ.get("AI_JOB_TIMEOUT", 300))
+
+    # Admin panel: buyurtmalar ro'yxati (keyset sahifalash)
+    ADMIN_ORDERS_PAGE_SIZE = int(os.environ.get("ADMIN_ORDERS_PAGE_SIZE", 50))
+    ADMIN_ORDERS_STREAM = os.environ.get("ADMIN_ORDERS_STREAM", "0") == "1"
+
+    # Admin qidiruvi (search.py — SQLite FTS5, bo'lmasa LIKE)
+    SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", 20))
+
+    # Eksport (export.py): o'qish bo'lagi va BI uchun /admin/export token (Bearer)
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 5000))
+    EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN", "")
+
+    # Katalog klaviaturalari keshi: versiya fayli (barcha gunicorn workerlar uchun umumiy)
+    CATALOG_VERSION_FILE = os.environ.get(
+        "CATALOG_VERSION_FILE", os.path.join(os.getcwd(), ".catalog_version")
+    )
+
+    # Webhook: qayta yuborilgan Telegram update'larini tashlab yuborish (update_dedup.py)
+    UPDATE_DEDUP_SIZE = int(os.environ.get("UPDATE_DEDUP_SIZE", 10000))
+    UPDATE_DEDUP_TTL = int(os.environ.get("UPDATE_DEDUP_TTL", 86400))
+    UPDATE_DEDUP_CLEANUP = int(os.environ.get("UPDATE_DEDUP_CLEANUP", 600))
+
+    # Webhook fast-ack (dispatcher.py): 0 — update so'rov ichida ishlanadi
+    WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 0))
+    WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", 10000))
+
+    # User bot flood himoyasi (rate_limit.py): chat va user bo'yicha token bucket.
+    # RATE — sekundiga update, BURST — ketma-ket ruxsat. MAX_DELAY dan uzoq
+    # kutish kerak bo'lsa tashlanadi (kechiktirish faqat WEBHOOK_WORKERS > 0 da).
+    # BACKEND: memory — har bir jarayonda alohida, db — barcha workerlar uchun umumiy
+    RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+    RATE_LIMIT_RATE = float(os.environ.get("RATE_LIMIT_RATE", 1.0))
+    RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", 10))
+    RATE_LIMIT_MAX_DELAY = float(os.environ.get("RATE_LIMIT_MAX_DELAY", 3.0))
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100000))
+    RATE_LIMIT_WARN_INTERVAL = int(os.environ.get("RATE_LIMIT_WARN_INTERVAL", 30))
+
+    # Metrikalar (metrics.py): /metrics (Prometheus) va /admin/metrics
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    # /metrics: token bilan (Authorization: Bearer ...) yoki admin sessiyasi;
+    # token'siz anonim scrape faqat METRICS_PUBLIC=1 bilan (webhook bilan bitta host)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "0") == "1"
+
+    # Long polling (poller.py) — webhooksiz rejim
+    POLL_TIMEOUT = int(os.environ.get("POLL_TIMEOUT", 25))
+    POLL_CONCURRENCY = int(os.environ.get("POLL_CONCURRENCY", 8))
+
+    # Usta bot: /orders sahifa hajmi va buyurtma kartochkasi keshi (sekund)
+    MASTER_ORDERS_PAGE_SIZE = int(os.environ.get("MASTER_ORDERS_PAGE_SIZE", 8))
+    ORDER_CARD_CACHE_TTL = int(os.environ.get("ORDER_CARD_CACHE_TTL", 60))
+
+    # Geo indeks (geo_index.py): KD-tree qayta qurish oralig'i va
+    # yangi buyurtma haqida xabar olinadigan eng yaqin ustalar
+    GEO_INDEX_ENABLED = os.environ.get("GEO_INDEX_ENABLED", "1") == "1"
+    GEO_INDEX_TTL = int(os.environ.get("GEO_INDEX_TTL", 30))
+    GEO_NOTIFY_MASTERS = int(os.environ.get("GEO_NOTIFY_MASTERS", 3))
+    GEO_NOTIFY_RADIUS_KM = float(os.environ.get("GEO_NOTIFY_RADIUS_KM", 15))
 
     # Usta ulushi (%)
     MASTER_SHARE_PERCENT = float(os.environ.get("MASTER_SHARE_PERCENT", 70))
 
-    # Audio fayllarni yuklash papkasi
+    # Audio fayllarni yuklash papkasi (storage.py — kontent hash bo'yicha)
+    # (papka import vaqtida emas — save_upload / init-db da yaratiladi)
     UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    # Whisper limiti 25 MB — har bir fayl uchun (upload_audio / save_upload)
+    UPLOAD_MAX_MB = int(os.environ.get("UPLOAD_MAX_MB", 25))
+    # butun so'rov (bir nechta fayl birga) — oshsa werkzeug 413 bilan rad etadi
+    UPLOAD_REQUEST_MAX_MB = int(os.environ.get("UPLOAD_REQUEST_MAX_MB", 256))
+    MAX_CONTENT_LENGTH = UPLOAD_REQUEST_MAX_MB * 1024 * 1024
+
+    # Whisper'dan oldin ffmpeg bilan 16 kHz mono opus'ga siqish
+    AUDIO_TRANSCODE = os.environ.get("AUDIO_TRANSCODE", "0") == "1"
@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+
+
+# ------------------------------------------------------------
+#  CONVERSATION STATE (user_webhook step mashinasi)
+# ------------------------------------------------------------
+"""
+Chatning faol buyurtmasi va uning step'i. Har xabarda buyurtma DBdan
+bitta so'rov bilan to'liq o'qiladi va shu obyekt qadam yozishda qayta
+ishlatiladi: qadam = bitta SELECT + bitta UPDATE.
+
+Holat jarayon xotirasida saqlanmaydi — bir nechta gunicorn worker,
+alohida poller jarayoni va admin panel bir xil step'ni ko'radi, restart
+paytida kiritilgan maydonlar yo'qolmaydi.
+"""
+
+
+@dataclass
+class ChatState:
+    order_id: int
+    step: str
+    order: object   # load() / create() dagi Order (commit'dan keyin expire bo'ladi — id / step shu yerda)
+
+
+class ConversationCache:
+    def __init__(self, db, Order):
+        self.db = db
+        self.Order = Order
+
+        self.stats = {"loaded": 0, "missing": 0, "created": 0, "updated": 0}
+
+    def load(self, user_id, chat_id):
+        """Chatning eng oxirgi buyurtmasi (bitta so'rov) yoki None."""
+        order = (
+            self.db.session.query(self.Order)
+            .filter_by(user_id=str(user_id), chat_id=str(chat_id))
+            .order_by(self.Order.id.desc())
+            .first()
+        )
+        if order is None:
+            self.stats["missing"] += 1
+            return None
+
+        self.stats["loaded"] += 1
+        return ChatState(order.id, order.step, order)
+
+    def create(self, user_id, chat_id, **fields):
+        """Yangi buyurtma darhol yoziladi — keyingi qadamlar uchun id kerak."""
+        order = self.Order(user_id=str(user_id), chat_id=str(chat_id), **fields)
+        self.db.session.add(order)
+        self.db.session.commit()
+
+        self.stats["created"] += 1
+        return ChatState(order.id, order.step, order)
+
+    def update(self, user_id, chat_id, state, step, **fields):
+        """Qadamni va kiritilgan maydonlarni load() dagi obyekt orqali yozadi."""
+        state.step = state.order.step = step
+        for name, value in fields.items():
+            setattr(state.order, name, value)
+        self.db.session.commit()
+
+        self.stats["updated"] += 1
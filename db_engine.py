@@ -0,0 +1,85 @@
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  DB ENGINE PROFILI
+# ------------------------------------------------------------
+"""
+DB_PROFILE=production (standart):
+
+SQLite
+- journal_mode=WAL — o'quvchilar yozuvchini kutmaydi, bir nechta
+  gunicorn worker bir vaqtda o'qiy oladi
+- busy_timeout — boshqa jarayon yozayotgan bo'lsa darhol
+  "database is locked" emas, SQLITE_BUSY_TIMEOUT_MS gacha kutadi
+- synchronous=NORMAL — WAL rejimida xavfsiz, har commitda fsync yo'q
+
+PostgreSQL / MySQL
+- pool_size / max_overflow / pool_timeout — DB_POOL_* dan
+- pool_pre_ping — uzilib qolgan ulanish so'rovdan oldin aniqlanadi
+- pool_recycle — eski ulanishlar vaqti-vaqti bilan yangilanadi
+
+DB_PROFILE=default — SQLAlchemy standart sozlamalari (taqqoslash uchun).
+"""
+
+
+def engine_options(config):
+    """Config bo'yicha SQLALCHEMY_ENGINE_OPTIONS."""
+    if config.get("DB_PROFILE", "production") != "production":
+        return {}
+
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+
+    if url.get_backend_name() == "sqlite":
+        return {
+            # pysqlite'ning o'z kutish vaqti (sekund) — PRAGMA busy_timeout bilan bir xil
+            "connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000},
+        }
+
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+
+
+def init_db(app, db):
+    """db.init_app + engine profili (SQLite PRAGMA'lari connect event orqali)."""
+    options = dict(engine_options(app.config))
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    db.init_app(app)
+
+    if app.config.get("DB_PROFILE", "production") != "production":
+        return
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == "sqlite":
+            install_sqlite_pragmas(
+                engine,
+                journal_mode=app.config["SQLITE_JOURNAL_MODE"],
+                synchronous=app.config["SQLITE_SYNCHRONOUS"],
+                busy_timeout_ms=app.config["SQLITE_BUSY_TIMEOUT_MS"],
+            )
+
+
+def install_sqlite_pragmas(engine, journal_mode="WAL", synchronous="NORMAL", busy_timeout_ms=5000):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # :memory: bazada WAL bo'lmaydi — SQLite jimgina "memory" qaytaradi
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        finally:
+            cursor.close()
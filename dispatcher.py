@@ -0,0 +1,221 @@
+import heapq
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  WEBHOOK UPDATE DISPATCHER (fast-ack)
+# ------------------------------------------------------------
+"""
+Webhook update'ni faqat tekshiradi, navbatga qo'yadi va darhol
+{"ok": true} qaytaradi. Asosiy ish (ORM, commit, xabarlar) workerlarda:
+
+- bitta chatning update'lari doim bitta workerga tushadi (crc32 bo'yicha),
+  shuning uchun step mashinasi tartibi buzilmaydi
+- turli chatlar workerlar orasida parallel ishlanadi
+- workers=0 — eski rejim: update so'rov ichida ishlanadi
+
+Diqqat: Telegram'ga javob allaqachon qaytgan, shuning uchun handler
+xatosi Telegram tomonidan qayta yuborilmaydi — faqat logga yoziladi.
+Navbat to'lsa submit() False qaytaradi (webhook 503 beradi va Telegram
+update'ni keyinroq qayta yuboradi).
+
+submit(..., delay=N) — update N sekunddan keyin navbatga tushadi
+(rate_limit.py: limitdan oshgan chat). Kechiktirilganlarni bitta
+"webhook-delay" oqimi vaqti kelganda tegishli workerga beradi. O'sha
+paytda navbat to'la bo'lsa update tashlanadi (stats["dropped"]) va
+on_drop(update) chaqiriladi — webhook unda dedup belgisini olib tashlaydi.
+"""
+
+
+def update_chat_id(update):
+    """Update qaysi chatga tegishli (tartib kaliti)."""
+    if "message" in update:
+        return update["message"]["chat"]["id"]
+    if "callback_query" in update:
+        cq = update["callback_query"]
+        message = cq.get("message")
+        if message:
+            return message["chat"]["id"]
+        return cq["from"]["id"]
+    return update.get("update_id")
+
+
+def update_user_id(update):
+    """Update yuborgan foydalanuvchi (bo'lmasa None)."""
+    for kind in ("message", "callback_query"):
+        sender = (update.get(kind) or {}).get("from")
+        if sender:
+            return sender.get("id")
+    return None
+
+
+class UpdateDispatcher:
+    def __init__(self, app, workers=4, queue_size=10000):
+        self.app = app
+        self.workers = workers
+        self.queue_size = queue_size
+
+        self.stats = {"queued": 0, "processed": 0, "failed": 0, "rejected": 0, "delayed": 0, "dropped": 0}
+
+        self._lock = threading.Lock()
+        self._queues = []
+        self._pid = None
+
+        self._delayed = []      # heap: (vaqti, tartib raqami, handler, update, on_drop)
+        self._delayed_seq = 0
+        self._delayed_cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            workers=app.config["WEBHOOK_WORKERS"],
+            queue_size=app.config["WEBHOOK_QUEUE_SIZE"],
+        )
+
+    # ---------------- PUBLIC API ----------------
+
+    def submit(self, handler, update, delay=0.0, on_drop=None):
+        """
+        Update'ni handler(update) uchun navbatga qo'yadi.
+        workers=0 bo'lsa — shu joyning o'zida bajaradi (delay e'tiborsiz).
+        on_drop(update) — kechiktirilgan update keyinroq tashlansa (app context ichida).
+        """
+        if self.workers <= 0:
+            handler(update)
+            return True
+
+        self._ensure_started()
+        if delay > 0:
+            return self._submit_later(handler, update, delay, on_drop)
+
+        q = self._queues[self._shard(update)]
+
+        try:
+            q.put_nowait((handler, update))
+        except queue.Full:
+            self._count("rejected")
+            log.error("Webhook navbati to'la, update #%s rad etildi", update.get("update_id"))
+            return False
+
+        self._count("queued")
+        return True
+
+    def flush(self, timeout=None):
+        """Navbatdagi (va kechiktirilgan) barcha update'lar ishlanguncha kutadi."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._has_delayed():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        for q in list(self._queues):
+            while q.unfinished_tasks:
+                if deadline is not None and time.monotonic() > deadline:
+                    return False
+                time.sleep(0.01)
+        return True
+
+    def pending(self):
+        return sum(q.qsize() for q in self._queues) + len(self._delayed)
+
+    # ---------------- WORKERS ----------------
+
+    def _ensure_started(self):
+        # gunicorn fork qilgandan keyin har bir jarayon o'z workerlarini ochadi
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queues = [queue.Queue(maxsize=self.queue_size)
+                            for _ in range(self.workers)]
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(
+                    target=self._worker, args=(q,),
+                    name=f"webhook-{i}", daemon=True
+                )
+                t.start()
+
+            self._delayed = []
+            self._delayed_cond = threading.Condition()
+            threading.Thread(target=self._delay_worker, name="webhook-delay", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _shard(self, update):
+        key = str(update_chat_id(update)).encode()
+        return zlib.crc32(key) % len(self._queues)
+
+    def _submit_later(self, handler, update, delay, on_drop):
+        with self._delayed_cond:
+            if len(self._delayed) >= self.queue_size:
+                self._count("rejected")
+                log.error("Kechiktirilgan update'lar to'la, #%s rad etildi", update.get("update_id"))
+                return False
+            self._delayed_seq += 1
+            heapq.heappush(self._delayed, (time.monotonic() + delay, self._delayed_seq, handler, update, on_drop))
+            self._delayed_cond.notify()
+
+        self._count("delayed")
+        return True
+
+    def _delay_worker(self):
+        while True:
+            with self._delayed_cond:
+                while not self._delayed or self._delayed[0][0] > time.monotonic():
+                    timeout = self._delayed[0][0] - time.monotonic() if self._delayed else None
+                    self._delayed_cond.wait(timeout)
+                _, _, handler, update, on_drop = heapq.heappop(self._delayed)
+
+                # lock ichida — flush() oraliq holatni ko'rmasin
+                try:
+                    self._queues[self._shard(update)].put_nowait((handler, update))
+                    queued = True
+                except queue.Full:
+                    queued = False
+
+            if queued:
+                self._count("queued")
+            else:
+                self._dropped(update, on_drop)
+
+    def _dropped(self, update, on_drop):
+        self._count("dropped")
+        log.error("Webhook navbati to'la, kechiktirilgan update #%s tashlandi", update.get("update_id"))
+        if on_drop is None:
+            return
+        try:
+            with self.app.app_context():
+                on_drop(update)
+        except Exception:
+            log.exception("Update #%s: on_drop xatosi", update.get("update_id"))
+
+    def _has_delayed(self):
+        with self._delayed_cond:
+            return bool(self._delayed)
+
+    def _worker(self, q):
+        while True:
+            handler, update = q.get()
+            try:
+                # har bir update alohida app context — sessiya oxirida yopiladi
+                with self.app.app_context():
+                    handler(update)
+                self._count("processed")
+            except Exception:
+                self._count("failed")
+                log.exception("Update #%s ishlanmadi", update.get("update_id"))
+            finally:
+                q.task_done()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
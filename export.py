@@ -0,0 +1,344 @@
+import csv
+import io
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+
+from sqlalchemy import case, func, or_, select
+
+import metrics
+from analytics import REVENUE_STATUSES
+from models import db, Order, OrderStatus, Service, Category, AIReview, ExportWatermark
+
+
+# ------------------------------------------------------------
+#  EKSPORT: BUYURTMALAR VA AI TAHLILLARI (CSV / PARQUET)
+# ------------------------------------------------------------
+"""
+BI / jadval uchun oqimli eksport:
+
+    orders   — har bir buyurtma: xizmat, kategoriya, narx, tushum
+               (REVENUE_STATUSES) va AIReview'lar bo'yicha o'rtacha baholar
+    reviews  — har bir AIReview: baholar, transcript, buyurtma va xizmat
+
+Qatorlar yield_per bilan `chunk_size` tadan o'qiladi (PostgreSQL'da
+server-side cursor) va darhol yoziladi: CSV — har bo'lak bitta yield,
+Parquet — har bo'lak bitta row group. Xotira jadval hajmiga bog'liq emas.
+
+Filtrlar: yaratilgan sana oralig'i (date_from / date_to, ikkalasi ham
+kiradi) va buyurtma statusi. `incremental` — ExportWatermark'dagi
+vaqtdan keyin o'zgargan yozuvlar (updated_at); watermark faqat eksport
+oxirigacha yetganda yangilanadi, uzilib qolsa keyingisi shu joydan.
+Eksport davomida o'zgarganlar keyingi safar yana chiqadi — yuklovchi
+tomonda order_id / review_id bo'yicha upsert qilinadi.
+
+Parquet uchun pyarrow kerak (ixtiyoriy: pip install pyarrow).
+"""
+
+CHUNK_SIZE = 5000
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+# ---------------- DATASETLAR ----------------
+
+def _review_totals():
+    return (
+        select(
+            AIReview.order_id,
+            func.count().label("review_count"),
+            func.avg(AIReview.sentiment_score).label("sentiment_score"),
+            func.avg(AIReview.quality_score).label("quality_score"),
+            func.avg(AIReview.difficulty).label("difficulty"),
+            func.sum(AIReview.extra_cost).label("extra_cost"),
+        )
+        .group_by(AIReview.order_id)
+        .subquery()
+    )
+
+
+def _revenue():
+    return case((Order.status.in_(REVENUE_STATUSES), func.coalesce(Service.price, 0.0)), else_=0.0)
+
+
+def _orders(since):
+    reviews = _review_totals()
+    columns = [
+        ("order_id", "int", Order.id),
+        ("created_at", "datetime", Order.created_at),
+        ("updated_at", "datetime", Order.updated_at),
+        ("status", "str", Order.status),
+        ("category_id", "int", Order.category_id),
+        ("category", "str", Category.name),
+        ("service_id", "int", Order.service_id),
+        ("service", "str", Service.name),
+        ("price", "float", Service.price),
+        ("revenue", "float", _revenue()),
+        ("payment_method", "str", Order.payment_method),
+        ("user_id", "str", Order.user_id),
+        ("chat_id", "str", Order.chat_id),
+        ("phone", "str", Order.phone),
+        ("address_text", "str", Order.address_text),
+        ("location_lat", "float", Order.location_lat),
+        ("location_lng", "float", Order.location_lng),
+        ("review_count", "int", func.coalesce(reviews.c.review_count, 0)),
+        ("sentiment_score", "float", reviews.c.sentiment_score),
+        ("quality_score", "float", reviews.c.quality_score),
+        ("difficulty", "float", reviews.c.difficulty),
+        ("extra_cost", "float", reviews.c.extra_cost),
+    ]
+    query = (
+        select(*(expr for _, _, expr in columns))
+        .select_from(Order)
+        .outerjoin(Service, Service.id == Order.service_id)
+        .outerjoin(Category, Category.id == Order.category_id)
+        .outerjoin(reviews, reviews.c.order_id == Order.id)
+        .order_by(Order.id)
+    )
+    if since is not None:
+        # yangi / qayta tahlil qilingan AIReview ham buyurtma qatorini o'zgartiradi
+        query = query.where(or_(
+            Order.updated_at > since,
+            Order.id.in_(select(AIReview.order_id).where(AIReview.updated_at > since)),
+        ))
+    return columns, query, Order.created_at
+
+
+def _reviews(since):
+    columns = [
+        ("review_id", "int", AIReview.id),
+        ("order_id", "int", AIReview.order_id),
+        ("created_at", "datetime", AIReview.created_at),
+        ("updated_at", "datetime", AIReview.updated_at),
+        ("audio_type", "str", AIReview.audio_type),
+        ("sentiment_score", "float", AIReview.sentiment_score),
+        ("quality_score", "float", AIReview.quality_score),
+        ("difficulty", "int", AIReview.difficulty),
+        ("extra_cost", "float", AIReview.extra_cost),
+        ("materials_used", "str", AIReview.materials_used),
+        ("recommended", "str", AIReview.recommended),
+        ("ai_summary", "str", AIReview.ai_summary),
+        ("transcript", "str", AIReview.transcript),
+        ("order_status", "str", Order.status),
+        ("order_created_at", "datetime", Order.created_at),
+        ("category", "str", Category.name),
+        ("service", "str", Service.name),
+        ("price", "float", Service.price),
+    ]
+    query = (
+        select(*(expr for _, _, expr in columns))
+        .select_from(AIReview)
+        .join(Order, Order.id == AIReview.order_id)
+        .outerjoin(Service, Service.id == Order.service_id)
+        .outerjoin(Category, Category.id == Order.category_id)
+        .order_by(AIReview.id)
+    )
+    if since is not None:
+        query = query.where(AIReview.updated_at > since)
+    return columns, query, AIReview.created_at
+
+
+DATASETS = {"orders": _orders, "reviews": _reviews}
+
+
+# ---------------- EKSPORT ----------------
+
+class Export:
+    """
+    Bitta eksport: iteratsiya qilinganda fayl baytlarini bo'laklab beradi.
+
+        job = Export("orders", "csv", statuses=["DONE"], incremental=True)
+        for chunk in job:
+            out.write(chunk)
+    """
+
+    def __init__(self, dataset, fmt="csv", date_from=None, date_to=None, statuses=(),
+                 incremental=False, watermark=None, chunk_size=CHUNK_SIZE):
+        if dataset not in DATASETS:
+            raise ExportError(f"Noma'lum dataset: {dataset} ({', '.join(DATASETS)})")
+        if fmt not in FORMATS:
+            raise ExportError(f"Noma'lum format: {fmt} ({', '.join(FORMATS)})")
+        if fmt == "parquet":
+            _pyarrow()
+
+        try:
+            self.statuses = [OrderStatus(s) for s in statuses if s]
+        except ValueError as e:
+            raise ExportError(f"Noma'lum status: {e}") from None
+
+        self.dataset = dataset
+        self.format = fmt
+        self.date_from = _day(date_from)
+        self.date_to = _day(date_to)
+        self.incremental = incremental
+        self.watermark = watermark or dataset
+        self.chunk_size = chunk_size
+
+        # watermark eksport boshlangan vaqtga qo'yiladi (o'qish davomida
+        # o'zgarganlar keyingi eksportga ham tushadi — yo'qolmaydi)
+        self.started_at = datetime.utcnow()
+        self.since = None
+        if incremental:
+            mark = db.session.get(ExportWatermark, self.watermark)
+            self.since = mark.value if mark else None
+
+        self.rows = 0
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.format]
+
+    @property
+    def filename(self):
+        return f"{self.dataset}_{self.started_at:%Y%m%d_%H%M%S}.{self.format}"
+
+    def _query(self):
+        columns, query, created_col = DATASETS[self.dataset](self.since)
+        if self.date_from:
+            query = query.where(created_col >= self.date_from)
+        if self.date_to:
+            query = query.where(created_col < self.date_to + timedelta(days=1))
+        if self.statuses:
+            query = query.where(Order.status.in_(self.statuses))
+        return columns, query
+
+    def chunks(self):
+        """Qatorlar (tuple) ro'yxatlari, har biri ko'pi bilan chunk_size ta."""
+        columns, query = self._query()
+        result = db.session.execute(query.execution_options(yield_per=self.chunk_size))
+        for rows in result.partitions():
+            yield [tuple(_plain(v) for v in row) for row in rows]
+
+    def __iter__(self):
+        columns, _ = self._query()
+        writer = _write_csv if self.format == "csv" else _write_parquet
+
+        with metrics.timer("export_duration_seconds", dataset=self.dataset, format=self.format):
+            for data in writer(columns, self._counted()):
+                if data:
+                    yield data
+
+        metrics.inc("export_rows_total", self.rows, dataset=self.dataset, format=self.format)
+        if self.incremental:
+            self._save_watermark()
+
+    def _counted(self):
+        for rows in self.chunks():
+            self.rows += len(rows)
+            yield rows
+
+    def _save_watermark(self):
+        mark = db.session.get(ExportWatermark, self.watermark) or ExportWatermark(name=self.watermark)
+        mark.value = self.started_at
+        mark.row_count = self.rows
+        db.session.add(mark)
+        db.session.commit()
+
+
+def watermarks():
+    return ExportWatermark.query.order_by(ExportWatermark.name).all()
+
+
+def _day(value):
+    if not value or isinstance(value, datetime):
+        return value or None
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value)
+        except ValueError:
+            raise ExportError(f"Sana YYYY-MM-DD bo'lishi kerak: {value}") from None
+    return datetime.combine(value, time.min)
+
+
+def _plain(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+# ---------------- CSV ----------------
+
+def _write_csv(columns, chunks):
+    buf = io.StringIO()
+    out = csv.writer(buf)
+
+    # Excel UTF-8 ni BOM bo'yicha taniydi (kirill / o‘ harflari)
+    buf.write("\ufeff")
+    out.writerow(name for name, _, _ in columns)
+
+    for rows in chunks:
+        out.writerows(
+            tuple(v.isoformat(sep=" ") if isinstance(v, datetime) else v for v in row)
+            for row in rows
+        )
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+
+    yield buf.getvalue().encode("utf-8")
+
+
+# ---------------- PARQUET ----------------
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError("Parquet uchun pyarrow kerak: pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+class _Sink:
+    """ParquetWriter uchun fayl o'rnida: yozilgan baytlar har row group'dan keyin olinadi."""
+
+    def __init__(self):
+        self._parts = []
+        self._size = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _write_parquet(columns, chunks):
+    pa, pq = _pyarrow()
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(),
+             "datetime": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind, _ in columns])
+
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in chunks:
+            table = pa.Table.from_arrays(
+                [pa.array(values, type=field.type)
+                 for values, field in zip(zip(*rows), schema)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
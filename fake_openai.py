@@ -0,0 +1,89 @@
+import json
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+
+# ------------------------------------------------------------
+#  FAKE OPENAI CLIENT (offline test uchun)
+# ------------------------------------------------------------
+"""
+openai.OpenAI() o'rnini bosuvchi stub. Faqat ai_service ishlatadigan
+qismlar bor: audio.transcriptions.create va chat.completions.create.
+
+    from ai_service import set_client
+    from fake_openai import FakeOpenAI
+
+    fake = FakeOpenAI(transcript="Usta juda yaxshi ishladi", latency=0.2)
+    fake.fail_next(1, TimeoutError("timeout"))
+    set_client(fake)
+"""
+
+_BATCH_ID_RE = re.compile(r"^\[(r\d+)\]:", re.MULTILINE)
+
+DEFAULT_ANALYSIS = {
+    "sentiment_score": 80,
+    "quality_score": 90,
+    "difficulty": 3,
+    "materials_used": "",
+    "extra_cost": 0,
+    "recommended": "",
+    "ai_summary": "Mijoz mamnun",
+}
+
+
+class FakeOpenAI:
+    def __init__(self, transcript="Salom, ish yaxshi bajarildi", analysis=None, latency=0.0):
+        self.transcript = transcript
+        self.analysis = analysis if analysis is not None else dict(DEFAULT_ANALYSIS)
+        self.latency = latency
+
+        self.calls = []
+        self.failures = deque()
+        self.lock = threading.Lock()
+
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def fail_next(self, count=1, error=None):
+        with self.lock:
+            for _ in range(count):
+                self.failures.append(error or RuntimeError("fake OpenAI error"))
+
+    def content(self, messages):
+        """Chat javobi matni. Kerak bo'lsa subclass'da qayta aniqlanadi."""
+        prompt = messages[-1]["content"]
+
+        # batch so'rov (ai_service.analyze_many): [r1], [r2] ... har biriga natija
+        ids = _BATCH_ID_RE.findall(prompt)
+        if ids:
+            results = [{"id": i, **self.analysis} for i in ids]
+            return json.dumps({"results": results}, ensure_ascii=False)
+
+        return json.dumps(self.analysis, ensure_ascii=False)
+
+    # ---------------- ENDPOINTS ----------------
+
+    def _call(self, kind, kwargs):
+        with self.lock:
+            self.calls.append((kind, kwargs))
+            failure = self.failures.popleft() if self.failures else None
+
+        if self.latency:
+            time.sleep(self.latency)
+        if failure is not None:
+            raise failure
+
+    def _transcribe(self, model, file, **kwargs):
+        self._call("transcribe", {"model": model, "file": getattr(file, "name", None), **kwargs})
+        return SimpleNamespace(text=self.transcript)
+
+    def _complete(self, model, messages, **kwargs):
+        self._call("chat", {"model": model, "messages": messages, **kwargs})
+        message = SimpleNamespace(role="assistant", content=self.content(messages))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+        )
@@ -0,0 +1,173 @@
+import argparse
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+
+# ------------------------------------------------------------
+#  FAKE TELEGRAM BOT API (offline test uchun)
+# ------------------------------------------------------------
+"""
+api.telegram.org o'rnini bosuvchi kichik server.
+
+Ishga tushirish:
+    python fake_telegram.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081 gunicorn app:app
+
+Boshqaruv endpointlari:
+    GET    /_fake/sent   — qabul qilingan so'rovlar
+    DELETE /_fake/sent   — ro'yxatni tozalash
+    POST   /_fake/fail   — keyingi N so'rovga xato qaytarish
+                           {"status": 429, "retry_after": 1, "count": 3}
+    POST   /_fake/updates — getUpdates navbatiga update qo'shish
+                           {"token": "...", "updates": [{...}, ...]}
+                           (update_id berilmasa avtomatik qo'yiladi)
+"""
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.sent = []
+        self.failures = deque()
+        self.lock = threading.Lock()
+        self._message_id = 0
+        self._server = None
+
+        # getUpdates (long polling): token → update'lar navbati
+        self.updates = defaultdict(list)
+        self._update_id = 0
+        self._updates_ready = threading.Condition(self.lock)
+
+        self.app = Flask(__name__)
+        self._register_routes()
+
+    # ---------------- ROUTES ----------------
+
+    def _register_routes(self):
+        app = self.app
+
+        @app.route("/bot<token>/<method>", methods=["POST"])
+        def bot_method(token, method):
+            payload = request.get_json(silent=True) or request.form.to_dict()
+
+            if method == "getUpdates":
+                return jsonify({"ok": True, "result": self._get_updates(token, payload)})
+
+            with self.lock:
+                failure = self.failures.popleft() if self.failures else None
+                if failure is None:
+                    self._message_id += 1
+                    message_id = self._message_id
+                    self.sent.append({"token": token, "method": method, "payload": payload})
+
+            if failure is not None:
+                return self._error(failure)
+
+            return jsonify({"ok": True, "result": {
+                "message_id": message_id,
+                "chat": {"id": payload.get("chat_id")},
+                "text": payload.get("text"),
+            }})
+
+        @app.route("/_fake/sent", methods=["GET", "DELETE"])
+        def fake_sent():
+            if request.method == "DELETE":
+                self.reset()
+                return jsonify({"ok": True})
+            with self.lock:
+                return jsonify(list(self.sent))
+
+        @app.route("/_fake/fail", methods=["POST"])
+        def fake_fail():
+            data = request.get_json() or {}
+            self.fail_next(
+                count=int(data.get("count", 1)),
+                status=int(data.get("status", 429)),
+                retry_after=data.get("retry_after"),
+            )
+            return jsonify({"ok": True})
+
+        @app.route("/_fake/updates", methods=["POST"])
+        def fake_updates():
+            data = request.get_json() or {}
+            ids = self.push_updates(data["token"], data.get("updates", []))
+            return jsonify({"ok": True, "update_ids": ids})
+
+    def _get_updates(self, token, payload):
+        offset = int(payload.get("offset") or 0)
+        limit = int(payload.get("limit") or 100)
+        deadline = time.monotonic() + float(payload.get("timeout") or 0)
+
+        with self._updates_ready:
+            queue = self.updates[token]
+            # offset dan kichik update'lar tasdiqlangan — o'chiriladi
+            queue[:] = [u for u in queue if u["update_id"] >= offset]
+
+            while not queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._updates_ready.wait(remaining)
+
+            return list(queue[:limit])
+
+    def _error(self, failure):
+        status, retry_after = failure
+        body = {"ok": False, "error_code": status, "description": "fake error"}
+        if retry_after is not None:
+            body["parameters"] = {"retry_after": retry_after}
+            body["description"] = f"Too Many Requests: retry after {retry_after}"
+        return jsonify(body), status
+
+    # ---------------- CONTROL ----------------
+
+    def fail_next(self, count=1, status=429, retry_after=None):
+        with self.lock:
+            for _ in range(count):
+                self.failures.append((status, retry_after))
+
+    def push_updates(self, token, updates):
+        """getUpdates uchun update'lar qo'shadi, update_id'larni qaytaradi."""
+        ids = []
+        with self._updates_ready:
+            for update in updates:
+                update = dict(update)
+                if "update_id" not in update:
+                    self._update_id += 1
+                    update["update_id"] = self._update_id
+                self._update_id = max(self._update_id, update["update_id"])
+                self.updates[token].append(update)
+                ids.append(update["update_id"])
+            self._updates_ready.notify_all()
+        return ids
+
+    def reset(self):
+        with self.lock:
+            self.sent.clear()
+            self.failures.clear()
+            self.updates.clear()
+
+    # ---------------- SERVER ----------------
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serverni fon threadida ishga tushiradi va base URL qaytaradi."""
+        self._server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    FakeTelegram().app.run(host=args.host, port=args.port, threaded=True)
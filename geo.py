@@ -0,0 +1,173 @@
+import heapq
+import math
+
+
+# ------------------------------------------------------------
+#  GEO: GEOHASH, MASOFA, KD-TREE
+# ------------------------------------------------------------
+"""
+Tashqi kutubxonasiz geo yordamchilar:
+
+- geohash — DBda saqlanadigan katak kodi; bir xil prefiks = yaqin joy,
+  shuning uchun oddiy B-tree indeks bilan katak bo'yicha qidirish mumkin
+- haversine_km — ikki nuqta orasidagi masofa (km)
+- KDTree — nuqtalar sfera ustidagi 3D birlik vektorlarga aylantiriladi;
+  to'g'ri chiziq (xorda) masofasi katta doira masofasiga monoton,
+  shuning uchun "k ta eng yaqin" natijasi aniq bo'ladi (qutb va
+  180° meridian atrofida ham)
+"""
+
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+
+# ---------------- GEOHASH ----------------
+
+def geohash_encode(lat, lng, precision=7):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+
+    return "".join(chars)
+
+
+def geohash_bounds(code):
+    """(lat_min, lat_max, lng_min, lng_max)"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+
+    for char in code:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def geohash_neighbors(code):
+    """Katakning o'zi va atrofidagi 8 ta katak (9 ta kod)."""
+    lat_min, lat_max, lng_min, lng_max = geohash_bounds(code)
+    d_lat, d_lng = lat_max - lat_min, lng_max - lng_min
+    lat_c, lng_c = (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+
+    cells = []
+    for dy in (-1, 0, 1):
+        lat = lat_c + dy * d_lat
+        if not -90 <= lat <= 90:
+            continue
+        for dx in (-1, 0, 1):
+            lng = (lng_c + dx * d_lng + 180) % 360 - 180
+            cell = geohash_encode(lat, lng, len(code))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+# ---------------- DISTANCE ----------------
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    d_lat = p2 - p1
+    d_lng = math.radians(lng2 - lng1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(lat, lng):
+    p, l = math.radians(lat), math.radians(lng)
+    return (math.cos(p) * math.cos(l), math.cos(p) * math.sin(l), math.sin(p))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+# ---------------- KD-TREE ----------------
+
+class KDTree:
+    """
+    Statik KD-tree: items = [(key, lat, lng, data), ...].
+    O'zgarganda qaytadan quriladi (n log n).
+    """
+
+    def __init__(self, items):
+        points = [(_unit_vector(lat, lng), key, data) for key, lat, lng, data in items]
+        self.size = len(points)
+        self._root = self._build(points, 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        return (
+            points[mid], axis,
+            self._build(points[:mid], depth + 1),
+            self._build(points[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, lat, lng, k=5, predicate=None, max_km=None):
+        """[(masofa_km, key, data), ...] — yaqinidan uzoqqa."""
+        if k <= 0 or self._root is None:
+            return []
+
+        target = _unit_vector(lat, lng)
+        limit = None
+        if max_km is not None:
+            limit = (2 * math.sin(min(max_km / EARTH_RADIUS_KM, math.pi) / 2)) ** 2
+
+        heap = []  # (-d², tartib, key, data) — eng uzoq topilgan tepada
+        counter = 0
+        stack = [(self._root, 0.0)]  # (tugun, bo'lish tekisligigacha masofa²)
+
+        while stack:
+            node, plane_d2 = stack.pop()
+            if node is None:
+                continue
+            # bu shoxda yaqinroq nuqta bo'lishi mumkin emas
+            if len(heap) == k and plane_d2 > -heap[0][0]:
+                continue
+            if limit is not None and plane_d2 > limit:
+                continue
+
+            (point, key, data), axis, left, right = node
+
+            d2 = sum((a - b) ** 2 for a, b in zip(point, target))
+            if (limit is None or d2 <= limit) and (predicate is None or predicate(key, data)):
+                counter += 1
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, counter, key, data))
+                elif d2 < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d2, counter, key, data))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append((far, max(plane_d2, diff * diff)))
+            stack.append((near, plane_d2))
+
+        result = sorted(heap, key=lambda item: (-item[0], item[1]))
+        return [(_chord_to_km(math.sqrt(-neg_d2)), key, data) for neg_d2, _, key, data in result]
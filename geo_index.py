@@ -0,0 +1,208 @@
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session
+
+from geo import KDTree, geohash_encode, geohash_neighbors, haversine_km
+from models import db, Order, OrderStatus, Master, GEOHASH_PRECISION
+from pagination import prefix_range
+
+
+# ------------------------------------------------------------
+#  GEO INDEX: ENG YAQIN BUYURTMALAR / USTALAR
+# ------------------------------------------------------------
+"""
+Ikki savolga javob beradi:
+- "usta uchun eng yaqin k ta ochiq buyurtma"   (/orders, near_first)
+- "buyurtma uchun eng yaqin bo'sh ustalar"     (yangi buyurtma xabari)
+
+Xotirada ikkita KD-tree (geo.KDTree) — so'rov O(log n).
+Daraxtlar Order / Master lokatsiyasi, statusi yoki bandligi
+o'zgargan commitdan keyin (shu jarayonda) yoki GEO_INDEX_TTL
+sekunddan keyin (boshqa workerlardagi o'zgarishlar uchun) qayta quriladi.
+
+GEO_INDEX_ENABLED=0 bo'lsa xotiradagi indeks ishlatilmaydi: nomzodlar
+DBdan geohash kataklari bo'yicha olinadi (ix_order_geohash), katak
+kattalashtirilib boriladi, keyin haversine bilan saralanadi.
+"""
+
+OPEN_STATUSES = (OrderStatus.PENDING, OrderStatus.IN_PROGRESS)
+
+_WATCHED = {
+    Order: ("location_lat", "location_lng", "status", "category_id"),
+    Master: ("location_lat", "location_lng", "is_available", "category_id"),
+}
+
+
+class GeoIndex:
+    def __init__(self, enabled=True, ttl=30):
+        self.enabled = enabled
+        self.ttl = ttl
+
+        self.stats = {"queries": 0, "rebuilds": 0}
+
+        self._orders = None
+        self._masters = None
+        self._built_at = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(enabled=config["GEO_INDEX_ENABLED"], ttl=config["GEO_INDEX_TTL"])
+
+    # ---------------- PUBLIC API ----------------
+
+    def nearest_orders(self, lat, lng, k=10, category_id=None, max_km=None):
+        """[(masofa_km, order_id), ...] — ochiq, lokatsiyasi bor buyurtmalar."""
+        self.stats["queries"] += 1
+        predicate = _category_predicate(category_id)
+
+        if not self.enabled:
+            rows = self._nearest_from_cells(
+                Order, Order.status.in_(OPEN_STATUSES), lat, lng, k, category_id, max_km
+            )
+            return [(km, key) for km, key, _ in rows[:k]]
+
+        self._ensure_fresh()
+        return [(km, key) for km, key, _ in
+                self._orders.nearest(lat, lng, k, predicate=predicate, max_km=max_km)]
+
+    def nearest_masters(self, lat, lng, k=5, category_id=None, max_km=None):
+        """
+        [(masofa_km, master_id), ...] — bo'sh ustalar. Kategoriya filtri
+        o'rnatilgan usta faqat o'sha kategoriyadagi buyurtmaga mos keladi.
+        """
+        self.stats["queries"] += 1
+
+        def predicate(key, master_category):
+            return not master_category or category_id is None or master_category == category_id
+
+        if not self.enabled:
+            rows = self._nearest_from_cells(
+                Master, Master.is_available.is_(True), lat, lng, k * 4, None, max_km
+            )
+            return [(km, key) for km, key, cat in rows if predicate(key, cat)][:k]
+
+        self._ensure_fresh()
+        return [(km, key) for km, key, _ in
+                self._masters.nearest(lat, lng, k, predicate=predicate, max_km=max_km)]
+
+    def count_orders(self, category_id=None):
+        """Lokatsiyasi bor ochiq buyurtmalar soni."""
+        query = Order.query.filter(
+            Order.status.in_(OPEN_STATUSES), Order.location_lat.isnot(None)
+        )
+        if category_id:
+            query = query.filter(Order.category_id == category_id)
+        return query.order_by(None).count()
+
+    def invalidate(self):
+        self._dirty = True
+
+    def watch(self):
+        """Kuzatilgan maydonlar o'zgargan commitdan keyin indeks eskiradi."""
+        _indexes.add(self)
+        return self
+
+    # ---------------- IN-MEMORY ----------------
+
+    def _ensure_fresh(self):
+        if not self._dirty and time.monotonic() - self._built_at < self.ttl:
+            return
+
+        with self._lock:
+            if not self._dirty and time.monotonic() - self._built_at < self.ttl:
+                return
+
+            # qayta qurish davomida kelgan o'zgarish keyingi so'rovda hisobga olinadi
+            self._dirty = False
+            orders = (
+                db.session.query(Order.id, Order.location_lat, Order.location_lng, Order.category_id)
+                .filter(Order.status.in_(OPEN_STATUSES), Order.location_lat.isnot(None))
+                .all()
+            )
+            masters = (
+                db.session.query(Master.id, Master.location_lat, Master.location_lng, Master.category_id)
+                .filter(Master.is_available.is_(True), Master.location_lat.isnot(None))
+                .all()
+            )
+
+            self._orders = KDTree(orders)
+            self._masters = KDTree(masters)
+            self._built_at = time.monotonic()
+            self.stats["rebuilds"] += 1
+
+    # ---------------- DB (geohash) ----------------
+
+    def _nearest_from_cells(self, model, condition, lat, lng, k, category_id, max_km):
+        """
+        Katakni kattalashtirib boradi: avval 6 belgili katak (~1 km) va
+        8 ta qo'shnisi, yetarli topilmasa — 1 belgi qisqaroq (≈ 5–8 marta
+        kattaroq). Natija taxminiy: katak chetidagi nuqtalar tartibi
+        KD-tree'dagidek aniq emas. [(masofa_km, id, category_id), ...]
+        """
+        code = geohash_encode(lat, lng, GEOHASH_PRECISION)
+        rows = []
+
+        for precision in range(6, 1, -1):
+            cells = geohash_neighbors(code[:precision])
+            query = (
+                db.session.query(model.id, model.location_lat, model.location_lng, model.category_id)
+                .filter(condition, or_(*(prefix_range(model.geohash, c) for c in cells)))
+            )
+            if category_id:
+                query = query.filter(model.category_id == category_id)
+
+            rows = query.all()
+            if len(rows) >= k:
+                break
+
+        ranked = sorted(
+            (haversine_km(lat, lng, r[1], r[2]), r[0], r[3]) for r in rows
+        )
+        if max_km is not None:
+            ranked = [r for r in ranked if r[0] <= max_km]
+        return ranked
+
+
+def _category_predicate(category_id):
+    if not category_id:
+        return None
+    return lambda key, order_category: order_category == category_id
+
+
+# ---------------- INVALIDATION ----------------
+
+# listener'lar Session klassiga modul importida bir marta ulanadi;
+# watch() faqat indeksni ro'yxatga qo'shadi
+_indexes = weakref.WeakSet()
+
+
+def _mark(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        fields = _WATCHED.get(type(obj))
+        if fields is None:
+            continue
+        if obj in session.new or obj in session.deleted or any(
+            inspect(obj).attrs[name].history.has_changes() for name in fields
+        ):
+            session.info["geo_changed"] = True
+            return
+
+
+def _commit(session):
+    if session.info.pop("geo_changed", False):
+        for index in list(_indexes):
+            index.invalidate()
+
+
+def _rollback(session):
+    session.info.pop("geo_changed", None)
+
+
+for _name, _fn in (("after_flush", _mark), ("after_commit", _commit), ("after_rollback", _rollback)):
+    if not event.contains(Session, _name, _fn):
+        event.listen(Session, _name, _fn)
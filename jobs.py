@@ -0,0 +1,287 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import metrics
+from models import db, AIJob, AIJobStatus, AIReview
+from ai_service import transcribe_audio, analyze_many, review_fields
+from ai_schema import AnalysisParseError
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  AI JOB RUNNER (Whisper + GPT fonda)
+# ------------------------------------------------------------
+"""
+upload_audio faqat AIJob yozadi va darhol javob qaytaradi.
+Workerlar navbatdan vazifani oladi (UPDATE ... WHERE status=QUEUED —
+bir nechta jarayon bo'lsa ham bitta vazifa bir marta olinadi) va
+Whisper + GPT ni bajaradi. Navbatda bir nechta vazifa bo'lsa, ular
+birga olinadi va GPT tahlili bitta batch so'rovda qilinadi (analyze_many).
+
+- holat DBda saqlanadi, jarayon qayta ishga tushsa navbat yo'qolmaydi
+- xato bo'lsa exponential backoff bilan AI_JOB_MAX_ATTEMPTS martagacha
+- AI_JOB_TIMEOUT dan uzoq RUNNING bo'lib qolgan vazifa (worker o'lgan)
+  qayta navbatga qaytariladi
+- bir vaqtda ishlovchi vazifalar soni = AI_JOB_WORKERS (har bir jarayonda):
+  workerlar umumiy slotlardan oladi va faqat bo'sh slot soniga qadar
+  vazifa oladi — olingan vazifa darhol boshlanadi (started_at to'g'ri,
+  batch'da navbat kutib timeout'ga tushmaydi)
+"""
+
+
+class AIJobRunner:
+    def __init__(self, app, workers=2, max_attempts=3, timeout=300,
+                 backoff=10, poll_interval=2.0, batch_size=1):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max(1, workers))
+        self._pid = None
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            workers=app.config["AI_JOB_WORKERS"],
+            max_attempts=app.config["AI_JOB_MAX_ATTEMPTS"],
+            timeout=app.config["AI_JOB_TIMEOUT"],
+            batch_size=app.config["AI_BATCH_MAX_ITEMS"],
+        )
+
+    # ---------------- PUBLIC API ----------------
+
+    def submit(self, order_id, audio_file, audio_type):
+        job = AIJob(order_id=order_id, audio_file=audio_file, audio_type=audio_type)
+        db.session.add(job)
+        db.session.commit()
+
+        self.ensure_started()
+        self._wake.set()
+        return job
+
+    def ensure_started(self):
+        # gunicorn fork qilgandan keyin har bir jarayon o'z workerlarini ochadi
+        if self._pid == os.getpid() or self.workers <= 0:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"ai-job-{i}", daemon=True)
+                t.start()
+            self._pid = os.getpid()
+
+    def run_pending(self):
+        """Navbatdagi barcha vazifalarni shu threadda bajaradi (CLI / test uchun)."""
+        done = 0
+        while True:
+            count = self._run_next()
+            if not count:
+                return done
+            done += count
+
+    # ---------------- WORKER ----------------
+
+    def _worker(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self._requeue_stale()
+                    if self._run_next():
+                        continue
+            except Exception:
+                log.exception("AI job worker xatosi")
+
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _run_next(self):
+        """Bo'sh slotlar soniga qadar vazifa olib bajaradi. Olinganlar soni."""
+        slots = self._acquire_slots(self.batch_size)
+        try:
+            job_ids = self._claim_many(slots)
+            if job_ids:
+                self._run(job_ids)
+            return len(job_ids)
+        finally:
+            for _ in range(slots):
+                self._slots.release()
+
+    def _acquire_slots(self, limit):
+        # bittasi kutib olinadi, qolganlari — hozir bo'sh bo'lsa
+        self._slots.acquire()
+        slots = 1
+        while slots < limit and self._slots.acquire(blocking=False):
+            slots += 1
+        return slots
+
+    def _claim_many(self, limit):
+        job_ids = []
+        while len(job_ids) < limit:
+            job_id = self._claim()
+            if job_id is None:
+                break
+            job_ids.append(job_id)
+        return job_ids
+
+    def _claim(self):
+        while True:
+            job_id = (
+                db.session.query(AIJob.id)
+                .filter(AIJob.status == AIJobStatus.QUEUED,
+                        AIJob.run_after <= datetime.utcnow())
+                .order_by(AIJob.id)
+                .limit(1)
+                .scalar()
+            )
+            if job_id is None:
+                return None
+
+            claimed = (
+                AIJob.query
+                .filter_by(id=job_id, status=AIJobStatus.QUEUED)
+                .update({
+                    "status": AIJobStatus.RUNNING,
+                    "attempts": AIJob.attempts + 1,
+                    "started_at": datetime.utcnow(),
+                    "stage": None,
+                }, synchronize_session=False)
+            )
+            db.session.commit()
+
+            if claimed:
+                return job_id
+
+    def _requeue_stale(self):
+        deadline = datetime.utcnow() - timedelta(seconds=self.timeout)
+        stale = AIJob.query.filter(
+            AIJob.status == AIJobStatus.RUNNING,
+            AIJob.started_at < deadline
+        ).all()
+
+        for job in stale:
+            self._fail(job, "Timeout: vazifa belgilangan vaqtda tugamadi")
+        if stale:
+            db.session.commit()
+
+    def _run(self, job_ids):
+        """
+        Bir nechta vazifa birga: Whisper har bir fayl uchun parallel
+        (har biri o'z slotida), GPT tahlili esa bitta (yoki bir necha)
+        batch so'rovda.
+        """
+        jobs = [db.session.get(AIJob, job_id) for job_id in job_ids]
+        attempts = {job.id: job.attempts for job in jobs}
+        paths = [job.audio_file for job in jobs]
+        self._set_stage(jobs, "transcribe")
+
+        # thread ichida ORM obyektiga tegilmaydi (commitdan keyin expired —
+        # app context'siz qayta yuklab bo'lmaydi), faqat fayl yo'li beriladi
+        def transcribe(path):
+            try:
+                transcript = transcribe_audio(path, strict=True)
+                if not transcript:
+                    raise RuntimeError("Whisper bo'sh matn qaytardi")
+                return transcript
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=len(paths)) as pool, \
+                metrics.timer("ai_job_stage_duration_seconds", stage="transcribe"):
+            transcribed = list(zip(jobs, pool.map(transcribe, paths)))
+
+        ready = []
+        for job, result in transcribed:
+            if isinstance(result, Exception):
+                self._job_failed(job, attempts[job.id], result)
+            else:
+                ready.append((job, result))
+
+        self._set_stage([job for job, _ in ready], "analyze")
+        with metrics.timer("ai_job_stage_duration_seconds", stage="analyze"):
+            analyses = analyze_many(
+                [(transcript, job.audio_type) for job, transcript in ready],
+                strict=True
+            )
+
+        for (job, transcript), analysis in zip(ready, analyses):
+            if isinstance(analysis, Exception):
+                self._job_failed(job, attempts[job.id], analysis)
+                continue
+
+            # _job_failed kabi: timeout sababli boshqa worker olib bo'lgan
+            # bo'lsa — natija tashlanadi (AIReview ikki marta yozilmasin)
+            finished = (
+                AIJob.query
+                .filter_by(id=job.id, status=AIJobStatus.RUNNING, attempts=attempts[job.id])
+                .update({
+                    "status": AIJobStatus.DONE,
+                    "stage": "save",
+                    "error": None,
+                    "finished_at": datetime.utcnow(),
+                }, synchronize_session=False)
+            )
+            if not finished:
+                log.warning("AI job #%s boshqa workerga o'tgan — natija tashlandi", job.id)
+                continue
+
+            review = AIReview(
+                order_id=job.order_id,
+                audio_file=job.audio_file,
+                audio_type=job.audio_type,
+                transcript=transcript,
+                **review_fields(analysis)
+            )
+            db.session.add(review)
+            db.session.flush()
+
+            AIJob.query.filter_by(id=job.id).update(
+                {"ai_review_id": review.id}, synchronize_session=False
+            )
+            metrics.inc("ai_jobs_total", result="done")
+
+        db.session.commit()
+
+    def _set_stage(self, jobs, stage):
+        for job in jobs:
+            job.stage = stage
+        db.session.commit()
+
+    def _job_failed(self, job, attempt, error):
+        log.warning("AI job #%s xato (urinish %s): %s", job.id, attempt, error)
+
+        db.session.refresh(job)
+        if job.status != AIJobStatus.RUNNING or job.attempts != attempt:
+            return  # timeout sababli boshqa worker olib bo'lgan
+
+        # buzuq javob uchun qayta so'rash ai_service ichida bo'lgan —
+        # butun vazifani takrorlash faqat pul sarflaydi
+        retry = not isinstance(error, AnalysisParseError)
+        self._fail(job, f"{type(error).__name__}: {error}", retry=retry)
+        db.session.commit()
+
+    def _fail(self, job, error, retry=True):
+        job.error = error
+
+        if not retry or job.attempts >= self.max_attempts:
+            job.status = AIJobStatus.FAILED
+            job.finished_at = datetime.utcnow()
+            metrics.inc("ai_jobs_total", result="failed")
+        else:
+            job.status = AIJobStatus.QUEUED
+            metrics.inc("ai_jobs_total", result="retry")
+            delay = self.backoff * (2 ** (job.attempts - 1))
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
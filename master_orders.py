@@ -0,0 +1,223 @@
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from models import Order, OrderStatus
+
+
+# ------------------------------------------------------------
+#  USTA BOT: /orders RO'YXATI VA BUYURTMA KARTOCHKASI
+# ------------------------------------------------------------
+"""
+/orders faol buyurtmalarni sahifalab ko'rsatadi (MASTER_ORDERS_PAGE_SIZE):
+
+- Service bitta JOIN bilan olinadi (har bir tugma uchun alohida so'rov yo'q)
+- usta kategoriya bo'yicha filtrlashi mumkin (Master.category_id)
+- near_first — usta lokatsiyasiga eng yaqin buyurtmalar birinchi
+  (geo_index.GeoIndex orqali)
+
+Sahifa raqami callback_data ichida (Telegram cheklovi — 64 bayt),
+shuning uchun bu yerda keyset emas, oddiy OFFSET: faol buyurtmalar
+ix_order_status_created indeksi bo'yicha o'qiladi.
+
+Buyurtma kartochkasi (ord_<id>) matni keshlanadi. Order o'zgarib
+flush bo'lganda shu jarayondagi yozuv o'chiriladi; boshqa workerlarda
+eng ko'pi bilan `ttl` sekund eskirgan bo'lishi mumkin.
+"""
+
+ACTIVE_STATUSES = (OrderStatus.PENDING, OrderStatus.IN_PROGRESS)
+
+
+# ---------------- LIST ----------------
+
+def active_orders_query(master=None):
+    query = (
+        Order.query
+        .options(joinedload(Order.service))
+        .filter(Order.status.in_(ACTIVE_STATUSES))
+    )
+    if master is not None and master.category_id:
+        query = query.filter(Order.category_id == master.category_id)
+    return query
+
+
+def _nearest_page(master, geo, start, page_size):
+    """
+    near_first: lokatsiyasi bor buyurtmalar GeoIndex (KD-tree) bo'yicha
+    yaqinidan uzoqqa, ulardan keyin lokatsiyasizlari (yangilari birinchi).
+    """
+    want = start + page_size
+    hits = geo.nearest_orders(
+        master.location_lat, master.location_lng, k=want, category_id=master.category_id
+    )
+
+    ids = [order_id for _, order_id in hits[start:want]]
+    by_id = {
+        o.id: o for o in active_orders_query(master).filter(Order.id.in_(ids))
+    } if ids else {}
+    orders = [by_id[i] for i in ids if i in by_id]
+
+    # k tadan kam topildi — lokatsiyali buyurtmalar tugadi
+    if len(hits) < want:
+        rest = (
+            active_orders_query(master)
+            .filter(Order.location_lat.is_(None))
+            .order_by(Order.created_at.desc(), Order.id.desc())
+            .offset(max(0, start - len(hits)))
+            .limit(want - max(len(hits), start))
+            .all()
+        )
+        orders.extend(rest)
+    return orders
+
+
+def active_orders_page(master, page=0, page_size=8, geo=None):
+    """(buyurtmalar, jami soni, sahifa) — sahifa chegaradan chiqsa to'g'rilanadi."""
+    query = active_orders_query(master)
+    total = query.order_by(None).count()
+
+    pages = max(1, math.ceil(total / page_size))
+    page = min(max(page, 0), pages - 1)
+
+    near = (
+        geo is not None and master is not None
+        and master.near_first and master.location_lat is not None
+    )
+    if near:
+        return _nearest_page(master, geo, page * page_size, page_size), total, page
+
+    orders = (
+        query.order_by(Order.created_at.desc(), Order.id.desc())
+        .offset(page * page_size).limit(page_size).all()
+    )
+    return orders, total, page
+
+
+def order_button_text(order):
+    service = order.service.name if order.service else "—"
+    return f"#{order.id} - {service}"
+
+
+def orders_keyboard(orders, total, page, page_size, master=None):
+    rows = [
+        [{"text": order_button_text(o), "callback_data": f"ord_{o.id}"}]
+        for o in orders
+    ]
+
+    pages = max(1, math.ceil(total / page_size))
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append({"text": "⬅️", "callback_data": f"ol_{page - 1}"})
+        nav.append({"text": f"{page + 1}/{pages}", "callback_data": f"ol_{page}"})
+        if page < pages - 1:
+            nav.append({"text": "➡️", "callback_data": f"ol_{page + 1}"})
+        rows.append(nav)
+
+    near = master is not None and master.near_first
+    rows.append([
+        {"text": "🗂 Kategoriya", "callback_data": "oc"},
+        {"text": "🕒 Yangilari" if near else "📍 Yaqinlari",
+         "callback_data": "on_0" if near else "on_1"},
+    ])
+    return {"inline_keyboard": rows}
+
+
+def category_filter_keyboard(categories, selected=None):
+    rows = [[{
+        "text": ("✅ " if not selected else "") + "Hammasi",
+        "callback_data": "of_0"
+    }]]
+    for c in categories:
+        mark = "✅ " if c.id == selected else ""
+        rows.append([{
+            "text": f"{mark}{c.icon or ''} {c.name}".strip(),
+            "callback_data": f"of_{c.id}"
+        }])
+    return {"inline_keyboard": rows}
+
+
+# ---------------- ORDER CARD ----------------
+
+def render_order_card(order):
+    return (
+        f"Buyurtma #{order.id}\n"
+        f"Xizmat: {order.service.name if order.service else '—'}\n"
+        f"Telefon: {order.phone}\n"
+        f"Izoh: {order.comment}\n"
+        f"To‘lov: {order.payment_method}\n"
+        "\nStatusni tanlang:"
+    )
+
+
+class OrderCardCache:
+    """order_id → kartochka matni (LRU + TTL)."""
+
+    def __init__(self, max_size=2000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.stats = {"hits": 0, "misses": 0}
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, order_id):
+        """Kartochka matni; keshda bo'lmasa DBdan (service bilan birga) o'qiladi."""
+        now = time.monotonic()
+
+        with self._lock:
+            item = self._data.get(order_id)
+            if item is not None and item[1] > now:
+                self._data.move_to_end(order_id)
+                self.stats["hits"] += 1
+                return item[0]
+            self.stats["misses"] += 1
+
+        order = (
+            Order.query
+            .options(joinedload(Order.service))
+            .filter(Order.id == order_id)
+            .first()
+        )
+        if order is None:
+            return None
+
+        text = render_order_card(order)
+        with self._lock:
+            self._data[order_id] = (text, now + self.ttl)
+            self._data.move_to_end(order_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return text
+
+    def forget(self, order_id):
+        with self._lock:
+            self._data.pop(order_id, None)
+
+    def watch(self):
+        """Order o'zgarib flush bo'lganda kartochkani keshdan o'chiradi."""
+        _watched.add(self)
+        return self
+
+
+# listener Session klassiga modul importida bir marta ulanadi;
+# watch() faqat keshni ro'yxatga qo'shadi
+_watched = weakref.WeakSet()
+
+
+def _invalidate_cards(session, flush_context):
+    caches = list(_watched)
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, Order) and obj.id is not None:
+            for cache in caches:
+                cache.forget(obj.id)
+
+
+if not event.contains(Session, "after_flush", _invalidate_cards):
+    event.listen(Session, "after_flush", _invalidate_cards)
@@ -0,0 +1,351 @@
+import functools
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ------------------------------------------------------------
+#  METRIKALAR (Prometheus formatida /metrics)
+# ------------------------------------------------------------
+"""
+Jarayon ichidagi histogramma va hisoblagichlar:
+
+- http_request_duration_seconds{method,route,status}  — har bir route
+- http_request_db_queries / _db_seconds{route}         — so'rov ichidagi SQL
+- bot_handler_duration_seconds{bot,handler}           — /start, cat_, srv_, pay_, ord_, st_ ...
+- bot_handler_db_queries{bot,handler}, bot_handler_errors_total
+- db_query_duration_seconds{op}                       — har bir SQL (SELECT / INSERT ...)
+- telegram_request_duration_seconds{method}, telegram_requests_total{method,result}
+- ai_stage_duration_seconds{stage}, ai_errors_total{stage}, ai_jobs_total{result}
+- component_stats{component,key}                      — keshlar va navbatlarning .stats lug'atlari
+
+Har bir gunicorn worker o'z metrikalarini yig'adi (/metrics shu
+so'rovni olgan jarayonniki). p50 / p95 / p99 bucket chegaralari
+orasida chiziqli interpolyatsiya bilan baholanadi (Prometheus
+histogram_quantile kabi).
+"""
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_LABEL = re.compile(r"[a-z]{1,12}_?")
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # oxirgisi — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.max
+                low = self.buckets[i - 1] if i else 0.0
+                high = min(self.buckets[i], self.max)
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+
+        self._histograms = {}   # (nom, labels) → Histogram
+        self._counters = {}     # (nom, labels) → son
+        self._stats = {}        # komponent → callable() → {kalit: son}
+        self._lock = threading.Lock()
+
+    # ---------------- YOZISH ----------------
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name, n=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_stats(self, component, source):
+        """source() → {kalit: son} (masalan lambda: delivery.stats)."""
+        self._stats[component] = source
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # ---------------- O'QISH ----------------
+
+    def histograms(self):
+        """[(nom, labels, Histogram nusxasi), ...] — nom, keyin p99 bo'yicha (kattasi birinchi)."""
+        with self._lock:
+            items = [(name, dict(labels), _copy(h)) for (name, labels), h in self._histograms.items()]
+        return sorted(items, key=lambda item: (item[0], -item[2].quantile(0.99)))
+
+    def counters(self):
+        with self._lock:
+            items = [(name, dict(labels), n) for (name, labels), n in self._counters.items()]
+        return sorted(items, key=lambda item: (item[0], sorted(item[1].items())))
+
+    def stats(self):
+        result = {}
+        for component, source in list(self._stats.items()):
+            try:
+                result[component] = {k: v for k, v in dict(source()).items()
+                                     if isinstance(v, (int, float))}
+            except Exception:
+                continue
+        return result
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        typed = set()
+
+        for name, labels, hist in self.histograms():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip((*hist.buckets, "+Inf"), hist.counts):
+                cumulative += n
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {hist.sum!r}")
+            lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+        for name, labels, n in self.counters():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {n}")
+
+        stats = self.stats()
+        if stats:
+            lines.append("# TYPE component_stats gauge")
+        for component, values in sorted(stats.items()):
+            for key, value in sorted(values.items()):
+                lines.append(f"component_stats{_labels({'component': component, 'key': key})} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _copy(hist):
+    clone = Histogram(hist.buckets)
+    clone.counts = list(hist.counts)
+    clone.count, clone.sum, clone.max = hist.count, hist.sum, hist.max
+    return clone
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+timer = REGISTRY.timer
+
+
+# ---------------- SQL (so'rov / handler doirasi) ----------------
+
+class _Scope:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_scope = ContextVar("metrics_scope", default=None)
+
+
+@contextmanager
+def query_scope():
+    """Ichidagi SQL so'rovlar soni va vaqti; ichma-ich bo'lsa tashqi doiraga ham qo'shiladi."""
+    scope = _Scope()
+    parent = _scope.get()
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+        if parent is not None:
+            parent.queries += scope.queries
+            parent.db_seconds += scope.db_seconds
+
+
+_sql_installed = False
+
+
+def install_sql_timing():
+    """Barcha Engine'lar uchun bir marta: before/after_cursor_execute."""
+    global _sql_installed
+    if _sql_installed:
+        return
+    _sql_installed = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+
+        observe("db_query_duration_seconds", elapsed, op=_sql_op(statement))
+        scope = _scope.get()
+        if scope is not None:
+            scope.queries += 1
+            scope.db_seconds += elapsed
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("metrics_started") if context.connection else None
+        if started:
+            started.pop()
+        inc("db_errors_total")
+
+
+def _sql_op(statement):
+    head = statement.lstrip()[:8].split(None, 1)
+    op = head[0].upper() if head else ""
+    return op if op in ("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "WITH") else "OTHER"
+
+
+# ---------------- FLASK ----------------
+
+def init_app(app):
+    """Route vaqtlari va so'rov ichidagi SQL (METRICS_ENABLED=0 bo'lsa — o'chiq)."""
+    REGISTRY.enabled = app.config.get("METRICS_ENABLED", True)
+    if not REGISTRY.enabled:
+        return
+
+    from flask import g, request
+
+    install_sql_timing()
+
+    @app.before_request
+    def _start():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = _scope.set(_Scope())
+
+    def _finish(status):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        scope = _scope.get()
+        _scope.reset(g.pop("metrics_token"))
+
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        observe("http_request_duration_seconds", time.perf_counter() - started,
+                method=request.method, route=route, status=status)
+        observe("http_request_db_queries", scope.queries, buckets=COUNT_BUCKETS, route=route)
+        observe("http_request_db_seconds", scope.db_seconds, route=route)
+
+    @app.after_request
+    def _record(response):
+        _finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _teardown(exc):
+        # after_request chaqirilmagan (xato) so'rovlar
+        _finish(500)
+
+
+def handler_label(update, commands=()):
+    """Update'ning bot handler tarmog'i: '/start', 'cat_', 'pay_', 'contact', 'text' ..."""
+    if "callback_query" in update:
+        data = update["callback_query"].get("data") or ""
+        label = data.split("_", 1)[0] + "_" if "_" in data else data
+        return label if _LABEL.fullmatch(label) else "callback"
+
+    msg = update.get("message")
+    if msg is None:
+        return "other"
+    text = msg.get("text")
+    if text in commands:
+        return text
+    for kind in ("contact", "location", "voice", "text"):
+        if msg.get(kind):
+            return kind
+    return "message"
+
+
+def timed_handler(bot, commands=()):
+    """handle_*_update(update) uchun: vaqt, SQL soni va xatolar handler bo'yicha."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(update):
+            if not REGISTRY.enabled:
+                return fn(update)
+
+            label = handler_label(update, commands)
+            start = time.perf_counter()
+            with query_scope() as scope:
+                try:
+                    return fn(update)
+                except Exception:
+                    inc("bot_handler_errors_total", bot=bot, handler=label)
+                    raise
+                finally:
+                    observe("bot_handler_duration_seconds", time.perf_counter() - start,
+                            bot=bot, handler=label)
+                    observe("bot_handler_db_queries", scope.queries, buckets=COUNT_BUCKETS,
+                            bot=bot, handler=label)
+        return wrapper
+    return decorator
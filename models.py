@@ -1,8 +1,11 @@
+import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from datetime import datetime
 from enum import Enum
 
 db = SQLAlchemy()
+log = logging.getLogger(__name__)
 
 # ---------------- ORDER STATUS ENUM ----------------
 
@@ -14,6 +17,21 @@ class OrderStatus(Enum):
     PAYMENT_PENDING = "PAYMENT_PENDING"  # to'lov kutilmoqda
     CLOSED = "CLOSED"              # yopildi
 
+    def can_transition(self, new):
+        return new in ORDER_TRANSITIONS[self]
+
+
+# ruxsat etilgan o'tishlar (ommaviy o'zgartirishda tekshiriladi — order_status.py);
+# istalgan holatdan CLOSED ga yopish mumkin
+ORDER_TRANSITIONS = {
+    OrderStatus.NEW: {OrderStatus.PENDING, OrderStatus.CLOSED},
+    OrderStatus.PENDING: {OrderStatus.IN_PROGRESS, OrderStatus.CLOSED},
+    OrderStatus.IN_PROGRESS: {OrderStatus.DONE, OrderStatus.CLOSED},
+    OrderStatus.DONE: {OrderStatus.PAYMENT_PENDING, OrderStatus.CLOSED},
+    OrderStatus.PAYMENT_PENDING: {OrderStatus.CLOSED},
+    OrderStatus.CLOSED: set(),
+}
+
 
 # ---------------- CATEGORY MODEL ----------------
 
@@ -31,7 +49,7 @@ class Service(db.Model):
     name = db.Column(db.String(150), nullable=False)
     price = db.Column(db.Float)
     description = db.Column(db.Text)
-    category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     category = db.relationship("Category", backref="services")
@@ -40,27 +58,52 @@ class Service(db.Model):
 # ---------------- ORDER MODEL ----------------
 
 class Order(db.Model):
+    __table_args__ = (
+        # webhook: faol buyurtma (user_id, chat_id) ORDER BY id DESC
+        db.Index("ix_order_user_chat", "user_id", "chat_id", "id"),
+        # admin_orders / usta /orders: status bo'yicha filter + sana bo'yicha tartib
+        db.Index("ix_order_status_created", "status", "created_at", "id"),
+        # dashboard: so'nggi buyurtmalar
+        db.Index("ix_order_created", "created_at", "id"),
+        # admin_orders: telefon prefiksi bo'yicha qidiruv
+        db.Index("ix_order_phone", "phone"),
+        # geo_index: katak (geohash prefiksi) bo'yicha faol buyurtmalar
+        db.Index("ix_order_geohash", "geohash"),
+        # export.py: oxirgi watermark'dan keyin o'zgarganlar
+        db.Index("ix_order_updated", "updated_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.String(50))    # Telegram User ID
     chat_id = db.Column(db.String(50))    # Telegram chat ID
 
     category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
-    service_id = db.Column(db.Integer, db.ForeignKey("service.id"))
+    service_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey("service.id")),
+        active_history=True
+    )
 
     phone = db.Column(db.String(50))
     address_text = db.Column(db.Text)
 
     location_lat = db.Column(db.Float)
     location_lng = db.Column(db.Float)
+    geohash = db.Column(db.String(12))  # lat/lng dan avtomatik (geo.py)
 
     comment = db.Column(db.Text)
     payment_method = db.Column(db.String(50))
 
-    status = db.Column(db.Enum(OrderStatus), default=OrderStatus.NEW)
+    # active_history — eski qiymat analytics rollup uchun kerak (analytics.py)
+    status = db.column_property(
+        db.Column(db.Enum(OrderStatus), default=OrderStatus.NEW),
+        active_history=True
+    )
     step = db.Column(db.String(30), default="category")
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # ORM orqali har bir UPDATE'da (eski bazada — NULL, init-db qo'shadi)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # relations
     category = db.relationship("Category")
@@ -70,9 +113,60 @@ class Order(db.Model):
     messages = db.relationship("Message", backref="order", lazy=True)
 
 
+# ---------------- MASTER (USTA) MODEL ----------------
+"""
+Usta bot foydalanuvchisi: /orders ro'yxati sozlamalari (kategoriya
+filtri, yaqinlik bo'yicha tartib) va oxirgi yuborgan lokatsiyasi.
+Birinchi xabarida avtomatik yaratiladi.
+"""
+
+class Master(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.String(50), unique=True, nullable=False)
+    name = db.Column(db.String(150))
+
+    # /orders filtri: None — barcha kategoriyalar
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
+    near_first = db.Column(db.Boolean, default=False, nullable=False)
+
+    # yangi buyurtma xabari faqat bo'sh ustalarga (/busy, /free)
+    is_available = db.Column(db.Boolean, default=True, server_default=db.true(), nullable=False)
+
+    location_lat = db.Column(db.Float)
+    location_lng = db.Column(db.Float)
+    location_updated_at = db.Column(db.DateTime)
+    geohash = db.Column(db.String(12), index=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    category = db.relationship("Category")
+
+
+# ---------------- GEOHASH ----------------
+
+GEOHASH_PRECISION = 9  # ~5 m; qisqaroq prefiks — kattaroq katak
+
+
+@event.listens_for(Order, "before_insert")
+@event.listens_for(Order, "before_update")
+@event.listens_for(Master, "before_insert")
+@event.listens_for(Master, "before_update")
+def _set_geohash(mapper, connection, target):
+    from geo import geohash_encode
+
+    if target.location_lat is None or target.location_lng is None:
+        target.geohash = None
+    else:
+        target.geohash = geohash_encode(target.location_lat, target.location_lng, GEOHASH_PRECISION)
+
+
 # ---------------- CHAT MESSAGES ----------------
 
 class Message(db.Model):
+    __table_args__ = (
+        db.Index("ix_message_order_created", "order_id", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False)
     
@@ -100,7 +194,7 @@ AI natija:
 class AIReview(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
-    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False, index=True)
 
     # audio haqida
     audio_file = db.Column(db.String(300))
@@ -117,3 +211,172 @@ class AIReview(db.Model):
     recommended = db.Column(db.Text)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+# ---------------- AI JOB (fon navbati) ----------------
+"""
+Audio tahlil vazifasi. upload_audio faqat AIJob yaratadi,
+jobs.py dagi workerlar esa Whisper + GPT ni fonda bajaradi.
+"""
+
+class AIJobStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class AIJob(db.Model):
+    __table_args__ = (
+        db.Index("ix_ai_job_status_run_after", "status", "run_after"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False, index=True)
+
+    audio_file = db.Column(db.String(300))
+    audio_type = db.Column(db.String(20))  # "client" yoki "master"
+
+    status = db.Column(db.Enum(AIJobStatus), default=AIJobStatus.QUEUED, nullable=False)
+    stage = db.Column(db.String(20))       # transcribe / analyze / save
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+
+    ai_review_id = db.Column(db.Integer, db.ForeignKey("ai_review.id"))
+
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # retry backoff
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------------- TELEGRAM UPDATE DEDUP ----------------
+"""
+Qayta ishlangan Telegram update_id'lari (update_dedup.py).
+Webhook sekin javob bersa Telegram shu update'ni qayta yuboradi —
+ikkinchi marta ishlanmasligi uchun. TTL dan eski yozuvlar o'chiriladi.
+"""
+
+class ProcessedUpdate(db.Model):
+    bot = db.Column(db.String(20), primary_key=True)       # "user" / "master"
+    update_id = db.Column(db.BigInteger, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# ---------------- RATE LIMIT (umumiy token bucket) ----------------
+"""
+RATE_LIMIT_BACKEND=db bo'lganda user bot flood himoyasi (rate_limit.py)
+barcha gunicorn workerlar uchun shu jadvaldan foydalanadi.
+updated_at — time.time() (sekund), to'lgan eski yozuvlar o'chiriladi.
+"""
+
+class RateLimitBucket(db.Model):
+    key = db.Column(db.String(64), primary_key=True)     # "chat:<id>" / "user:<id>"
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+
+
+# ---------------- ANALYTICS ROLLUPS ----------------
+"""
+Analitika sahifasi uchun oldindan hisoblangan agregatlar.
+Order yozilganda analytics.py tomonidan yangilanadi,
+`flask analytics-rebuild` bilan noldan qayta quriladi.
+"""
+
+class ServiceStatusStat(db.Model):
+    service_id = db.Column(db.Integer, primary_key=True)  # 0 — xizmat tanlanmagan
+    status = db.Column(db.Enum(OrderStatus), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyOrderStat(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.Enum(OrderStatus), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ---------------- EXPORT WATERMARK ----------------
+"""
+Inkremental eksport (export.py): `name` bo'yicha oxirgi muvaffaqiyatli
+eksport boshlangan vaqt. Keyingi --incremental eksport faqat shundan
+keyin o'zgargan (updated_at) yozuvlarni oladi.
+"""
+
+class ExportWatermark(db.Model):
+    name = db.Column(db.String(50), primary_key=True)     # "orders", "reviews" yoki o'z nomi
+    value = db.Column(db.DateTime, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ---------------- INDEX / COLUMN MIGRATION ----------------
+
+def create_missing_columns(engine):
+    """
+    Mavjud jadvallarga modellarda qo'shilgan, bazada hali yo'q ustunlarni
+    qo'shadi (ALTER TABLE ... ADD COLUMN). Faqat NULL bo'lishi mumkin
+    yoki server_default'i bor ustunlar uchun: NOT NULL ustun default'siz
+    mavjud qatorlarga qo'shilmaydi — ogohlantirish bilan o'tkazib
+    yuboriladi (qo'lda migratsiya). Qo'shilganlarni qaytaradi.
+    """
+    inspector = inspect(engine)
+    added = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                if not column.nullable and column.server_default is None:
+                    log.warning(
+                        "%s.%s qo'shilmadi: NOT NULL, server_default yo'q — qo'lda migratsiya kerak",
+                        table.name, column.name,
+                    )
+                    continue
+
+                ddl = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if hasattr(default, "compile"):
+                        default = default.compile(dialect=engine.dialect)
+                    ddl += f" DEFAULT {default}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def create_missing_indexes(engine):
+    """
+    Mavjud bazaga (masalan eski imperiya.db) modellarda e'lon qilingan,
+    lekin hali yaratilmagan indekslarni qo'shadi. Yaratilganlar nomini qaytaradi.
+    """
+    inspector = inspect(engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def create_schema(engine):
+    """
+    `flask init-db`: yangi jadvallar, keyin eski bazada yo'q ustun va
+    indekslar. Qo'shilgan ustun / indeks nomlarini qaytaradi.
+    """
+    db.metadata.create_all(engine)
+    return create_missing_columns(engine) + create_missing_indexes(engine)
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from models import db, Order, OrderStatus
+
+
+# ------------------------------------------------------------
+#  OMMAVIY STATUS O'ZGARTIRISH
+# ------------------------------------------------------------
+"""
+Ko'p buyurtmani bitta tranzaksiyada yangi statusga o'tkazadi
+(masalan kun oxirida DONE → PAYMENT_PENDING → CLOSED):
+
+- har bir o'tish ORDER_TRANSITIONS bo'yicha tekshiriladi; mos
+  kelmaganlari o'tkazib yuboriladi va sababi qaytariladi
+- status ORM orqali o'zgartiriladi — analytics rollup'lari, usta
+  kartochkalari keshi va geo indeks odatdagidek yangilanadi
+- bitta commit; SQLAlchemy bir xil UPDATE'larni executemany bilan yuboradi
+
+Xabarlar NotificationBatch orqali yig'iladi: har bir chatga bitta
+xabar (bir nechta buyurtmasi bo'lsa — hammasi bitta matnda), adminga
+esa bitta umumiy xabar.
+"""
+
+CHUNK_SIZE = 500  # IN (...) parametrlari soni (SQLite limiti 999)
+
+USER_STATUS_TEXT = {
+    OrderStatus.IN_PROGRESS: "Usta ishni boshladi 🚀",
+    OrderStatus.DONE: "Ish tugatildi! 🏁",
+    OrderStatus.PAYMENT_PENDING: "💳 To‘lov kutilmoqda.",
+    OrderStatus.CLOSED: "✅ Buyurtma yopildi. Rahmat!",
+}
+
+
+class TransitionError(ValueError):
+    pass
+
+
+@dataclass
+class TransitionResult:
+    status: OrderStatus
+    moved: list = field(default_factory=list)     # [(order, eski status), ...]
+    skipped: dict = field(default_factory=dict)   # order_id → sabab
+
+    @property
+    def moved_ids(self):
+        return [order.id for order, _ in self.moved]
+
+
+def transition_orders(order_ids, new_status, commit=True):
+    """
+    order_ids dagi buyurtmalarni new_status ga o'tkazadi (bitta tranzaksiya).
+    Noma'lum status yoki noto'g'ri ID — TransitionError, hech narsa o'zgarmaydi.
+    """
+    try:
+        new_status = OrderStatus(new_status)
+    except ValueError:
+        raise TransitionError(f"Noma'lum status: {new_status}") from None
+    if isinstance(order_ids, (str, bytes, dict)):
+        raise TransitionError("ids buyurtma ID'lari ro'yxati bo'lishi kerak")
+    order_ids = list(dict.fromkeys(_order_id(i) for i in order_ids))
+    result = TransitionResult(status=new_status)
+
+    found = {}
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[start:start + CHUNK_SIZE]
+        for order in Order.query.filter(Order.id.in_(chunk)):
+            found[order.id] = order
+
+    for order_id in order_ids:
+        order = found.get(order_id)
+        if order is None:
+            result.skipped[order_id] = "topilmadi"
+            continue
+
+        old = order.status or OrderStatus.NEW
+        if not old.can_transition(new_status):
+            result.skipped[order_id] = f"{old.value} → {new_status.value} mumkin emas"
+            continue
+
+        order.status = new_status
+        result.moved.append((order, old))
+
+    if commit and result.moved:
+        db.session.commit()
+    return result
+
+
+def _order_id(value):
+    # bool int'ning bir turi, 1.5 esa int() da jimgina 1 bo'lib qolardi
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise TransitionError(f"Noto'g'ri buyurtma ID: {value!r}")
+
+
+class NotificationBatch:
+    """
+    Xabarlarni chat bo'yicha yig'adi va har bir chatga bitta xabar yuboradi.
+
+        batch = NotificationBatch()
+        batch.add(chat_id, "...")
+        batch.send(send_user_message)
+    """
+
+    MAX_TEXT = 4000  # Telegram limiti 4096
+
+    def __init__(self):
+        self._lines = defaultdict(list)
+
+    def add(self, chat_id, text):
+        if chat_id:
+            self._lines[str(chat_id)].append(text)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def send(self, send):
+        sent = 0
+        for chat_id, lines in self._lines.items():
+            for text in _pack(lines, self.MAX_TEXT):
+                send(chat_id, text)
+                sent += 1
+        self._lines.clear()
+        return sent
+
+
+def _pack(lines, limit):
+    chunk, size = [], 0
+    for line in lines:
+        if chunk and size + len(line) + 1 > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def notify_transition(result, send_user, notify_admin):
+    """Mijozlarga (chat bo'yicha birlashtirilgan) va adminga bitta xabar."""
+    text = USER_STATUS_TEXT.get(result.status)
+
+    users = NotificationBatch()
+    if text:
+        for order, _ in result.moved:
+            users.add(order.chat_id, f"#{order.id}: {text}")
+    users.send(send_user)
+
+    if result.moved:
+        ids = ", ".join(f"#{i}" for i in result.moved_ids[:50])
+        more = len(result.moved) - 50
+        notify_admin(
+            f"{len(result.moved)} ta buyurtma yangi status: {result.status.value}\n"
+            f"{ids}{f' va yana {more} ta' if more > 0 else ''}"
+        )
@@ -0,0 +1,101 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+# ------------------------------------------------------------
+#  KEYSET (CURSOR) PAGINATION
+# ------------------------------------------------------------
+"""
+OFFSET o'rniga (created_at, id) juftligi bo'yicha sahifalash:
+har bir sahifa indeksdan to'g'ridan-to'g'ri o'qiladi, shuning uchun
+1-sahifa ham, 1000-sahifa ham bir xil tez ochiladi.
+
+Tartib: created_at DESC, id DESC (eng yangi buyurtmalar birinchi).
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, id):
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        created_at, id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(token) from e
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def keyset_page(query, created_col, id_col, limit, after=None, before=None):
+    """
+    `after`  — shu kursordan keyingi (eskiroq) sahifa
+    `before` — shu kursordan oldingi (yangiroq) sahifa
+    """
+    if before:
+        created_at, id = decode_cursor(before)
+        rows = (
+            query.filter(or_(
+                created_col > created_at,
+                and_(created_col == created_at, id_col > id)
+            ))
+            .order_by(created_col.asc(), id_col.asc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        items = list(reversed(rows[:limit]))
+
+        return KeysetPage(
+            items,
+            next_cursor=_cursor(items[-1]) if items else None,
+            prev_cursor=_cursor(items[0]) if has_more else None,
+        )
+
+    if after:
+        created_at, id = decode_cursor(after)
+        query = query.filter(or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < id)
+        ))
+
+    rows = (
+        query.order_by(created_col.desc(), id_col.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    items = rows[:limit]
+
+    return KeysetPage(
+        items,
+        next_cursor=_cursor(items[-1]) if has_more else None,
+        prev_cursor=_cursor(items[0]) if after and items else None,
+    )
+
+
+def _cursor(row):
+    return encode_cursor(row.created_at, row.id)
+
+
+def prefix_range(column, prefix):
+    """
+    `LIKE 'prefix%'` ning indeksga mos varianti:
+    column >= prefix AND column < (prefix ning keyingi qiymati)
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
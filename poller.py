@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import logging
+
+import httpx
+
+from dispatcher import update_chat_id
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  LONG POLLING (getUpdates) — webhooksiz ishga tushirish
+# ------------------------------------------------------------
+"""
+Ikkala bot (mijoz va usta) uchun getUpdates long polling.
+Public HTTPS manzil kerak emas:
+
+    python poller.py                 # ikkala bot
+    python poller.py --bot user      # faqat mijoz boti
+    python poller.py --delete-webhook
+
+- bitta asyncio loop, bitta umumiy httpx ulanishlar pool'i
+- update'lar webhook bilan bir xil handler'larda ishlanadi
+  (app.handle_user_update / app.handle_master_update)
+- handler'lar sinxron (SQLAlchemy), shuning uchun thread pool'da;
+  bir vaqtda ko'pi bilan POLL_CONCURRENCY ta update
+- bitta chatning update'lari ketma-ket (step mashinasi tartibi)
+- mijoz botida webhook bilan bir xil flood limiti (app.limit_update);
+  limitdan oshgan update kechiktirilmaydi — tashlanadi
+- offset butun paket ishlangandan keyin oshiriladi; jarayon yiqilsa
+  paket qayta keladi va update_dedup takrorlarni tashlab yuboradi
+- handler xato bersa update chat lock'i ichida darhol qayta ishlanadi
+  (ko'pi bilan max_attempts marta, retry_delay bilan) — shu chatning
+  keyingi update'lari kutib turadi, tartib buzilmaydi; urinishlar
+  tugasa update logga yozilib tashlanadi
+
+Webhook bilan bir vaqtda ishlatilmaydi (Procfile'da faqat web).
+
+Webhook o'rnatilgan bo'lsa Telegram getUpdates'ga 409 qaytaradi —
+--delete-webhook bilan o'chiriladi.
+"""
+
+
+class BotPoller:
+    def __init__(self, flask_app, updates, name, token, handler,
+                 api_url, poll_timeout=25, limit=100, rate_limit=None,
+                 max_attempts=3, retry_delay=1.0):
+        self.app = flask_app
+        self.updates = updates
+        self.name = name
+        self.token = token
+        self.handler = handler
+        self.rate_limit = rate_limit
+        self.url = f"{api_url.rstrip('/')}/bot{token}"
+        self.poll_timeout = poll_timeout
+        self.limit = limit
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.offset = 0
+        self.stats = {"received": 0, "processed": 0, "duplicates": 0, "limited": 0, "failed": 0}
+
+        self._chat_locks = {}
+
+    async def run(self, client, semaphore, delete_webhook=False, stop=None):
+        if delete_webhook:
+            await client.post(f"{self.url}/deleteWebhook", json={})
+
+        backoff = 1.0
+        while stop is None or not stop.is_set():
+            try:
+                batch = await self._get_updates(client)
+                backoff = 1.0
+            except (httpx.HTTPError, ValueError) as e:
+                log.warning("[%s] getUpdates xatosi: %s", self.name, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            if not batch:
+                continue
+
+            self.stats["received"] += len(batch)
+            await asyncio.gather(*(self._process(update, semaphore) for update in batch))
+            self.offset = max(u["update_id"] for u in batch) + 1
+            self._chat_locks.clear()
+
+    async def _get_updates(self, client):
+        response = await client.post(
+            f"{self.url}/getUpdates",
+            json={"offset": self.offset, "timeout": self.poll_timeout, "limit": self.limit},
+            timeout=self.poll_timeout + 10,
+        )
+        data = response.json()
+
+        if not data.get("ok"):
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if retry_after:
+                await asyncio.sleep(retry_after)
+                return []
+            raise ValueError(data.get("description") or f"HTTP {response.status_code}")
+        return data["result"]
+
+    async def _process(self, update, semaphore):
+        # paket ichida bir chatning update'lari kelgan tartibda navbat kutadi
+        lock = self._chat_locks.setdefault(update_chat_id(update), asyncio.Lock())
+
+        # qayta urinish ham lock ichida — chatning keyingi update'lari kutadi
+        admitted = {}
+        async with lock:
+            for attempt in range(1, self.max_attempts + 1):
+                async with semaphore:
+                    try:
+                        result = await asyncio.to_thread(self._handle, update, admitted)
+                        break
+                    except Exception:
+                        self.stats["failed"] += 1
+                        log.exception("[%s] update #%s ishlanmadi (urinish %s)",
+                                      self.name, update.get("update_id"), attempt)
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_delay * attempt)
+            else:
+                log.error("[%s] update #%s %s urinishdan keyin tashlandi",
+                          self.name, update.get("update_id"), self.max_attempts)
+                return
+
+        self.stats[result] += 1
+
+    def _handle(self, update, admitted):
+        """
+        Thread ichida: dedup + flood limiti (faqat birinchi urinishda,
+        `admitted` shu update uchun umumiy) + handler. Natija — stats kaliti.
+        """
+        update_id = update["update_id"]
+
+        with self.app.app_context():
+            if not admitted:
+                if not self.updates.claim(self.name, update_id):
+                    return "duplicates"
+                # kutish yo'q: kechiktirilgan update butun paket offset'ini ushlab turardi
+                if self.rate_limit and self.rate_limit(self.name, update, can_delay=False) is None:
+                    return "limited"
+                admitted["ok"] = True
+            # xatoda dedup belgisi qoladi: qayta urinish shu yerda, offset esa oshadi
+            self.handler(update)
+        return "processed"
+
+
+async def run_pollers(pollers, concurrency=8, delete_webhook=False, stop=None):
+    limits = httpx.Limits(max_connections=len(pollers) * 2 + 4, max_keepalive_connections=len(pollers) * 2)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        await asyncio.gather(*(
+            p.run(client, semaphore, delete_webhook=delete_webhook, stop=stop)
+            for p in pollers
+        ))
+
+
+def build_pollers(bots=("user", "master")):
+    import app as web
+
+    flask_app = web.create_app()
+    config = flask_app.config
+    # flood limiti webhook'dagidek faqat mijoz botida
+    handlers = {
+        "user": (config["TELEGRAM_BOT_TOKEN"], web.handle_user_update, web.limit_update),
+        "master": (config["TELEGRAM_MASTER_BOT_TOKEN"], web.handle_master_update, None),
+    }
+
+    pollers = []
+    for name in bots:
+        token, handler, rate_limit = handlers[name]
+        if not token:
+            log.warning("[%s] token yo'q — o'tkazib yuborildi", name)
+            continue
+        pollers.append(BotPoller(
+            flask_app, flask_app.extensions["services"]["updates"], name, token, handler,
+            api_url=config["TELEGRAM_API_URL"],
+            poll_timeout=config["POLL_TIMEOUT"],
+            rate_limit=rate_limit,
+        ))
+    return flask_app, pollers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telegram getUpdates long polling")
+    parser.add_argument("--bot", choices=["user", "master", "all"], default="all")
+    parser.add_argument("--delete-webhook", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    bots = ("user", "master") if args.bot == "all" else (args.bot,)
+    flask_app, pollers = build_pollers(bots)
+    if not pollers:
+        raise SystemExit("Token topilmadi (TELEGRAM_BOT_TOKEN / TELEGRAM_MASTER_BOT_TOKEN)")
+
+    asyncio.run(run_pollers(
+        pollers,
+        concurrency=flask_app.config["POLL_CONCURRENCY"],
+        delete_webhook=args.delete_webhook,
+    ))
@@ -0,0 +1,266 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  TOKEN BUCKET
+# ------------------------------------------------------------
+"""
+Klassik token bucket: sekundiga `rate` ta token to'planadi,
+ko'pi bilan `capacity` ta. Har bir so'rov bitta token oladi.
+"""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1.0):
+        """Token bo'lsa oladi va True; bo'lmasa kutmasdan False."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1.0):
+        """Token bo'shaguncha kutadi."""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ------------------------------------------------------------
+#  CHAT / USER BO'YICHA LIMIT (user bot flood himoyasi)
+# ------------------------------------------------------------
+"""
+Har bir kalit (chat, user) uchun alohida token bucket: sekundiga
+`rate` ta, ko'pi bilan `burst` ta update. Limitdan oshgan update:
+
+- navbatni kutishi `max_delay` dan qisqa bo'lsa — shuncha keyin
+  ishlanadi (token oldindan band qilinadi, bucket manfiyga tushadi,
+  shuning uchun chat ichidagi tartib saqlanadi)
+- aks holda tashlab yuboriladi
+
+Ikki qavat:
+1) MemoryBucketStore — shu jarayonda; flood qilayotgan chat DBga
+   umuman yetib bormaydi (lokal sarf umumiydan ko'p bo'lmaydi, shuning
+   uchun lokal rad etish umumiy rad etish bilan bir xil)
+2) DBBucketStore (ixtiyoriy) — barcha gunicorn workerlar uchun umumiy,
+   bitta UPDATE ... RETURNING bilan atomik
+"""
+
+
+def _reserve(tokens, elapsed, rate, capacity, max_wait):
+    """(yangi tokenlar, kutish sekundi) yoki (tokenlar, None) — rad etildi."""
+    tokens = min(capacity, tokens + elapsed * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    wait = (1 - tokens) / rate
+    if wait <= max_wait:
+        return tokens - 1, wait
+    return tokens, None
+
+
+class MemoryBucketStore:
+    """
+    Jarayon ichidagi bucket'lar, LRU (max_size). Uzoq jim turgan kalit
+    to'la bucket bilan teng — chiqarib yuborilsa hech narsa yo'qolmaydi.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, max_wait=0.0):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._data.get(key, (capacity, now))
+            tokens, wait = _reserve(tokens, now - updated, rate, capacity, max_wait)
+            self._data[key] = (tokens, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DBBucketStore:
+    """
+    Umumiy bucket'lar (RateLimitBucket jadvali). Vaqt — time.time()
+    (jarayonlar orasida bir xil). To'lib bo'lgan eski yozuvlar har
+    `cleanup_interval` sekundda o'chiriladi.
+    """
+
+    def __init__(self, db, model, cleanup_interval=600):
+        self.db = db
+        self.model = model
+        self.cleanup_interval = cleanup_interval
+        self._next_cleanup = 0.0
+
+    def take(self, key, rate, capacity, max_wait=0.0):
+        now = time.time()
+        table = self.model.__table__
+        c = table.c
+
+        refilled = c.tokens + (now - c.updated_at) * rate
+        refilled = case((refilled > capacity, capacity), else_=refilled)
+
+        # alohida ulanish — handler'ning sessiyasi/tranzaksiyasiga tegmaydi
+        with self.db.engine.begin() as conn:
+            tokens = conn.execute(
+                table.update()
+                .where(c.key == key, refilled + max_wait * rate >= 1)
+                .values(tokens=refilled - 1, updated_at=now)
+                .returning(c.tokens)
+            ).scalar()
+
+            if tokens is None and self._insert(conn, key, capacity - 1, now):
+                tokens = capacity - 1
+
+        self._maybe_cleanup(now, capacity / rate + max_wait)
+
+        if tokens is None:
+            return None
+        return max(0.0, -tokens) / rate
+
+    def _insert(self, conn, key, tokens, now):
+        """Yangi kalit — True; kalit bor (demak bucket bo'sh) — False."""
+        table = self.model.__table__
+        values = {"key": key, "tokens": tokens, "updated_at": now}
+
+        dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(conn.dialect.name)
+        if dialect is not None:
+            stmt = dialect.insert(table).values(**values).on_conflict_do_nothing()
+            return conn.execute(stmt).rowcount == 1
+
+        try:
+            with conn.begin_nested():
+                conn.execute(table.insert().values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    def _maybe_cleanup(self, now, idle):
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + self.cleanup_interval
+
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(
+                    self.model.__table__.delete().where(self.model.updated_at < now - idle)
+                )
+        except Exception:
+            log.exception("RateLimitBucket tozalashda xato")
+
+
+class ChatRateLimiter:
+    def __init__(self, rate=1.0, burst=10, max_delay=0.0, shared=None,
+                 max_keys=100000, warn_interval=30, enabled=True):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.max_delay = float(max_delay)
+        self.warn_interval = warn_interval
+        self.enabled = enabled
+
+        self.local = MemoryBucketStore(max_keys)
+        self.shared = shared
+
+        self.stats = {"allowed": 0, "delayed": 0, "dropped": 0, "shared_errors": 0}
+
+        self._warned = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, db, model, config):
+        shared = None
+        if config["RATE_LIMIT_BACKEND"] == "db":
+            shared = DBBucketStore(db, model)
+        return cls(
+            rate=config["RATE_LIMIT_RATE"],
+            burst=config["RATE_LIMIT_BURST"],
+            max_delay=config["RATE_LIMIT_MAX_DELAY"],
+            shared=shared,
+            max_keys=config["RATE_LIMIT_MAX_KEYS"],
+            warn_interval=config["RATE_LIMIT_WARN_INTERVAL"],
+            enabled=config["RATE_LIMIT_ENABLED"],
+        )
+
+    # ---------------- PUBLIC API ----------------
+
+    def reserve(self, keys, can_delay=True):
+        """
+        Barcha kalitlardan bittadan token: 0.0 — darhol ishlash,
+        > 0 — shuncha sekunddan keyin, None — tashlab yuborish.
+        """
+        if not self.enabled:
+            return 0.0
+
+        max_wait = self.max_delay if can_delay else 0.0
+        wait = 0.0
+
+        for key in keys:
+            key_wait = self.local.take(key, self.rate, self.capacity, max_wait)
+            if key_wait is not None and self.shared is not None:
+                key_wait = self._take_shared(key, max_wait, key_wait)
+            if key_wait is None:
+                self._count("dropped")
+                return None
+            wait = max(wait, key_wait)
+
+        self._count("delayed" if wait else "allowed")
+        return wait
+
+    def should_warn(self, key):
+        """Tashlangan chatga ogohlantirish — har warn_interval sekundda ko'pi bilan bir marta."""
+        now = time.monotonic()
+        with self._lock:
+            if self._warned.get(key, 0.0) > now:
+                return False
+            self._warned[key] = now + self.warn_interval
+            self._warned.move_to_end(key)
+            while len(self._warned) > self.local.max_size:
+                self._warned.popitem(last=False)
+        return True
+
+    # ---------------- INTERNALS ----------------
+
+    def _take_shared(self, key, max_wait, local_wait):
+        try:
+            return self.shared.take(key, self.rate, self.capacity, max_wait)
+        except Exception:
+            # umumiy store ishlamasa — lokal limit bilan davom etamiz
+            self._count("shared_errors")
+            log.exception("Rate limit: umumiy store xatosi")
+            return local_wait
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
@@ -0,0 +1,322 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+from markupsafe import Markup, escape
+from sqlalchemy import event, func, inspect, or_, text
+from sqlalchemy.orm import Session
+
+from models import db, Order, Message, AIReview
+
+
+# ------------------------------------------------------------
+#  QIDIRUV: BUYURTMA, CHAT XABARLARI, AI TRANSKRIPTLAR
+# ------------------------------------------------------------
+"""
+SQLite'da FTS5 virtual jadvali (search_fts) — bm25 bo'yicha
+tartiblangan natija, so'z boshi bo'yicha qidiruv ("kran" → "kranni").
+
+    rowid = id * 4 + tur    (1 — Order, 2 — Message, 3 — AIReview)
+
+Indeks Order / Message / AIReview flush bo'lganda shu tranzaksiyada
+yangilanadi (analytics rollup'lari kabi). Query.update() / bulk insert
+kabi ORM'ni chetlab o'tuvchi yozuvlar uchun — `flask search-rebuild`.
+Jadval `flask init-db` da yaratiladi.
+
+FTS5 bo'lmasa (PostgreSQL, FTS5 siz SQLite yoki init-db
+ishlamagan) — LIKE bo'yicha sekinroq qidiruv, created_at bo'yicha
+yangilari birinchi.
+"""
+
+KINDS = {Order: 1, Message: 2, AIReview: 3}
+KIND_NAMES = {1: "order", 2: "message", 3: "review"}
+
+FIELDS = {
+    Order: ("phone", "address_text", "comment"),
+    Message: ("text",),
+    AIReview: ("transcript", "ai_summary"),
+}
+
+MAX_RESULTS = 1000      # sahifalash chegarasi (bm25 bo'yicha OFFSET)
+REBUILD_CHUNK = 5000
+
+# snippet belgilari — HTML escape'dan keyin <mark> ga almashtiriladi
+_START, _END = "\x02", "\x03"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+_fts_ready = {}     # engine url → bool
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    ref_id: int
+    order_id: int
+    snippet: Markup
+
+
+@dataclass
+class SearchPage:
+    query: str
+    hits: list
+    page: int
+    page_size: int
+    total: int          # MAX_RESULTS dan oshsa — MAX_RESULTS
+    backend: str
+
+    @property
+    def has_prev(self):
+        return self.page > 0
+
+    @property
+    def has_next(self):
+        return (self.page + 1) * self.page_size < self.total
+
+    @property
+    def total_capped(self):
+        return self.total >= MAX_RESULTS
+
+
+# ---------------- INDEX MATNI ----------------
+
+def document(model, values):
+    """Indekslanadigan matn. values — FIELDS[model] dagi maydonlar qiymati."""
+    parts = [values.get(name) or "" for name in FIELDS[model]]
+
+    phone = values.get("phone") if model is Order else None
+    if phone:
+        # "+998 90 123-45-67" → 998901234567, 1234567, 4567 (oxiri bo'yicha ham topiladi)
+        digits = re.sub(r"\D", "", phone)
+        parts += [digits, digits[-7:], digits[-4:]]
+
+    return " ".join(p for p in parts if p)
+
+
+def _row(model, ref_id, order_id, values):
+    body = document(model, values)
+    if not body:
+        return None
+    kind = KINDS[model]
+    return {"rowid": _rowid(kind, ref_id), "body": body, "kind": kind, "order_id": order_id}
+
+
+def _rowid(kind, ref_id):
+    return ref_id * 4 + kind
+
+
+# ---------------- SXEMA ----------------
+
+def create_search_index(engine):
+    """FTS5 jadvali (SQLite). Shu chaqiruvda yangi yaratilgan bo'lsa True."""
+    _fts_ready.pop(str(engine.url), None)
+    if engine.dialect.name != "sqlite":
+        return False
+
+    with engine.begin() as conn:
+        if fts_available(conn):
+            return False
+        try:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE search_fts USING fts5("
+                "body, kind UNINDEXED, order_id UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+        except Exception:
+            return False    # SQLite FTS5 siz yig'ilgan
+        finally:
+            _fts_ready.pop(str(engine.url), None)
+    return True
+
+
+def fts_available(conn):
+    key = str(conn.engine.url)
+    ready = _fts_ready.get(key)
+    if ready is None:
+        ready = conn.dialect.name == "sqlite" and conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_fts'"
+        )).first() is not None
+        _fts_ready[key] = ready
+    return ready
+
+
+def rebuild_search_index(chunk_size=REBUILD_CHUNK, progress=None):
+    """search_fts ni jadvallardan noldan to'ldiradi. Indekslangan yozuvlar soni."""
+    conn = db.session.connection()
+    if not fts_available(conn):
+        return 0
+
+    conn.execute(text("DELETE FROM search_fts"))
+    total = 0
+
+    for model in KINDS:
+        fields = FIELDS[model]
+        order_col = model.id if model is Order else model.order_id
+        query = (
+            db.session.query(model.id, order_col, *(getattr(model, f) for f in fields))
+            .order_by(model.id)
+            .yield_per(chunk_size)
+        )
+
+        rows = []
+        for ref_id, order_id, *values in query:
+            row = _row(model, ref_id, order_id, dict(zip(fields, values)))
+            if row is not None:
+                rows.append(row)
+            if len(rows) >= chunk_size:
+                total += _insert(conn, rows)
+                rows = []
+                if progress:
+                    progress(total)
+        total += _insert(conn, rows)
+
+    db.session.commit()
+    return total
+
+
+def _insert(conn, rows):
+    if rows:
+        conn.execute(text(
+            "INSERT INTO search_fts (rowid, body, kind, order_id) "
+            "VALUES (:rowid, :body, :kind, :order_id)"
+        ), rows)
+    return len(rows)
+
+
+# ---------------- FLUSH SINXRONI ----------------
+
+@event.listens_for(Session, "after_flush")
+def _sync(session, flush_context):
+    changed, deleted = [], []
+
+    for obj in session.new:
+        if type(obj) in KINDS:
+            changed.append(obj)
+    for obj in session.dirty:
+        if type(obj) in KINDS and any(
+            inspect(obj).attrs[name].history.has_changes() for name in FIELDS[type(obj)]
+        ):
+            changed.append(obj)
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            deleted.append(obj)
+
+    if not changed and not deleted:
+        return
+
+    conn = session.connection()
+    if not fts_available(conn):
+        return
+
+    stale = [_rowid(KINDS[type(o)], o.id) for o in (*changed, *deleted)]
+    conn.execute(text("DELETE FROM search_fts WHERE rowid = :rowid"),
+                 [{"rowid": r} for r in stale])
+
+    rows = []
+    for obj in changed:
+        model = type(obj)
+        order_id = obj.id if model is Order else obj.order_id
+        row = _row(model, obj.id, order_id, {f: getattr(obj, f) for f in FIELDS[model]})
+        if row is not None:
+            rows.append(row)
+    _insert(conn, rows)
+
+
+# ---------------- QIDIRUV ----------------
+
+def fts_query(q):
+    """Foydalanuvchi matni → FTS5 so'rovi: har bir so'z prefiks sifatida, AND."""
+    tokens = _TOKEN.findall(q.lower())
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def search(q, page=0, page_size=20):
+    q = (q or "").strip()
+    page = max(0, page)
+    conn = db.session.connection()
+
+    if not q:
+        return SearchPage(q, [], 0, page_size, 0, "none")
+
+    if fts_available(conn):
+        match = fts_query(q)
+        if not match:
+            return SearchPage(q, [], 0, page_size, 0, "fts5")
+        return _search_fts(conn, q, match, page, page_size)
+    return _search_like(q, page, page_size)
+
+
+def _search_fts(conn, q, match, page, page_size):
+    total = conn.execute(text(
+        "SELECT count(*) FROM (SELECT 1 FROM search_fts WHERE search_fts MATCH :m LIMIT :cap)"
+    ), {"m": match, "cap": MAX_RESULTS}).scalar()
+
+    offset = page * page_size
+    rows = conn.execute(text(
+        "SELECT rowid, kind, order_id, "
+        "snippet(search_fts, 0, :start, :end, '…', 12) "
+        "FROM search_fts WHERE search_fts MATCH :m "
+        "ORDER BY bm25(search_fts) LIMIT :limit OFFSET :offset"
+    ), {"m": match, "start": _START, "end": _END,
+        "limit": page_size, "offset": offset}).all() if offset < total else []
+
+    hits = [
+        SearchHit(KIND_NAMES[kind], rowid // 4, order_id, _highlight(snippet))
+        for rowid, kind, order_id, snippet in rows
+    ]
+    return SearchPage(q, hits, page, page_size, total, "fts5")
+
+
+def _search_like(q, page, page_size):
+    """
+    FTS yo'q: har bir jadvaldan LIKE (sekin). Natijalar created_at bo'yicha
+    yangilari birinchi — har jadvaldan sahifa oxirigacha bo'lgan eng yangi
+    qatorlar olinib birlashtiriladi; total sahifaga bog'liq emas.
+    """
+    pattern = f"%{q.replace('%', '').replace('_', '')}%"
+    want = min((page + 1) * page_size, MAX_RESULTS)
+    found, total = [], 0
+
+    for model, kind in KINDS.items():
+        fields = [getattr(model, f) for f in FIELDS[model]]
+        order_col = model.id if model is Order else model.order_id
+        query = db.session.query(model.id).filter(or_(*(f.ilike(pattern) for f in fields)))
+
+        total += db.session.query(func.count()).select_from(
+            query.limit(MAX_RESULTS).subquery()
+        ).scalar()
+        rows = (
+            query.with_entities(model.id, order_col, model.created_at, *fields)
+            .order_by(model.created_at.desc().nullslast(), model.id.desc())
+            .limit(want)
+            .all()
+        )
+        for row in rows:
+            found.append((row[2], kind, row[0], row[1], " ".join(v for v in row[3:] if v)))
+
+    # created_at'i yo'q eski qatorlar oxirida
+    found.sort(key=lambda r: (r[0] is not None, r[0] or datetime.min, r[1], r[2]), reverse=True)
+
+    start = page * page_size
+    hits = [
+        SearchHit(KIND_NAMES[kind], ref_id, order_id, _like_snippet(body, q))
+        for _, kind, ref_id, order_id, body in found[start:start + page_size]
+    ]
+    return SearchPage(q, hits, page, page_size, min(total, MAX_RESULTS), "like")
+
+
+def _highlight(snippet):
+    html = str(escape(snippet or ""))
+    return Markup(html.replace(_START, "<mark>").replace(_END, "</mark>"))
+
+
+def _like_snippet(body, q, width=60):
+    i = body.lower().find(q.lower())
+    if i < 0:
+        return _highlight(body[:width * 2])
+    start = max(0, i - width)
+    end = i + len(q)
+    return _highlight(
+        ("…" if start else "") + body[start:i] + _START + body[i:end] + _END
+        + body[end:end + width] + ("…" if end + width < len(body) else "")
+    )
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from werkzeug.utils import secure_filename
+
+
+# ------------------------------------------------------------
+#  AUDIO STORAGE (content-addressed)
+# ------------------------------------------------------------
+"""
+Yuklangan audio UPLOAD_FOLDER ga bo'laklab (chunk) yoziladi va
+kontent hash'i bo'yicha saqlanadi:
+
+    uploads/ab/cd/abcd…ef.ogg
+
+- bir xil fayl ikki marta yuklansa — bitta nusxa qoladi
+- bir xil nomli turli fayllar bir-birini bosib ketmaydi
+- `max_bytes` dan katta fayl diskka to'liq yozilmasdan rad etiladi
+- ixtiyoriy: Whisper'dan oldin ffmpeg bilan 16 kHz mono opus'ga
+  siqiladi (AUDIO_TRANSCODE=1), yuboriladigan hajm bir necha barobar kamayadi
+"""
+
+CHUNK_SIZE = 64 * 1024
+TMP_DIR = ".tmp"
+WHISPER_SUFFIX = ".whisper.ogg"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _extension(filename):
+    ext = os.path.splitext(secure_filename(filename or ""))[1].lower()
+    return ext if 1 < len(ext) <= 10 else ".bin"
+
+
+def content_path(folder, digest, ext):
+    return os.path.join(folder, digest[:2], digest[2:4], digest + ext)
+
+
+def save_upload(file, folder, max_bytes):
+    """
+    werkzeug FileStorage'ni bo'laklab diskka yozadi.
+    Saqlangan faylning yo'lini qaytaradi (dublikat bo'lsa — mavjud fayl).
+    """
+    tmp_dir = os.path.join(folder, TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    h = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(size)
+                h.update(chunk)
+                out.write(chunk)
+
+        path = content_path(folder, h.hexdigest(), _extension(file.filename))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)  # GC yangi yuklangan dublikatni o'chirib yubormasin
+        else:
+            os.replace(tmp_path, path)
+        return path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ---------------- WHISPER UCHUN SIQISH ----------------
+
+def whisper_input(path, enabled=False):
+    """
+    Whisper'ga yuboriladigan fayl. Siqish yoqilgan va ffmpeg bor bo'lsa,
+    16 kHz mono opus nusxa (bir marta yaratiladi) qaytariladi,
+    aks holda asl fayl.
+    """
+    if not enabled or path.endswith(WHISPER_SUFFIX):
+        return path
+
+    target = os.path.splitext(path)[0] + WHISPER_SUFFIX
+    if os.path.exists(target):
+        return target
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return path
+
+    tmp = target + ".part"
+    result = subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-i", path,
+         "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k",
+         "-f", "ogg", tmp],
+        capture_output=True
+    )
+    if result.returncode != 0 or not os.path.exists(tmp):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return path
+
+    # siqilgan nusxa kattaroq chiqsa — asl faylni ishlatamiz
+    if os.path.getsize(tmp) >= os.path.getsize(path):
+        os.remove(tmp)
+        return path
+
+    os.replace(tmp, target)
+    return target
+
+
+# ---------------- GARBAGE COLLECTION ----------------
+
+def collect_garbage(folder, referenced, min_age=3600, dry_run=False):
+    """
+    `referenced` ichida bo'lmagan va `min_age` soniyadan eski fayllarni
+    o'chiradi. Whisper nusxalari asl fayli bilan birga yashaydi.
+    (o'chirilgan fayllar soni, bo'shagan baytlar) qaytaradi.
+    """
+    referenced = {os.path.abspath(p) for p in referenced if p}
+    keep = referenced | {os.path.splitext(p)[0] + WHISPER_SUFFIX for p in referenced}
+    deadline = time.time() - min_age
+
+    removed = 0
+    freed = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.abspath(os.path.join(root, name))
+            if path in keep:
+                continue
+
+            stat = os.stat(path)
+            if stat.st_mtime > deadline:
+                continue
+
+            removed += 1
+            freed += stat.st_size
+            if not dry_run:
+                os.remove(path)
+
+    return removed, freed
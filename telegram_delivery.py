@@ -0,0 +1,230 @@
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  OUTBOUND TELEGRAM DELIVERY
+# ------------------------------------------------------------
+"""
+Telegram'ga chiquvchi so'rovlar navbati.
+
+Webhook faqat navbatga qo'yadi va darhol javob qaytaradi.
+Workerlar keep-alive ulanishlar orqali yuboradi:
+- tarmoq xatosi / 5xx  → exponential backoff bilan qayta urinish
+- 429 Too Many Requests → Telegram bergan `retry_after` kutiladi
+- boshqa 4xx            → qayta urinilmaydi (xato so'rov)
+
+Har bir chat doim bitta workerga tushadi, shuning uchun bir chatga
+yuborilgan xabarlar tartibi saqlanadi.
+"""
+
+
+@dataclass
+class DeliveryJob:
+    token: str
+    method: str
+    payload: dict
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class TelegramDelivery:
+    def __init__(self, api_url="https://api.telegram.org", workers=4,
+                 max_retries=5, backoff=0.5, max_backoff=30.0,
+                 timeout=10.0, queue_size=10000):
+        self.api_url = api_url.rstrip("/")
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.queue_size = queue_size
+
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+
+        self._lock = threading.Lock()
+        self._queues = []
+        self._pid = None
+        self._inline_session = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            api_url=config["TELEGRAM_API_URL"],
+            workers=config["TELEGRAM_DELIVERY_WORKERS"],
+            max_retries=config["TELEGRAM_DELIVERY_RETRIES"],
+            timeout=config["TELEGRAM_DELIVERY_TIMEOUT"],
+        )
+
+    # ---------------- PUBLIC API ----------------
+
+    def enqueue(self, token, method, payload):
+        """
+        So'rovni navbatga qo'yadi. workers=0 bo'lsa — shu joyning o'zida
+        yuboradi (test va CLI uchun qulay).
+        """
+        job = DeliveryJob(token=token, method=method, payload=payload)
+
+        if self.workers <= 0:
+            if self._inline_session is None:
+                self._inline_session = self._new_session(pool_size=1)
+            self._deliver(self._inline_session, job)
+            return True
+
+        self._ensure_started()
+        q = self._queues[self._shard(payload)]
+
+        try:
+            q.put_nowait(job)
+        except queue.Full:
+            self._count("dropped")
+            log.error("Telegram navbati to'la, xabar tashlandi: %s", method)
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Navbatdagi barcha so'rovlar yuborilguncha kutadi."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for q in list(self._queues):
+            while q.unfinished_tasks:
+                if deadline is not None and time.monotonic() > deadline:
+                    return False
+                time.sleep(0.01)
+        return True
+
+    def pending(self):
+        return sum(q.qsize() for q in self._queues)
+
+    # ---------------- WORKERS ----------------
+
+    def _ensure_started(self):
+        # gunicorn fork qilganda threadlar bola jarayonga o'tmaydi,
+        # shuning uchun workerlar har bir PID uchun alohida ishga tushadi
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queues = [queue.Queue(maxsize=self.queue_size)
+                            for _ in range(self.workers)]
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(
+                    target=self._worker, args=(q,),
+                    name=f"tg-delivery-{i}", daemon=True
+                )
+                t.start()
+            self._pid = os.getpid()
+
+    def _shard(self, payload):
+        key = str(payload.get("chat_id", "")).encode()
+        return zlib.crc32(key) % len(self._queues)
+
+    def _worker(self, q):
+        session = self._new_session(pool_size=1)
+        while True:
+            job = q.get()
+            try:
+                self._deliver(session, job)
+            except Exception:
+                self._count("failed")
+                log.exception("Telegram delivery worker xatosi")
+            finally:
+                q.task_done()
+
+    def _new_session(self, pool_size):
+        # requests og'ir modul — faqat birinchi worker ishga tushganda
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # ---------------- SENDING ----------------
+
+    def _deliver(self, session, job):
+        url = f"{self.api_url}/bot{job.token}/{job.method}"
+
+        while True:
+            job.attempts += 1
+            delay = self._send_once(session, url, job)
+
+            if delay is None:
+                return
+
+            if job.attempts > self.max_retries:
+                self._count("failed")
+                log.error("Telegram %s %d urinishdan keyin yuborilmadi",
+                          job.method, job.attempts)
+                return
+
+            self._count("retried")
+            time.sleep(delay)
+
+    def _send_once(self, session, url, job):
+        """
+        Bitta urinish. None — tugadi (muvaffaqiyatli yoki qayta urinib
+        bo'lmaydigan xato), aks holda — keyingi urinishgacha kutish (s).
+        """
+        import requests
+
+        start = time.perf_counter()
+        try:
+            resp = session.post(url, json=job.payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            metrics.inc("telegram_requests_total", method=job.method, result="network_error")
+            log.warning("Telegram tarmoq xatosi: %s", e)
+            return self._backoff(job.attempts)
+        finally:
+            metrics.observe("telegram_request_duration_seconds",
+                            time.perf_counter() - start, method=job.method)
+
+        metrics.inc("telegram_requests_total", method=job.method, result=_result(resp.status_code))
+
+        if resp.status_code == 429:
+            return self._retry_after(resp) or self._backoff(job.attempts)
+
+        if resp.status_code >= 500:
+            return self._backoff(job.attempts)
+
+        if resp.ok:
+            self._count("sent")
+        else:
+            self._count("failed")
+            log.error("Telegram %s rad etdi (%s): %s",
+                      job.method, resp.status_code, resp.text[:200])
+        return None
+
+    def _backoff(self, attempt):
+        return min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+
+    def _retry_after(self, resp):
+        try:
+            return float(resp.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def _result(status_code):
+    if status_code == 429:
+        return "rate_limited"
+    if status_code >= 500:
+        return "server_error"
+    return "ok" if status_code < 400 else "rejected"
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------
+#  TELEGRAM UPDATE DEDUP (webhook idempotentligi)
+# ------------------------------------------------------------
+"""
+Telegram webhook javobi kechiksa, xuddi shu update'ni qayta yuboradi.
+Har bir update_id bir marta ishlanadi:
+
+1) xotiradagi chegaralangan set (LRU + TTL) — shu jarayonda ko'rilgan
+   takrorlar DBga umuman so'rov yubormasdan qaytariladi
+2) ProcessedUpdate jadvali — boshqa gunicorn worker yoki restartdan
+   keyin kelgan takrorlar; INSERT muvaffaqiyatsiz bo'lsa — takror
+
+update_id handler'dan OLDIN belgilanadi (parallel kelgan takror ham
+to'xtatiladi). Handler xato bilan tugasa, belgi olib tashlanadi —
+Telegram qayta yuborganda update yana ishlanadi.
+
+Eski yozuvlar (UPDATE_DEDUP_TTL) har UPDATE_DEDUP_CLEANUP sekundda o'chiriladi.
+"""
+
+
+class UpdateDeduplicator:
+    def __init__(self, db, model, max_size=10000, ttl=86400, cleanup_interval=600):
+        self.db = db
+        self.model = model
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+
+        self.stats = {"new": 0, "memory_hits": 0, "db_hits": 0, "released": 0}
+
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+
+    @classmethod
+    def from_config(cls, db, model, config):
+        return cls(
+            db, model,
+            max_size=config["UPDATE_DEDUP_SIZE"],
+            ttl=config["UPDATE_DEDUP_TTL"],
+            cleanup_interval=config["UPDATE_DEDUP_CLEANUP"],
+        )
+
+    # ---------------- PUBLIC API ----------------
+
+    def claim(self, bot, update_id):
+        """True — yangi update (ishlash kerak), False — takror."""
+        key = (bot, update_id)
+        now = time.monotonic()
+
+        with self._lock:
+            expires_at = self._seen.get(key)
+            if expires_at is not None and expires_at > now:
+                self.stats["memory_hits"] += 1
+                return False
+            self._remember(key, now)
+
+        if not self._insert(bot, update_id):
+            self.stats["db_hits"] += 1
+            return False
+
+        self.stats["new"] += 1
+        self._maybe_cleanup(now)
+        return True
+
+    def release(self, bot, update_id):
+        """Handler xato bilan tugadi — Telegram qayta yuborsa yana ishlansin."""
+        with self._lock:
+            self._seen.pop((bot, update_id), None)
+        self.stats["released"] += 1
+
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(
+                    self.model.__table__.delete().where(
+                        self.model.bot == bot, self.model.update_id == update_id
+                    )
+                )
+        except Exception:
+            log.exception("update_id #%s belgisini o'chirib bo'lmadi", update_id)
+
+    # ---------------- INTERNALS ----------------
+
+    def _remember(self, key, now):
+        self._seen[key] = now + self.ttl
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    def _insert(self, bot, update_id):
+        table = self.model.__table__
+        values = {"bot": bot, "update_id": update_id, "created_at": datetime.utcnow()}
+
+        # alohida ulanish — handler'ning sessiyasi/tranzaksiyasiga tegmaydi
+        with self.db.engine.begin() as conn:
+            dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(conn.dialect.name)
+            if dialect is not None:
+                stmt = dialect.insert(table).values(**values).on_conflict_do_nothing()
+                return conn.execute(stmt).rowcount == 1
+
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(table.insert().values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    def _maybe_cleanup(self, now):
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + self.cleanup_interval
+
+        with self._lock:
+            expired = [key for key, expires_at in self._seen.items() if expires_at <= now]
+            for key in expired:
+                del self._seen[key]
+
+        deadline = datetime.utcnow() - timedelta(seconds=self.ttl)
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(
+                    self.model.__table__.delete().where(self.model.created_at < deadline)
+                )
+        except Exception:
+            log.exception("ProcessedUpdate tozalashda xato")